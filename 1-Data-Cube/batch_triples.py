@@ -0,0 +1,182 @@
+import re
+import string
+
+import numpy as np
+import pandas as pd
+
+from rdflib import Literal, URIRef
+
+
+BATCH_SIZE = 10_000
+
+
+class TermFactory:
+    """Interning cache of the rdflib terms created for the rows of `add_rows`.
+
+    IRIs are keyed by (namespace, local name), literals by (value, language, datatype), so a term
+    repeated in many rows (the region of every observation, a label shared by many rows) is created
+    once and the same object is added to the graph for all of them. The cache is cleared when it grows
+    past `max_size` terms.
+    """
+
+    def __init__(self, max_size: int = 1 << 20):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._terms = {}
+
+    def iri(self, namespace: str, local_name: str) -> URIRef:
+        return self._intern(("iri", namespace, local_name), lambda: URIRef(namespace + local_name))
+
+    def literal(self, value, datatype=None, lang: str = None) -> Literal:
+        # type(value) keeps 1, 1.0 and True apart
+        return self._intern(("literal", type(value), value, lang, datatype), lambda: Literal(value, datatype=datatype, lang=lang))
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "terms": len(self._terms),
+        }
+
+    def _intern(self, key, create):
+        term = self._terms.get(key)
+        if term is not None:
+            self.hits += 1
+            return term
+        self.misses += 1
+        if len(self._terms) >= self.max_size:
+            self._terms.clear()
+        term = self._terms[key] = create()
+        return term
+
+
+# Shared by all builders of a process
+TERMS = TermFactory()
+
+
+class Iri:
+    """IRI rendered for every row from a namespace and a pattern over DataFrame columns.
+
+    Fields of the pattern are column names, `{i}` is the row position. Zero padded integer
+    format specs are supported, e.g. `Iri(NSR, "observation-{i:04d}")` or `Iri(NSR, "county/{OkresCode}")`.
+    """
+
+    def __init__(self, namespace, pattern: str):
+        self.namespace = str(namespace)
+        self.pattern = pattern
+
+
+class Lit:
+    """Literal taken from a DataFrame column, optionally with a datatype or a language tag."""
+
+    def __init__(self, column: str, datatype=None, lang: str = None):
+        self.column = column
+        self.datatype = datatype
+        self.lang = lang
+
+
+def add_rows(collector, data: pd.DataFrame, subject: Iri, predicate_objects: list):
+    """Add the same set of triples for every row of `data` in bulk.
+
+    Terms are rendered with vectorized string operations over whole columns instead of
+    iterating rows. Collectors with an `add_lines` method (`TripleWriter`) receive
+    pre-rendered N-Triples text, any other collector (`rdflib.Graph`) receives the terms via `addN`.
+
+    Args:
+        collector: Graph or writer the triples are added to.
+        data (pd.DataFrame): One row per subject.
+        subject (Iri): Subject pattern.
+        predicate_objects (list): (predicate, object) pairs, where object is an `Iri`, a `Lit`
+            or a constant rdflib term.
+    """
+    for start in range(0, len(data), BATCH_SIZE):
+        batch = data.iloc[start:start + BATCH_SIZE]
+        positions = pd.RangeIndex(start, start + len(batch))
+        if hasattr(collector, "add_lines"):
+            collector.add_lines(_render_lines(batch, positions, subject, predicate_objects))
+        else:
+            collector.addN(_render_quads(collector, batch, positions, subject, predicate_objects))
+
+
+def render_pattern(data: pd.DataFrame, pattern: str, positions=None) -> np.ndarray:
+    """Render a pattern like "county/{OkresCode}" for every row of `data`."""
+    if positions is None:
+        positions = pd.RangeIndex(len(data))
+
+    result = np.full(len(data), "", dtype=object)
+    for literal_text, field, format_spec, _ in string.Formatter().parse(pattern):
+        result = result + literal_text
+        if field is None:
+            continue
+        values = pd.Series(positions if field == "i" else data[field].to_numpy())
+        result = result + _format_values(values, format_spec).to_numpy(dtype=object)
+    return result
+
+
+def _format_values(values: pd.Series, format_spec: str) -> pd.Series:
+    if not format_spec:
+        return values.astype(str)
+    padding = re.fullmatch(r"(0?)(\d+)d?", format_spec)
+    if padding:
+        width = int(padding.group(2))
+        return values.astype(str).str.zfill(width) if padding.group(1) else values.astype(str).str.rjust(width)
+    return values.map(lambda value: format(value, format_spec))
+
+
+def _render_lines(data: pd.DataFrame, positions, subject: Iri, predicate_objects: list) -> str:
+    subjects = "<" + subject.namespace + render_pattern(data, subject.pattern, positions) + ">"
+    columns = []
+    for predicate, obj in predicate_objects:
+        prefix = subjects + f" {predicate.n3()} "
+        if isinstance(obj, Iri):
+            columns.append(prefix + ("<" + obj.namespace + render_pattern(data, obj.pattern, positions) + "> .\n"))
+        elif isinstance(obj, Lit):
+            columns.append(prefix + (_nt_literals(data[obj.column], obj.datatype, obj.lang) + " .\n"))
+        else:
+            columns.append(prefix + f"{_nt_term(obj)} .\n")
+    if not columns or not len(data):
+        return ""
+    # row-major order keeps all triples of a subject next to each other
+    return "".join(np.column_stack(columns).ravel())
+
+
+def _render_quads(collector, data: pd.DataFrame, positions, subject: Iri, predicate_objects: list):
+    # A resource described by several add_rows calls (e.g. its type and its labels) gets the same subject object,
+    # the predicates are the constant terms of `predicate_objects`, a single object each already
+    subjects = [TERMS.iri(subject.namespace, value) for value in render_pattern(data, subject.pattern, positions)]
+    for predicate, obj in predicate_objects:
+        if isinstance(obj, Iri):
+            objects = [TERMS.iri(obj.namespace, value) for value in render_pattern(data, obj.pattern, positions)]
+        elif isinstance(obj, Lit):
+            objects = [TERMS.literal(value, obj.datatype, obj.lang) for value in data[obj.column].tolist()]
+        else:
+            objects = [obj] * len(subjects)
+        for s, o in zip(subjects, objects):
+            yield s, predicate, o, collector
+
+
+def _escape(values: pd.Series) -> pd.Series:
+    return values.astype(str) \
+        .str.replace("\\", "\\\\", regex=False) \
+        .str.replace('"', '\\"', regex=False) \
+        .str.replace("\n", "\\n", regex=False) \
+        .str.replace("\r", "\\r", regex=False)
+
+
+def _nt_literals(values: pd.Series, datatype=None, lang: str = None) -> np.ndarray:
+    if lang:
+        suffix = f'"@{lang}'
+    elif datatype:
+        suffix = f'"^^<{datatype}>'
+    else:
+        suffix = '"'
+    return ('"' + _escape(values) + suffix).to_numpy(dtype=object)
+
+
+def _nt_term(term) -> str:
+    if isinstance(term, Literal):
+        return _nt_literals(pd.Series([str(term)]), term.datatype, term.language)[0]
+    return term.n3()
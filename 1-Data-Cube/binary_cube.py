@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+import argparse
+import io
+import json
+import mmap
+import os
+from array import array
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from rdflib import Graph
+from rdflib.namespace import RDF, QB
+from rdflib.store import Store, VALID_STORE
+from rdflib.util import from_n3
+
+from triple_writer import TripleWriter
+
+
+FORMAT = "ndbc"
+MAGIC = b"NDBC0001"
+ALIGNMENT = 8
+
+# Index -> order of its columns, every index is sorted by its columns from left to right
+INDEXES = {"spo": (0, 1, 2), "pos": (1, 2, 0), "osp": (2, 0, 1)}
+
+# Rendered triples are dictionary-encoded once this many characters are buffered
+BUFFER_SIZE = 1 << 20
+
+
+class BinaryCubeWriter:
+    """Collector writing a data cube in the binary dictionary-encoded format (.ndbc).
+
+    Has the same `add`, `addN` and `add_lines` methods as `TripleWriter`, so it can be passed to
+    the `create_*` functions. Every term is stored once in a dictionary sorted by its N-Triples form,
+    the triples are stored as three arrays of term ids (SPO, POS and OSP order), which `BinaryCube`
+    memory-maps and searches without parsing anything.
+
+    File layout: the magic bytes, the length of a JSON header and the header (term and triple counts,
+    offset of every section), followed by the sections, each aligned to 8 bytes:
+    `term_offsets` (uint64, one more than the terms), `term_data` (the UTF-8 N-Triples forms
+    of the terms, concatenated) and `spo`, `pos` and `osp` (uint32, three rows of term ids each).
+    """
+
+    def __init__(self, destination: str):
+        self.destination = destination
+        self.count = 0
+        self._ids = {}
+        self._triples = array("I")
+        self._buffer = io.StringIO()
+        # Triples added as rdflib terms are rendered exactly like the pre-rendered lines of `add_rows`
+        self._writer = TripleWriter(self._buffer, "nt")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+        if exc_type is None:
+            self.close()
+
+    def add(self, triple):
+        self._writer.add(triple)
+        self.count += 1
+        if self._buffer.tell() > BUFFER_SIZE:
+            self._flush()
+
+    def addN(self, quads):
+        for subject, predicate, obj, _ in quads:
+            self.add((subject, predicate, obj))
+
+    def add_lines(self, lines: str):
+        self.count += lines.count("\n")
+        self._encode(lines)
+
+    def close(self):
+        self._flush()
+        terms = sorted(self._ids, key=lambda term: term.encode())
+        data = [term.encode() for term in terms]
+        offsets = np.zeros(len(data) + 1, dtype=np.uint64)
+        np.cumsum([len(term) for term in data], out=offsets[1:])
+
+        # Renumber the ids in the order of the sorted dictionary and drop duplicate triples
+        new_ids = np.empty(len(terms), dtype=np.uint32)
+        new_ids[[self._ids[term] for term in terms]] = np.arange(len(terms), dtype=np.uint32)
+        triples = new_ids[np.frombuffer(self._triples, dtype=np.uint32).reshape(-1, 3)] if self._triples else \
+            np.empty((0, 3), dtype=np.uint32)
+        triples = np.unique(triples, axis=0)
+
+        sections = {"term_offsets": offsets, "term_data": np.frombuffer(b"".join(data), dtype=np.uint8)}
+        for name, columns in INDEXES.items():
+            index = triples[:, columns]
+            order = np.lexsort(index.T[::-1])
+            sections[name] = np.ascontiguousarray(index[order].T)
+
+        header = {"terms": len(terms), "triples": len(triples), "sections": {}}
+        offset = 0
+        for name, section in sections.items():
+            header["sections"][name] = [offset, section.dtype.str, list(section.shape)]
+            offset = _aligned(offset + section.nbytes)
+        header_bytes = json.dumps(header).encode()
+        start = _aligned(len(MAGIC) + 8 + len(header_bytes))
+
+        with open(self.destination, "wb") as f:
+            f.write(MAGIC + len(header_bytes).to_bytes(8, "little") + header_bytes)
+            for name, section in sections.items():
+                f.seek(start + header["sections"][name][0])
+                f.write(section.tobytes())
+            f.truncate(start + offset)
+
+    def _flush(self):
+        lines = self._buffer.getvalue()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        self._encode(lines)
+
+    def _encode(self, lines: str):
+        ids = self._ids
+        triples = self._triples
+        for line in lines.splitlines():
+            subject, predicate, rest = line.split(" ", 2)
+            # rest is the object followed by " ."
+            for term in (subject, predicate, rest[:-2]):
+                term_id = ids.get(term)
+                if term_id is None:
+                    term_id = ids[term] = len(ids)
+                triples.append(term_id)
+
+
+class BinaryCube:
+    """Memory-mapped reader of the binary cube format written by `BinaryCubeWriter`.
+
+    Opening a file only reads its header, the term dictionary and the triple indexes are NumPy views
+    of the mapped file. Triple patterns are answered by binary searches in the index starting with
+    the bound terms, with terms identified by their ids; `term` decodes an id to its N-Triples form.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a binary data cube")
+        header_length = int.from_bytes(self._mmap[len(MAGIC):len(MAGIC) + 8], "little")
+        header = json.loads(self._mmap[len(MAGIC) + 8:len(MAGIC) + 8 + header_length])
+        start = _aligned(len(MAGIC) + 8 + header_length)
+
+        self.num_terms = header["terms"]
+        self.num_triples = header["triples"]
+        self._sections = {}
+        for name, (offset, dtype, shape) in header["sections"].items():
+            dtype = np.dtype(dtype)
+            count = int(np.prod(shape))
+            self._sections[name] = np.frombuffer(self._mmap, dtype, count, start + offset).reshape(shape)
+        self._term_start = start + header["sections"]["term_data"][0]
+        self._offsets = self._sections["term_offsets"]
+
+    def __len__(self) -> int:
+        return self.num_triples
+
+    def term(self, term_id: int) -> str:
+        """N-Triples form of the term with `term_id`."""
+        start = self._term_start + int(self._offsets[term_id])
+        end = self._term_start + int(self._offsets[term_id + 1])
+        return self._mmap[start:end].decode()
+
+    def term_id(self, term: str):
+        """Id of the term with the N-Triples form `term` (binary search in the dictionary), None if there is none."""
+        key = term.encode()
+        lo, hi = 0, self.num_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = self._term_start + int(self._offsets[mid])
+            if self._mmap[start:self._term_start + int(self._offsets[mid + 1])] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < self.num_terms and self.term(lo) == term else None
+
+    def match(self, subject: int = None, predicate: int = None, obj: int = None) -> np.ndarray:
+        """Triples matching a pattern of term ids (None matches anything).
+
+        Returns:
+            np.ndarray: (3, n) array of subject, predicate and object ids.
+        """
+        pattern = (subject, predicate, obj)
+        bound = [term is not None for term in pattern]
+        if bound[0] and not bound[1] and bound[2]:
+            name = "osp"
+        elif bound[0] or not (bound[1] or bound[2]):
+            name = "spo"
+        elif bound[1]:
+            name = "pos"
+        else:
+            name = "osp"
+        columns = INDEXES[name]
+        index = self._sections[name]
+
+        lo, hi = 0, self.num_triples
+        for row, column in enumerate(columns):
+            if pattern[column] is None:
+                break
+            # A key of the dtype of the index, a Python int would make NumPy convert the whole index first
+            key, values = index.dtype.type(pattern[column]), index[row, lo:hi]
+            lo, hi = lo + np.searchsorted(values, key, "left"), lo + np.searchsorted(values, key, "right")
+
+        # Rows back in subject, predicate, object order
+        return index[[columns.index(i) for i in range(3)], lo:hi]
+
+    def triples(self):
+        """All triples as (subject, predicate, object) N-Triples forms."""
+        term = lru_cache(maxsize=1 << 16)(self.term)
+        for subject, predicate, obj in self._sections["spo"].T:
+            yield term(subject), term(predicate), term(obj)
+
+    def observations(self, decode: bool = False) -> pd.DataFrame:
+        """One row per `qb:Observation`, one column per property of the observations.
+
+        Args:
+            decode (bool, optional): Return N-Triples forms instead of term ids. Defaults to False.
+
+        Returns:
+            pd.DataFrame: Term ids (-1 where an observation has no value), indexed by the observation ids
+                and with the N-Triples forms of the properties as columns. Of properties with several values
+                per observation only the first value is kept.
+        """
+        type_id, observation_id = self.term_id(RDF.type.n3()), self.term_id(QB.Observation.n3())
+        if type_id is None or observation_id is None:
+            return pd.DataFrame()
+        observations = self.match(None, type_id, observation_id)[0]
+
+        spo = self._sections["spo"]
+        lo = np.searchsorted(spo[0], observations, "left")
+        hi = np.searchsorted(spo[0], observations, "right")
+        # Positions of all triples of the observations, the ranges lo[i]:hi[i] concatenated
+        lengths = hi - lo
+        rows = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths) + np.repeat(lo, lengths)
+        frame = pd.DataFrame({"observation": spo[0, rows], "property": spo[1, rows], "value": spo[2, rows].astype(np.int64)})
+        frame = frame[frame["property"] != type_id].drop_duplicates(["observation", "property"])
+        result = frame.pivot(index="observation", columns="property", values="value").reindex(observations)
+        result = result.fillna(-1).astype(np.int64)
+        result.columns = [self.term(column) for column in result.columns]
+        if decode:
+            result = result.apply(lambda column: column.map(lambda value: self.term(value) if value >= 0 else None))
+            result.index = [self.term(obs) for obs in result.index]
+        return result
+
+    def close(self):
+        self._sections.clear()
+        self._offsets = None
+        try:
+            self._mmap.close()
+        except BufferError:  # arrays returned by `match` still use the mapping, it is unmapped with them
+            pass
+
+
+@lru_cache(maxsize=1 << 16)
+def _decode(n3: str):
+    return from_n3(n3)
+
+
+# Renders terms of patterns the way BinaryCubeWriter stored them
+_RENDERER = TripleWriter(io.StringIO(), "nt")
+
+
+class BinaryCubeStore(Store):
+    """Read-only rdflib Store over a binary cube, so it can be queried with SPARQL and validated."""
+
+    context_aware = False
+    formula_aware = False
+    transaction_aware = False
+    graph_aware = False
+
+    def __init__(self, configuration: str = None, identifier=None):
+        self.cube = None
+        super().__init__(configuration, identifier)
+
+    def open(self, configuration: str, create: bool = False):
+        if create:
+            raise ValueError("Binary cubes are written with BinaryCubeWriter")
+        self.cube = BinaryCube(configuration)
+        return VALID_STORE
+
+    def close(self, commit_pending_transaction: bool = False):
+        self.cube.close()
+
+    def add(self, triple, context, quoted: bool = False):
+        raise ValueError("Binary cubes are read-only")
+
+    def remove(self, triple_pattern, context=None):
+        raise ValueError("Binary cubes are read-only")
+
+    def triples(self, triple_pattern, context=None):
+        ids = []
+        for term in triple_pattern:
+            term_id = self.cube.term_id(_RENDERER._term(term)) if term is not None else None
+            if term is not None and term_id is None:
+                return
+            ids.append(term_id)
+        term = self.cube.term
+        for subject, predicate, obj in self.cube.match(*ids).T:
+            yield (_decode(term(subject)), _decode(term(predicate)), _decode(term(obj))), iter(())
+
+    def __len__(self, context=None) -> int:
+        return len(self.cube)
+
+    def contexts(self, triple=None):
+        return iter(())
+
+    def bind(self, prefix: str, namespace, override: bool = True):
+        pass
+
+    def prefix(self, namespace):
+        return None
+
+    def namespace(self, prefix: str):
+        return None
+
+    def namespaces(self):
+        return iter(())
+
+
+def open_graph(path: str) -> Graph:
+    """Read-only graph over the binary cube at `path`."""
+    graph = Graph(BinaryCubeStore())
+    graph.open(path)
+    return graph
+
+
+def write_binary_cube(triples, destination: str):
+    """Write `triples` (e.g. a parsed Graph) to `destination` in the binary cube format."""
+    with BinaryCubeWriter(destination) as writer:
+        for triple in triples:
+            writer.add(triple)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Converts an RDF file into the binary cube format (.ndbc).")
+    parser.add_argument("source", help="RDF file, e.g. care-providers.ttl")
+    parser.add_argument("destination", nargs="?", help="output file (defaults to the source with the .ndbc extension)")
+    args = parser.parse_args()
+
+    graph = Graph()
+    graph.parse(args.source)
+    destination = args.destination or os.path.splitext(args.source)[0] + "." + FORMAT
+    write_binary_cube(graph, destination)
+    print(f"{args.source}: {len(graph)} triples written to {destination}")
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+if __name__ == "__main__":
+    main()
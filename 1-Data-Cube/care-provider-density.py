@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+import argparse
+import importlib
+
+import numpy as np
+import pandas as pd
+from rdflib import Graph, BNode, Literal
+from rdflib.namespace import RDF, QB, XSD, DCTERMS, PROV
+
+from batch_triples import Iri, Lit, add_rows
+from triple_writer import TripleWriter
+from rdf_output import COMPRESSIONS, FORMATS, open_output, output_name, write_graph, writer_format
+
+# Both cube scripts are reused as modules, their names are not valid identifiers
+care_providers = importlib.import_module("care-providers")
+population = importlib.import_module("population-2021")
+
+NS = care_providers.NS
+NSR = care_providers.NSR
+RDFS = care_providers.RDFS
+SDMX_MEASURE = care_providers.SDMX_MEASURE
+
+PREFIXES = {**care_providers.PREFIXES, "prov": PROV}
+
+# Care providers per this many inhabitants
+PER_INHABITANTS = 100_000
+
+
+def load_density(care_providers_file: str, population_file: str) -> pd.DataFrame:
+    """Number of care providers and mean population of every county, joined in a single merge.
+
+    The care providers are counted per county (over all fields of care) with a groupby, the population
+    frame is the one of `population-2021.py` with its counties and regions resolved.
+
+    Raises:
+        ValueError: If there are care providers in a county without population data.
+
+    Returns:
+        pd.DataFrame: One row per county with the "PocetPoskytovaluPece", "hodnota" and "Hustota"
+            (care providers per `PER_INHABITANTS` inhabitants) columns and the county and region columns
+            of the population frame.
+    """
+    care = care_providers.load_csv_file_as_object(care_providers_file)
+    counts = care.groupby("OkresCode", observed=True).size().rename("PocetPoskytovaluPece")
+
+    people = population.set_region_per_county(population.load_csv_file_as_object(population_file))
+    unmatched = sorted(set(counts.index) - set(people["okres_lau"]))
+    if unmatched:
+        raise ValueError(f"No population data for the counties of {len(unmatched)} care providers' codes: {unmatched}")
+
+    result = people.merge(counts, left_on="okres_lau", right_index=True, how="left", validate="one_to_one")
+    result["PocetPoskytovaluPece"] = result["PocetPoskytovaluPece"].fillna(0).astype("int64")
+    result["Hustota"] = (result["PocetPoskytovaluPece"] * PER_INHABITANTS / result["hodnota"]).round(2)
+    result["ObservationId"] = np.arange(len(result))
+    return result.reset_index(drop=True)
+
+
+def as_data_cube(data: pd.DataFrame) -> Graph:
+    result = Graph(bind_namespaces="rdflib")
+    build_data_cube(result, data)
+    return result
+
+
+def write_data_cube(data: pd.DataFrame, destination: str, format: str = "ttl"):
+    """Stream the data cube straight to `destination`, compressed when it ends with ".gz" or ".zst"."""
+    with open_output(destination) as stream:
+        with TripleWriter(stream, writer_format(format), PREFIXES) as writer:
+            build_data_cube(writer, data)
+
+
+def build_data_cube(collector, data: pd.DataFrame):
+    # The schema reuses definitions of the population cube, so it is not cached (see schema_cache.schema_key)
+    dataset = create_schema(collector)
+    population.create_resources(collector, data)
+    create_observations(collector, dataset, data)
+
+
+def create_schema(collector):
+    population.create_concept_schemes(collector)
+    population.create_resource_classes(collector)
+    dimensions = population.create_dimensions(collector)
+    measures = create_measures(collector)
+    structure = create_structure(collector, dimensions, measures)
+    return create_dataset(collector, structure)
+
+
+def create_measures(collector: Graph):
+    density = NS.careProvidersPer100k
+    collector.add((density, RDF.type, RDFS.Property))
+    collector.add((density, RDF.type, QB.MeasureProperty))
+    collector.add((density, RDFS.label, Literal("Počet poskytovatelů péče na 100 000 obyvatel", lang="cs")))
+    collector.add((density, RDFS.label, Literal("Care providers per 100,000 inhabitants", lang="en")))
+    collector.add((density, RDFS.subPropertyOf, SDMX_MEASURE.obsValue))
+    collector.add((density, RDFS.range, XSD.decimal))
+
+    return care_providers.create_measure(collector) + population.create_measure(collector) + [density]
+
+
+def create_structure(collector: Graph, dimensions, measures):
+    structure = NS.densityStructure
+    collector.add((structure, RDF.type, QB.DataStructureDefinition))
+
+    for dimension in dimensions:
+        component = BNode()
+        collector.add((structure, QB.component, component))
+        collector.add((component, QB.dimension, dimension))
+
+    for measure in measures:
+        component = BNode()
+        collector.add((structure, QB.component, component))
+        collector.add((component, QB.measure, measure))
+
+    return structure
+
+
+def create_dataset(collector: Graph, structure):
+    dataset = NSR.CareProviderDensity2021
+    collector.add((dataset, RDF.type, QB.DataSet))
+    collector.add((dataset, RDFS.label, Literal("Hustota poskytovatelů zdravotních služeb v Okresech 2021", lang="cs")))
+    collector.add((dataset, RDFS.label, Literal("Care Provider Density per County 2021", lang="en")))
+    collector.add((dataset, DCTERMS.title, Literal("Hustota poskytovatelů zdravotních služeb v Okresech 2021", lang="cs")))
+    collector.add((dataset, DCTERMS.title, Literal("Care Provider Density per County 2021", lang="en")))
+    collector.add((dataset, DCTERMS.publisher, Literal("https://github.com/corovcam", datatype=XSD.anyURI)))
+    collector.add((dataset, DCTERMS.license, Literal("https://github.com/corovcam/NDBI046/blob/main/LICENSE", datatype=XSD.anyURI)))
+    collector.add((dataset, QB.structure, structure))
+    # Derived from the two published cubes
+    collector.add((dataset, RDF.type, PROV.Entity))
+    collector.add((dataset, PROV.wasDerivedFrom, NSR.CareProviders))
+    collector.add((dataset, PROV.wasDerivedFrom, NSR.MeanPopulation2021))
+
+    return dataset
+
+
+def create_observations(collector: Graph, dataset, data: pd.DataFrame):
+    add_rows(collector, data, Iri(NSR, "density/observation-{ObservationId:02d}"), [
+        (RDF.type, QB.Observation),
+        (QB.dataSet, dataset),
+        (NS.county, Iri(NSR, "county/{okres_lau}")),
+        (NS.region, Iri(NSR, "region/{kraj_kod}")),
+        (NS.numberOfCareProviders, Lit("PocetPoskytovaluPece", datatype=XSD.integer)),
+        (NS.meanPopulation, Lit("hodnota", datatype=XSD.integer)),
+        (NS.careProvidersPer100k, Lit("Hustota", datatype=XSD.decimal)),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generates the Care Provider Density RDF Data Cube "
+                                                 "(care providers per 100,000 inhabitants of every county).")
+    parser.add_argument("--stream", action="store_true",
+                        help="write triples straight to the output file instead of building an in-memory graph "
+                             "(ttl is then written as N-Triples-style Turtle, one triple per line under the prefixes)")
+    parser.add_argument("--format", choices=FORMATS, default="ttl", help="output format")
+    parser.add_argument("--compress", choices=COMPRESSIONS, help="compress the output file on the fly")
+    args = parser.parse_args()
+
+    data = load_density("./care-providers/narodni-registr-poskytovatelu-zdravotnich-sluzeb.csv",
+                        "./population-2021/130141-22data2021.csv")
+    destination = output_name("care-provider-density", args.format, args.compress)
+    if args.stream:
+        write_data_cube(data, destination, args.format)
+    else:
+        write_graph(as_data_cube(data), destination, args.format)
+
+
+if __name__ == "__main__":
+    main()
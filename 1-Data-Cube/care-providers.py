@@ -1,9 +1,25 @@
 #!/usr/bin/env python3
+import argparse
+import base64
+import io
+import json
+import os
+from contextlib import contextmanager
 import pandas as pd
 import numpy as np
 
 from rdflib import Graph, BNode, Literal, Namespace 
 from rdflib.namespace import RDF, QB, XSD, SKOS, DCTERMS, OWL
+from batch_triples import TERMS, Iri, Lit, add_rows
+from triple_writer import TripleWriter
+from binary_cube import FORMAT as BINARY_FORMAT, BinaryCubeWriter
+from columnar_store import ColumnarStore
+from rdf_output import COMPRESSIONS, FORMATS, compression_of, open_input, open_output, output_name, write_graph, writer_format
+from csv_cache import CARE_PROVIDERS_CATEGORICAL, file_sha256, read_csv_cached
+from schema_cache import add_cached_schema
+from cube_validation import ValidatingCollector
+from sharded_output import write_shards
+from code_registry import encode, update_codelist
 
 NS = Namespace("https://ndbi046-martincorovcak.com/ontology#")
 NSR = Namespace("https://ndbi046-martincorovcak.com/resources/")
@@ -14,26 +30,114 @@ SDMX_CONCEPT = Namespace("http://purl.org/linked-data/sdmx/2009/concept#")
 SDMX_MEASURE = Namespace("http://purl.org/linked-data/sdmx/2009/measure#")
 SDMX_CODE = Namespace("http://purl.org/linked-data/sdmx/2009/code#")
 
+PREFIXES = {
+    "ns": NS, "nsr": NSR, "rdfs": RDFS, "qb": QB, "skos": SKOS, "dcterms": DCTERMS,
+    "sdmx-concept": SDMX_CONCEPT, "sdmx-measure": SDMX_MEASURE, "sdmx-code": SDMX_CODE,
+}
+
+# One observation per (county, region, field of care) cell
+OBSERVATION_KEY = ["OkresCode", "KrajCode", "OborPeceCode"]
+# Code of the aggregated dimensions of roll-up observations, e.g. "county/TOTAL" for the observations of a whole region
+TOTAL = "TOTAL"
+# Frames kept in the state file of the incremental mode
+STATE_FRAMES = ["counties", "regions", "fields", "observations"]
+# Cell of a register row, see `source_rows`
+ROW_CELL = ["OkresCode", "KrajCode", "OborPece"]
+# Registry of the field of care codes, see code_registry.py
+CODES_FILE = "care-providers.codes.json"
+
 
 def load_csv_file_as_object(file_path: str):
-    result = pd.read_csv(file_path, low_memory=False)
+    result = read_csv_cached(file_path, categorical=CARE_PROVIDERS_CATEGORICAL, low_memory=False)
     return result
 
 
-def as_data_cube(data):
-    result = Graph(bind_namespaces="rdflib")
-    
-    create_concept_schemes(result)
-    create_resource_classes(result)
-    create_resources(result, data)
-    dimensions = create_dimensions(result)
-    measures = create_measure(result)
-    structure = create_structure(result, dimensions, measures)
-    dataset = create_dataset(result, structure)
-    create_observations(result, dataset, data)
+def as_data_cube(data, store="default", rollup: bool = False, fields_of_care=None):
+    result = Graph(store, bind_namespaces="rdflib")
+    build_data_cube(result, data, rollup, fields_of_care)
     return result
 
 
+def write_data_cube(data, destination: str, format: str = "ttl", validate: bool = False, rollup: bool = False,
+                    fields_of_care=None):
+    """Stream the data cube straight to a file without building an in-memory graph.
+
+    Args:
+        data (pd.DataFrame): Source data.
+        destination (str): Path to the output file.
+        format (str, optional): One of `rdf_output.FORMATS` or "ndbc" (binary_cube.py). Defaults to "ttl".
+            Text output is compressed when `destination` ends with ".gz" (gzip) or ".zst" (zstd).
+        validate (bool, optional): Check the integrity constraints of `ValidatingCollector.report` once
+            the cube is written. The cube is written to "<destination>.part" and only renamed to
+            `destination` when all of them hold, otherwise ValueError is raised. Defaults to False.
+        rollup (bool, optional): Add the roll-up observations and slices, see `build_data_cube`. Defaults to False.
+        fields_of_care (list, optional): All known fields of care, see `get_resources`.
+
+    Returns:
+        dict: Result of every check when validating, None otherwise.
+    """
+    if not validate:
+        with open_collector(destination, format) as writer:
+            build_data_cube(writer, data, rollup, fields_of_care)
+        return None
+
+    part = destination + ".part"
+    try:
+        with open_collector(part, format, compression_of(destination)) as writer:
+            validator = ValidatingCollector(writer)
+            build_data_cube(validator, data, rollup, fields_of_care)
+            report = validator.check()
+    except BaseException:
+        os.remove(part)
+        raise
+    os.replace(part, destination)
+    return report
+
+
+@contextmanager
+def open_collector(destination: str, format: str, compression: str = None):
+    """Writer of `format` (see `write_data_cube`) writing to `destination`."""
+    if format == BINARY_FORMAT:
+        with BinaryCubeWriter(destination) as writer:
+            yield writer
+    else:
+        with open_output(destination, compression) as stream:
+            with TripleWriter(stream, writer_format(format), PREFIXES) as writer:
+                yield writer
+
+
+def build_data_cube(collector, data, rollup: bool = False, fields_of_care=None):
+    """Add the data cube of `data` to `collector`.
+
+    With `rollup`, the counts are also summed up from counties to regions and the whole country, per field
+    of care and over all fields (see `roll_up`), and published as extra observations. Every observation is
+    also linked from a `qb:Slice` of its area (`ns:sliceByArea`) and of its field of care (`ns:sliceByFieldOfCare`),
+    so the totals and all observations of an area or a field are direct lookups.
+    """
+    if not rollup:
+        dataset = add_cached_schema(collector, create_schema)
+        create_resources(collector, data, fields_of_care)
+        create_observations(collector, dataset, data)
+        return
+
+    dataset = add_cached_schema(collector, create_rollup_schema)
+    create_resources(collector, data, fields_of_care)
+    observations = count_care_providers(data)
+    aggregates = roll_up(observations)
+    add_observations(collector, dataset, observations)
+    add_observations(collector, dataset, aggregates)
+    add_slices(collector, dataset, pd.concat([observations, aggregates], ignore_index=True))
+
+
+def create_schema(collector):
+    create_concept_schemes(collector)
+    create_resource_classes(collector)
+    dimensions = create_dimensions(collector)
+    measures = create_measure(collector)
+    structure = create_structure(collector, dimensions, measures)
+    return create_dataset(collector, structure)
+
+
 def create_concept_schemes(collector: Graph):
     county = NSR.county
     collector.add((county, RDF.type, SKOS.ConceptScheme))
@@ -89,39 +193,63 @@ def create_resource_classes(collector: Graph):
     collector.add((field_of_care, RDFS.seeAlso, NSR.fieldOfCare))
 
 
-def create_resources(collector: Graph, data: pd.DataFrame):
-    counties = data.drop_duplicates("OkresCode")[["OkresCode", "Okres"]].dropna(subset="OkresCode")
-    for _, c in counties.iterrows():
-        county = NSR[f"county/{c['OkresCode']}"]
-        collector.add((county, RDF.type, SKOS.Concept))
-        collector.add((county, RDF.type, SDMX_CODE.Area))
-        collector.add((county, RDF.type, NSR.County))
-        collector.add((county, RDFS.label, Literal(c["Okres"], lang="cs")))
-        collector.add((county, SKOS.prefLabel, Literal(c["Okres"], lang="cs")))
-        collector.add((county, SKOS.inScheme, NSR.county))
-        collector.add((county, SKOS.inScheme, SDMX_CODE.area))
+def create_resources(collector: Graph, data: pd.DataFrame, fields_of_care=None):
+    add_resources(collector, *get_resources(data, fields_of_care))
+
+
+def get_resources(data: pd.DataFrame, fields_of_care=None):
+    """Counties, regions and fields of care used in `data`; sets the OborPeceCode column of `data`.
+
+    Args:
+        data (pd.DataFrame): Source data.
+        fields_of_care (list, optional): All known fields of care, the position of a field is its code,
+            e.g. the codelist of `code_registry.update_codelist`. Defaults to the fields of care in `data`
+            in order of appearance.
+
+    Returns:
+        tuple: Counties, regions and fields of care DataFrames.
+    """
+    counties = data.drop_duplicates(["OkresCode"])[["OkresCode", "Okres"]].dropna(subset=["OkresCode"])
+    regions = data.drop_duplicates(["KrajCode"])[["KrajCode", "Kraj"]].dropna(subset=["KrajCode"])
+
+    if fields_of_care is None:
+        fields_of_care = data["OborPece"].unique()
+    foc_index = pd.Index(fields_of_care, dtype=object)
+    data["OborPeceCode"] = encode(data["OborPece"], foc_index)
+    fields = pd.DataFrame({"OborPeceCode": np.arange(len(foc_index)), "OborPece": foc_index})
+    fields = fields[fields["OborPeceCode"].isin(data["OborPeceCode"])]
+
+    return counties, regions, fields
+
+
+def add_resources(collector: Graph, counties: pd.DataFrame, regions: pd.DataFrame, fields_of_care: pd.DataFrame):
+    add_rows(collector, counties, Iri(NSR, "county/{OkresCode}"), [
+        (RDF.type, SKOS.Concept),
+        (RDF.type, SDMX_CODE.Area),
+        (RDF.type, NSR.County),
+        (RDFS.label, Lit("Okres", lang="cs")),
+        (SKOS.prefLabel, Lit("Okres", lang="cs")),
+        (SKOS.inScheme, NSR.county),
+        (SKOS.inScheme, SDMX_CODE.area),
+    ])
     
-    regions = data.drop_duplicates("KrajCode")[["KrajCode", "Kraj"]].dropna(subset="KrajCode")
-    for _, r in regions.iterrows():
-        region = NSR[f"region/{r['KrajCode']}"]
-        collector.add((region, RDF.type, SKOS.Concept))
-        collector.add((region, RDF.type, SDMX_CODE.Area))
-        collector.add((region, RDF.type, NSR.Region))
-        collector.add((region, RDFS.label, Literal(r["Kraj"], lang="cs")))
-        collector.add((region, SKOS.prefLabel, Literal(r["Kraj"], lang="cs")))
-        collector.add((region, SKOS.inScheme, NSR.region))
-        collector.add((region, SKOS.inScheme, SDMX_CODE.area))
+    add_rows(collector, regions, Iri(NSR, "region/{KrajCode}"), [
+        (RDF.type, SKOS.Concept),
+        (RDF.type, SDMX_CODE.Area),
+        (RDF.type, NSR.Region),
+        (RDFS.label, Lit("Kraj", lang="cs")),
+        (SKOS.prefLabel, Lit("Kraj", lang="cs")),
+        (SKOS.inScheme, NSR.region),
+        (SKOS.inScheme, SDMX_CODE.area),
+    ])
     
-    fields_of_care = data["OborPece"].unique()
-    foc_index = pd.Index(fields_of_care)
-    data["OborPeceCode"] = data["OborPece"].apply(lambda x: foc_index.get_loc(x))
-    for index in range(len(fields_of_care)):
-        field_of_care = NSR[f"fieldOfCare/{index}"]
-        collector.add((field_of_care, RDF.type, SKOS.Concept))
-        collector.add((field_of_care, RDF.type, NSR.FieldOfCare))
-        collector.add((field_of_care, RDFS.label, Literal(fields_of_care[index], lang="cs")))
-        collector.add((field_of_care, SKOS.prefLabel, Literal(fields_of_care[index], lang="cs")))
-        collector.add((field_of_care, SKOS.inScheme, NSR.fieldOfCare))
+    add_rows(collector, fields_of_care, Iri(NSR, "fieldOfCare/{OborPeceCode}"), [
+        (RDF.type, SKOS.Concept),
+        (RDF.type, NSR.FieldOfCare),
+        (RDFS.label, Lit("OborPece", lang="cs")),
+        (SKOS.prefLabel, Lit("OborPece", lang="cs")),
+        (SKOS.inScheme, NSR.fieldOfCare),
+    ])
 
 
 def create_dimensions(collector: Graph):
@@ -169,7 +297,8 @@ def create_measure(collector: Graph):
     return [num_of_care_providers]
 
 
-def create_structure(collector: Graph, dimensions, measures):
+def create_structure(collector: Graph, dimensions, measures, normalized: bool = False):
+    """DSD of `dimensions` and `measures`, `normalized` also states every component with qb:componentProperty."""
     structure = NS.structure
     collector.add( ( structure, RDF.type, QB.DataStructureDefinition ) )
 
@@ -177,11 +306,15 @@ def create_structure(collector: Graph, dimensions, measures):
         component = BNode()
         collector.add((structure, QB.component, component))
         collector.add((component, QB.dimension, dimension))
+        if normalized:
+            collector.add((component, QB.componentProperty, dimension))
 
     for measure in measures:
         component = BNode()
         collector.add((structure, QB.component, component))
         collector.add((component, QB.measure, measure))
+        if normalized:
+            collector.add((component, QB.componentProperty, measure))
 
     return structure
 
@@ -203,26 +336,457 @@ def create_dataset(collector: Graph, structure):
 
 
 def create_observations(collector: Graph, dataset, data: pd.DataFrame):
-    grouped = data.groupby(["OkresCode", "KrajCode", "OborPeceCode"]).size().reset_index(name="PocetPoskytovaluPece")
-    for index, row in grouped.iterrows():
-        resource = NSR["observation-" + str(index).zfill(4)]
-        create_observation(collector, dataset, resource, row)
+    add_observations(collector, dataset, count_care_providers(data))
+
+
+def count_care_providers(data: pd.DataFrame) -> pd.DataFrame:
+    result = data.groupby(OBSERVATION_KEY).size().reset_index(name="PocetPoskytovaluPece")
+    result["ObservationId"] = np.arange(len(result))
+    return result
+
+
+def add_observations(collector: Graph, dataset, observations: pd.DataFrame):
+    add_rows(collector, observations, Iri(NSR, "observation-{ObservationId:04d}"), [
+        (RDF.type, QB.Observation),
+        (QB.dataSet, dataset),
+        (NS.county, Iri(NSR, "county/{OkresCode}")),
+        (NS.region, Iri(NSR, "region/{KrajCode}")),
+        (NS.fieldOfCare, Iri(NSR, "fieldOfCare/{OborPeceCode}")),
+        (NS.numberOfCareProviders, Lit("PocetPoskytovaluPece", datatype=XSD.integer)),
+    ])
+
+
+def roll_up(observations: pd.DataFrame) -> pd.DataFrame:
+    """Sum the counts of `count_care_providers` up the county -> region -> country hierarchy and over all fields of care.
+
+    Every combination of an area level (county, region, country) and a field of care level (single field,
+    all fields) but the finest one is computed from the counts, without going back to the source rows.
+    Aggregated dimensions get the code `TOTAL`.
+
+    Returns:
+        pd.DataFrame: The aggregates, with the columns of `observations` and numbered after them.
+    """
+    counts = observations[OBSERVATION_KEY + ["PocetPoskytovaluPece"]]
+    levels = []
+    for area in [["OkresCode", "KrajCode"], ["KrajCode"], []]:
+        for field in [["OborPeceCode"], []]:
+            keys = area + field
+            if keys == OBSERVATION_KEY:
+                continue
+            if keys:
+                level = counts.groupby(keys, sort=True, observed=True)["PocetPoskytovaluPece"].sum().reset_index()
+            else:
+                level = pd.DataFrame({"PocetPoskytovaluPece": [counts["PocetPoskytovaluPece"].sum()]})
+            levels.append(level.astype(object).reindex(columns=OBSERVATION_KEY + ["PocetPoskytovaluPece"], fill_value=TOTAL))
+
+    result = pd.concat(levels, ignore_index=True)
+    result["PocetPoskytovaluPece"] = result["PocetPoskytovaluPece"].astype("int64")
+    start = int(observations["ObservationId"].max()) + 1 if len(observations) else 0
+    result["ObservationId"] = np.arange(start, start + len(result))
+    return result
+
+
+def create_rollup_schema(collector):
+    create_concept_schemes(collector)
+    create_resource_classes(collector)
+    dimensions = create_dimensions(collector)
+    measures = create_measure(collector)
+    # Slice keys list their dimensions with qb:componentProperty, which has to match the components of the DSD
+    structure = create_structure(collector, dimensions, measures, normalized=True)
+    create_slice_keys(collector, structure)
+    create_total_codes(collector)
+    return create_dataset(collector, structure)
+
+
+def create_slice_keys(collector: Graph, structure):
+    by_area = NS.sliceByArea
+    collector.add((by_area, RDF.type, QB.SliceKey))
+    collector.add((by_area, RDFS.label, Literal("Řez podle území", lang="cs")))
+    collector.add((by_area, RDFS.label, Literal("Slice by area", lang="en")))
+    collector.add((by_area, QB.componentProperty, NS.county))
+    collector.add((by_area, QB.componentProperty, NS.region))
+    collector.add((structure, QB.sliceKey, by_area))
+
+    by_field_of_care = NS.sliceByFieldOfCare
+    collector.add((by_field_of_care, RDF.type, QB.SliceKey))
+    collector.add((by_field_of_care, RDFS.label, Literal("Řez podle oboru péče", lang="cs")))
+    collector.add((by_field_of_care, RDFS.label, Literal("Slice by field of care", lang="en")))
+    collector.add((by_field_of_care, QB.componentProperty, NS.fieldOfCare))
+    collector.add((structure, QB.sliceKey, by_field_of_care))
+
+
+def create_total_codes(collector: Graph):
+    for code_list, code_class, path in [(NSR.county, NSR.County, "county"), (NSR.region, NSR.Region, "region"),
+                                        (NSR.fieldOfCare, NSR.FieldOfCare, "fieldOfCare")]:
+        total = NSR[f"{path}/{TOTAL}"]
+        collector.add((total, RDF.type, SKOS.Concept))
+        collector.add((total, RDF.type, code_class))
+        collector.add((total, RDFS.label, Literal("Celkem", lang="cs")))
+        collector.add((total, RDFS.label, Literal("Total", lang="en")))
+        collector.add((total, SKOS.prefLabel, Literal("Celkem", lang="cs")))
+        collector.add((total, SKOS.prefLabel, Literal("Total", lang="en")))
+        collector.add((total, SKOS.notation, Literal(TOTAL)))
+        collector.add((total, SKOS.inScheme, code_list))
+
+
+def add_slices(collector: Graph, dataset, observations: pd.DataFrame):
+    """Add a slice of every area and every field of care in `observations` and link the observations from them."""
+    areas = observations.drop_duplicates(["OkresCode", "KrajCode"])
+    add_rows(collector, areas, Iri(NSR, "slice/area/{KrajCode}/{OkresCode}"), [
+        (RDF.type, QB.Slice),
+        (QB.sliceStructure, NS.sliceByArea),
+        (NS.county, Iri(NSR, "county/{OkresCode}")),
+        (NS.region, Iri(NSR, "region/{KrajCode}")),
+    ])
+    add_rows(collector, areas, Iri(dataset, ""), [(QB.slice, Iri(NSR, "slice/area/{KrajCode}/{OkresCode}"))])
+    add_rows(collector, observations, Iri(NSR, "slice/area/{KrajCode}/{OkresCode}"), [
+        (QB.observation, Iri(NSR, "observation-{ObservationId:04d}")),
+    ])
+
+    fields_of_care = observations.drop_duplicates("OborPeceCode")
+    add_rows(collector, fields_of_care, Iri(NSR, "slice/fieldOfCare/{OborPeceCode}"), [
+        (RDF.type, QB.Slice),
+        (QB.sliceStructure, NS.sliceByFieldOfCare),
+        (NS.fieldOfCare, Iri(NSR, "fieldOfCare/{OborPeceCode}")),
+    ])
+    add_rows(collector, fields_of_care, Iri(dataset, ""), [(QB.slice, Iri(NSR, "slice/fieldOfCare/{OborPeceCode}"))])
+    add_rows(collector, observations, Iri(NSR, "slice/fieldOfCare/{OborPeceCode}"), [
+        (QB.observation, Iri(NSR, "observation-{ObservationId:04d}")),
+    ])
+
+
+def write_sharded_data_cube(data, directory: str, dimension: str = "KrajCode", format: str = "ttl", compression: str = None,
+                            jobs: int = None, only=None, fields_of_care=None) -> dict:
+    """Write the data cube as a schema file and one file of observations per value of `dimension`.
+
+    See `sharded_output.write_shards`. The schema file holds the DSD, the data set and all counties,
+    regions and fields of care, so every shard together with it is a valid data cube.
+
+    Args:
+        data (pd.DataFrame): Source data.
+        directory (str): Output directory.
+        dimension (str, optional): One of `OBSERVATION_KEY`. Defaults to "KrajCode".
+        format (str, optional): See `write_data_cube`. Defaults to "ttl".
+        compression (str, optional): "gzip" or "zstd". Defaults to None.
+        jobs (int, optional): Number of worker processes. Defaults to the number of CPUs.
+        only (iterable, optional): Codes whose shards are rewritten. Defaults to rewriting all shards.
+        fields_of_care (list, optional): All known fields of care, see `get_resources`.
+
+    Returns:
+        dict: The manifest.
+    """
+    if dimension not in OBSERVATION_KEY:
+        raise ValueError(f"Cannot shard by '{dimension}', expected one of {OBSERVATION_KEY}")
+    resources = get_resources(data, fields_of_care)
+    observations = count_care_providers(data)
+    dataset = None
+
+    def write_schema(path):
+        nonlocal dataset
+        with open_collector(path, format, compression) as writer:
+            dataset = add_cached_schema(writer, create_schema)
+            add_resources(writer, *resources)
+        return writer.count
+
+    def write_shard(path, shard):
+        with open_collector(path, format, compression) as writer:
+            add_observations(writer, dataset, shard)
+        return writer.count
+
+    extension = "." + BINARY_FORMAT if format == BINARY_FORMAT else output_name("", format, compression)
+    return write_shards(directory, extension, write_schema, write_shard, observations, dimension, jobs, only, OBSERVATION_KEY)
+
+
+def write_incremental_data_cube(data, destination: str, state_path: str, source_hash: str, format: str = "ttl"):
+    """Update the data cube of the previous run with the rows that changed in the register and write what changed.
+
+    The previous run keeps a hash of every register row in the state file. The rows of `data` are hashed
+    and compared with them, only the (county, region, field of care) cells of added and removed rows are
+    counted again, and the previous output is patched: the triples of the changed cells and resources are
+    dropped from it and their new triples appended. Counting and rendering thus cost time proportional
+    to the change, the rest of the register is only hashed and the output file copied line by line.
+    Without a previous output (or state) the whole cube is written.
+
+    Fields of care and observations keep the codes and IRIs they got in the previous run, new ones
+    are numbered after them. The changed triples are written to "<destination>.added.nt" and
+    "<destination>.removed.nt" (without the format and compression suffixes). The static schema is never
+    part of the delta. Without a state file, all resources and observations are added.
+
+    Args:
+        data (pd.DataFrame): Source data.
+        destination (str): Path to the output file, compressed when it ends with ".gz" or ".zst".
+        state_path (str): Path to the state file, updated after a successful run.
+        source_hash (str): Hash of the source file, nothing is rebuilt when it is unchanged.
+        format (str, optional): One of `rdf_output.FORMATS`. Defaults to "ttl".
+
+    Returns:
+        tuple: Number of added and removed triples.
+    """
+    stem = os.path.splitext(destination.removesuffix(COMPRESSIONS.get(compression_of(destination), "")))[0]
+    previous = load_state(state_path)
+    if previous is not None and previous["source"] == source_hash and os.path.exists(destination):
+        write_delta(stem, set(), set())
+        return 0, 0
+
+    rows = source_rows(data)
+    known = pd.Index(previous["fields_of_care"] if previous else [], dtype=object)
+    dataset = NSR.CareProviders
+    patch = previous is not None and "rows" in previous and os.path.exists(destination)
+    if patch:
+        delta = changed_cells(previous["rows"], rows)
+        added_fields = delta.loc[delta["change"] > 0, "OborPece"].unique()
+        fields_of_care = known.append(pd.Index(added_fields, dtype=object).difference(known, sort=False))
+        resources = get_resources(data, fields_of_care)
+        observations, (old_cells, new_cells) = update_observations(previous["observations"], delta, fields_of_care)
+        changes = [changed_rows(previous[name], new) for name, new in zip(STATE_FRAMES, resources)] + [(old_cells, new_cells)]
+    else:
+        fields_of_care = known.append(pd.Index(data["OborPece"].unique(), dtype=object).difference(known, sort=False))
+        resources = get_resources(data, fields_of_care)
+        observations = count_care_providers(data)
+        if previous is not None:
+            observations = reuse_observation_ids(observations, previous["observations"])
+        with open_output(destination) as stream:
+            with TripleWriter(stream, writer_format(format), PREFIXES) as writer:
+                dataset = add_cached_schema(writer, create_schema)
+                add_resources(writer, *resources)
+                add_observations(writer, dataset, observations)
+        old_frames = [previous[name] for name in STATE_FRAMES] if previous else [frame.iloc[:0] for frame in resources + (observations,)]
+        changes = [changed_rows(old, new) for old, new in zip(old_frames, resources + (observations,))]
+
+    old_lines = render_lines(add_resources, *[old for old, _ in changes[:3]]) | render_lines(add_observations, dataset, changes[3][0])
+    new_lines = render_lines(add_resources, *[new for _, new in changes[:3]]) | render_lines(add_observations, dataset, changes[3][1])
+    added, removed = new_lines - old_lines, old_lines - new_lines
+    if patch:
+        patch_output(destination, added, removed)
+    write_delta(stem, added, removed)
+
+    save_state(state_path, source_hash, fields_of_care, resources + (observations,), rows)
+    return len(added), len(removed)
+
+
+def source_rows(data: pd.DataFrame) -> dict:
+    """Hashes of the register rows and their cells, the way the state file keeps them.
+
+    Returns:
+        dict: "hash" (a hash of every row), "cells" (the distinct `ROW_CELL` values) and "cell"
+            (the position of the cell of every row in "cells").
+    """
+    codes, uniques = zip(*(pd.factorize(data[column], use_na_sentinel=False) for column in ROW_CELL))
+    key = np.ravel_multi_index(codes, [max(len(values), 1) for values in uniques])
+    _, first, cell = np.unique(key, return_index=True, return_inverse=True)
+    return {
+        "hash": pd.util.hash_pandas_object(data, index=False).to_numpy(),
+        "cells": data[ROW_CELL].iloc[first].astype(object).reset_index(drop=True),
+        "cell": cell.astype(np.int32),
+    }
+
+
+def changed_cells(old_rows: dict, new_rows: dict) -> pd.DataFrame:
+    """Cells of the register rows added or removed between `old_rows` and `new_rows` (see `source_rows`).
+
+    Rows are compared as a multiset of their hashes, sorted together once. Equal rows have the same cell,
+    so a changed row is represented by one of its occurrences and the change of its count.
+
+    Returns:
+        pd.DataFrame: `ROW_CELL` columns and the "change" of the number of rows.
+    """
+    hashes = np.concatenate([old_rows["hash"], new_rows["hash"]])
+    signs = np.concatenate([np.full(len(old_rows["hash"]), -1), np.ones(len(new_rows["hash"]), dtype=np.int64)])
+    unique, inverse = np.unique(hashes, return_inverse=True)
+    change = np.bincount(inverse, weights=signs, minlength=len(unique)).astype(np.int64)
+
+    result = []
+    for rows, changed in [(old_rows, unique[change < 0]), (new_rows, unique[change > 0])]:
+        positions = np.flatnonzero(np.isin(rows["hash"], changed))
+        # One occurrence of every changed row
+        changed, first = np.unique(rows["hash"][positions], return_index=True)
+        cells = rows["cells"].iloc[rows["cell"][positions[first]]]
+        result.append(cells.assign(change=change[np.searchsorted(unique, changed)]))
+    return pd.concat(result, ignore_index=True)
+
+
+def update_observations(observations: pd.DataFrame, delta: pd.DataFrame, fields_of_care):
+    """Apply the changed cells of the register (see `changed_cells`) to the observations of the previous run.
+
+    Only the changed cells are counted. Cells whose count drops to zero lose their observation, new cells
+    are numbered after the previous observations.
+
+    Returns:
+        tuple: All observations and the (previous, updated) observations of the cells whose count changed.
+    """
+    delta = delta.assign(OborPeceCode=encode(delta["OborPece"], pd.Index(fields_of_care, dtype=object)))
+    changes = delta.groupby(OBSERVATION_KEY)["change"].sum()
+    changes = changes[changes != 0].reset_index()
+
+    cells = changes.merge(observations, on=OBSERVATION_KEY, how="left")
+    old_cells = cells.loc[cells["ObservationId"].notna(), observations.columns].astype(observations.dtypes.to_dict())
+    cells["PocetPoskytovaluPece"] = cells["PocetPoskytovaluPece"].fillna(0).astype("int64") + cells["change"]
+    new = cells["ObservationId"].isna()
+    start = int(observations["ObservationId"].max()) + 1 if len(observations) else 0
+    cells.loc[new, "ObservationId"] = np.arange(start, start + new.sum())
+    new_cells = cells.loc[cells["PocetPoskytovaluPece"] > 0, observations.columns].astype(observations.dtypes.to_dict())
+
+    unchanged = observations[~observations["ObservationId"].isin(old_cells["ObservationId"])]
+    result = pd.concat([unchanged, new_cells], ignore_index=True).sort_values("ObservationId", ignore_index=True)
+    return result, (old_cells, new_cells)
+
+
+def patch_output(destination: str, added: set, removed: set):
+    """Rewrite `destination` without the `removed` lines and with the `added` lines appended.
+
+    Resources and observations are written as N-Triples lines in every format (see `batch_triples.add_rows`),
+    so the triples of the delta are whole lines of the output.
+    """
+    part = destination + ".part"
+    with io.TextIOWrapper(open_input(destination), encoding="utf-8") as source:
+        with open_output(part, compression_of(destination)) as stream:
+            stream.writelines(line for line in source if line.rstrip("\n") not in removed)
+            stream.writelines(line + "\n" for line in sorted(added))
+    os.replace(part, destination)
+
+
+def reuse_observation_ids(observations: pd.DataFrame, previous: pd.DataFrame) -> pd.DataFrame:
+    result = observations.drop(columns="ObservationId").merge(
+        previous[OBSERVATION_KEY + ["ObservationId"]], on=OBSERVATION_KEY, how="left")
+    new = result["ObservationId"].isna()
+    start = int(previous["ObservationId"].max()) + 1 if len(previous) else 0
+    result.loc[new, "ObservationId"] = np.arange(start, start + new.sum())
+    result["ObservationId"] = result["ObservationId"].astype("int64")
+    return result
 
 
-def create_observation(collector: Graph, dataset, resource, data):
-    collector.add((resource, RDF.type, QB.Observation))
-    collector.add((resource, QB.dataSet, dataset))
-    collector.add((resource, NS.county, NSR[f"county/{data['OkresCode']}"]))
-    collector.add((resource, NS.region, NSR[f"region/{data['KrajCode']}"]))
-    collector.add((resource, NS.fieldOfCare, NSR[f"fieldOfCare/{data['OborPeceCode']}"]))
-    collector.add((resource, NS.numberOfCareProviders, Literal(data["PocetPoskytovaluPece"], datatype=XSD.integer)))
+def changed_rows(old: pd.DataFrame, new: pd.DataFrame):
+    """Rows only in `old` and rows only in `new`, compared over all columns."""
+    merged = old.astype(object).merge(new.astype(object), how="outer", indicator=True)
+    columns = list(new.columns)
+    return merged.loc[merged["_merge"] == "left_only", columns], merged.loc[merged["_merge"] == "right_only", columns]
+
+
+def render_lines(add, *args) -> set:
+    stream = io.StringIO()
+    with TripleWriter(stream, "nt") as writer:
+        add(writer, *args)
+    return set(stream.getvalue().splitlines())
+
+
+def write_delta(stem: str, added: set, removed: set):
+    for suffix, lines in [("added", added), ("removed", removed)]:
+        with open(f"{stem}.{suffix}.nt", "w", encoding="utf-8") as f:
+            f.writelines(line + "\n" for line in sorted(lines))
+
+
+def load_state(path: str):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        state = json.load(f)
+    for name in STATE_FRAMES:
+        state[name] = pd.DataFrame(state[name]["data"], columns=state[name]["columns"])
+    # State files of older versions have no register rows, their cube is written again in full
+    if "rows" in state:
+        rows = state["rows"]
+        state["rows"] = {
+            "hash": np.frombuffer(base64.b64decode(rows["hash"]), dtype=np.uint64),
+            "cells": pd.DataFrame(rows["cells"], columns=ROW_CELL, dtype=object),
+            "cell": np.frombuffer(base64.b64decode(rows["cell"]), dtype=np.int32),
+        }
+    return state
+
+
+def save_state(path: str, source_hash: str, fields_of_care, frames, rows: dict):
+    state = {"source": source_hash, "fields_of_care": list(fields_of_care)}
+    for name, frame in zip(STATE_FRAMES, frames):
+        state[name] = json.loads(frame.to_json(orient="split", index=False))
+    # The arrays of the register rows (see `source_rows`) are kept base64-encoded
+    cells = rows["cells"]
+    state["rows"] = {
+        "hash": base64.b64encode(rows["hash"].tobytes()).decode(),
+        "cells": cells.where(cells.notna(), None).values.tolist(),
+        "cell": base64.b64encode(rows["cell"].tobytes()).decode(),
+    }
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        # dumps uses the C encoder, dump does not
+        f.write(json.dumps(state, ensure_ascii=False))
+    os.replace(path + ".tmp", path)
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Generates the Care Providers RDF Data Cube.")
+    parser.add_argument("--stream", action="store_true",
+                        help="write triples straight to the output file instead of building an in-memory graph "
+                             "(ttl is then written as N-Triples-style Turtle, one triple per line under the prefixes)")
+    parser.add_argument("--validate", action="store_true",
+                        help="check integrity constraints IC1, IC11, IC14 and IC19 while writing the triples "
+                             "(implies --stream), the output file is only written when they hold")
+    parser.add_argument("--format", choices=[*FORMATS, BINARY_FORMAT], default="ttl",
+                        help="output format, N-Triples (nt) and N-Quads (nq) are written line by line in a single pass, "
+                             "ndbc is the binary dictionary-encoded format of binary_cube.py (implies --stream)")
+    parser.add_argument("--compress", choices=COMPRESSIONS, help="compress the output file on the fly")
+    parser.add_argument("--incremental", action="store_true",
+                        help="keep the codes of the previous run (stored in care-providers.state.json) and write "
+                             "the added and removed triples to care-providers.added.nt and care-providers.removed.nt")
+    parser.add_argument("--shard-by", choices=OBSERVATION_KEY, metavar="COLUMN",
+                        help=f"write the observations to one file per value of COLUMN (one of {', '.join(OBSERVATION_KEY)}) "
+                             "in care-providers-shards/, next to a schema file and a manifest")
+    parser.add_argument("--refresh", action="append", metavar="CODE",
+                        help="with --shard-by, rewrite only the shard of CODE (may be repeated)")
+    parser.add_argument("--rollup", action="store_true",
+                        help="add observations of the regions, the whole country and all fields of care (coded TOTAL) "
+                             "and a qb:Slice of every area and field of care")
+    parser.add_argument("--graph-store", choices=["memory", "columnar"], default="memory",
+                        help="store of the in-memory graph, columnar keeps the triples as NumPy arrays of term ids "
+                             "(columnar_store.py) and needs a fraction of the memory of rdflib's default store")
+    parser.add_argument("--codes", default=CODES_FILE, metavar="PATH",
+                        help="registry of the field of care codes, known fields keep their codes across runs and new "
+                             "fields are appended (not used with --incremental, which keeps the codes in its state file)")
+    parser.add_argument("--term-stats", action="store_true",
+                        help="print how many of the terms created for the rows were served from the interning cache "
+                             "(in-memory graph only, the other modes write the rows without creating terms)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="number of worker processes writing shards (defaults to the number of CPUs)")
+    args = parser.parse_args()
+    if args.format == BINARY_FORMAT and (args.compress or args.incremental):
+        parser.error(f"the {BINARY_FORMAT} format is memory-mapped, it can neither be compressed nor written incrementally")
+    if args.rollup and (args.shard_by or args.incremental):
+        parser.error("--rollup cannot be combined with --shard-by or --incremental")
+    if args.shard_by and args.incremental:
+        parser.error("--shard-by cannot be combined with --incremental, use --refresh to rewrite single shards")
+    if args.validate and (args.shard_by or args.incremental):
+        parser.error("--validate cannot be combined with --shard-by or --incremental, "
+                     "check the written files with integrity-constraints.py instead")
+    if args.term_stats and (args.stream or args.validate or args.format == BINARY_FORMAT or args.shard_by or args.incremental):
+        parser.error("--term-stats needs the in-memory graph, it cannot be combined with --stream, --validate, "
+                     f"--format {BINARY_FORMAT}, --shard-by or --incremental, which write the rows without creating terms")
+
     file_path = "./care-providers/narodni-registr-poskytovatelu-zdravotnich-sluzeb.csv"
+    if args.format == BINARY_FORMAT:
+        destination = f"care-providers.{BINARY_FORMAT}"
+    else:
+        destination = output_name("care-providers", args.format, args.compress)
     data = load_csv_file_as_object(file_path)
-    data_cube = as_data_cube(data)
-    data_cube.serialize(format="ttl", destination="care-providers.ttl")
+    if not args.incremental:
+        fields_of_care = update_codelist(args.codes, "fieldOfCare", data["OborPece"])
+    if args.shard_by:
+        manifest = write_sharded_data_cube(data, "care-providers-shards", args.shard_by, args.format, args.compress,
+                                           args.jobs, args.refresh, fields_of_care)
+        print(f"{len(args.refresh or manifest['shards'])} shards written to care-providers-shards/")
+    elif args.incremental:
+        added, removed = write_incremental_data_cube(data, destination, "care-providers.state.json", file_sha256(file_path), args.format)
+        print(f"{added} triples added, {removed} triples removed")
+    elif args.validate:
+        report = write_data_cube(data, destination, args.format, validate=True, rollup=args.rollup,
+                                 fields_of_care=fields_of_care)
+        for name, result in report.items():
+            print(f"{name}: {result}")
+    elif args.stream or args.format == BINARY_FORMAT:
+        write_data_cube(data, destination, args.format, rollup=args.rollup, fields_of_care=fields_of_care)
+    else:
+        data_cube = as_data_cube(data, ColumnarStore() if args.graph_store == "columnar" else "default", args.rollup,
+                                 fields_of_care)
+        write_graph(data_cube, destination, args.format)
+        if args.term_stats:
+            stats = TERMS.stats()
+            print(f"{stats['hits']} of {stats['hits'] + stats['misses']} terms interned ({stats['hit_rate']:.1%}), {stats['terms']} distinct")
 
 
 if __name__ == "__main__":
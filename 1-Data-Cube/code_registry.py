@@ -0,0 +1,58 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+
+def load_codelist(path: str, name: str) -> pd.Index:
+    """Labels of the codelist `name` in the registry file at `path`, the position of a label is its code."""
+    if not os.path.exists(path):
+        return pd.Index([], dtype=object)
+    with open(path, encoding="utf-8") as f:
+        labels = json.load(f).get(name, [])
+    # A missing label is a label too, stored as null
+    return pd.Index([np.nan if label is None else label for label in labels], dtype=object)
+
+
+def update_codelist(path: str, name: str, values) -> pd.Index:
+    """Register the labels in `values` in the codelist `name` of the registry file at `path`.
+
+    Labels already in the registry keep their codes, new labels are appended in order of their first
+    appearance in `values`, so codes never change between runs. The file (a JSON object of codelist
+    name -> list of labels) is only rewritten when a label was added.
+
+    Args:
+        path (str): Path to the registry file, created if needed.
+        name (str): Name of the codelist, e.g. "fieldOfCare".
+        values: Labels to code, e.g. a DataFrame column.
+
+    Returns:
+        pd.Index: All labels of the codelist, see `encode`.
+    """
+    labels = load_codelist(path, name)
+    _, uniques = pd.factorize(values, use_na_sentinel=False)
+    new = pd.Index(np.asarray(uniques, dtype=object)).difference(labels, sort=False)
+    if len(new) == 0:
+        return labels
+
+    labels = labels.append(new)
+    registry = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            registry = json.load(f)
+    registry[name] = [None if pd.isna(label) else label for label in labels]
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(registry, f, ensure_ascii=False, indent=1)
+    os.replace(path + ".tmp", path)
+    return labels
+
+
+def encode(values, labels: pd.Index) -> np.ndarray:
+    """Codes of `values` in `labels` (-1 for labels not in `labels`).
+
+    `values` are factorized first, so only their distinct labels are looked up and the codes of all
+    rows are a single array take.
+    """
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    return labels.get_indexer(np.asarray(uniques, dtype=object))[codes]
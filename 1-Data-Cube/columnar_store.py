@@ -0,0 +1,152 @@
+from array import array
+
+import numpy as np
+from rdflib.store import Store, VALID_STORE
+
+
+# Index -> order of its columns, every index is sorted by its columns from left to right
+INDEXES = {"spo": (0, 1, 2), "pos": (1, 2, 0), "osp": (2, 0, 1)}
+
+
+class ColumnarStore(Store):
+    """In-memory rdflib Store keeping the triples as NumPy arrays of integer term ids.
+
+    Every distinct term is kept once, in a list indexed by its id (and a dict from the term to the id),
+    a triple takes 12 bytes (three int32 ids) instead of the nested dicts of term objects of the default
+    Memory store. Added triples are only appended to a buffer. They are deduplicated and sorted in SPO order
+    by the first read, the POS and OSP orders are built the first time a pattern needs them; adding more
+    triples drops them again. Serializers read the triples straight from the arrays.
+
+    Use it as `Graph(ColumnarStore())`.
+    """
+
+    context_aware = False
+    formula_aware = False
+    transaction_aware = False
+    graph_aware = False
+
+    def __init__(self, configuration: str = None, identifier=None):
+        self._ids = {}
+        self._terms = []
+        self._pending = array("i")
+        self._indexes = {"spo": np.empty((3, 0), dtype=np.int32)}
+        self._namespace = {}
+        self._prefix = {}
+        super().__init__(configuration, identifier)
+
+    def open(self, configuration: str, create: bool = False):
+        return VALID_STORE
+
+    def add(self, triple, context, quoted: bool = False):
+        Store.add(self, triple, context, quoted)
+        self._pending.extend(map(self._term_id, triple))
+
+    def addN(self, quads):
+        term_id = self._term_id
+        self._pending.extend(term_id(term) for s, p, o, _ in quads for term in (s, p, o))
+
+    def remove(self, triple_pattern, context=None):
+        spo = self._index("spo")
+        matches = np.ones(spo.shape[1], dtype=bool)
+        for row, term in enumerate(triple_pattern):
+            if term is not None:
+                term_id = self._ids.get(term)
+                if term_id is None:
+                    return
+                matches &= spo[row] == term_id
+        if matches.any():
+            self._indexes = {"spo": spo[:, ~matches]}
+
+    def triples(self, triple_pattern, context=None):
+        pattern = []
+        for term in triple_pattern:
+            term_id = self._ids.get(term) if term is not None else None
+            if term is not None and term_id is None:
+                return
+            pattern.append(term_id)
+        terms = self._terms
+        for subject, predicate, obj in self._match(*pattern).T.tolist():
+            yield (terms[subject], terms[predicate], terms[obj]), iter(())
+
+    def __len__(self, context=None) -> int:
+        return self._index("spo").shape[1]
+
+    def contexts(self, triple=None):
+        return iter(())
+
+    def bind(self, prefix: str, namespace, override: bool = True):
+        # Same rules as the bind of rdflib's Memory store
+        bound_namespace = self._namespace.get(prefix)
+        bound_prefix = self._prefix.get(namespace)
+        if bound_prefix is None:
+            bound_prefix = self._prefix.get(bound_namespace)
+        if override:
+            if bound_prefix is not None:
+                del self._namespace[bound_prefix]
+            if bound_namespace is not None:
+                del self._prefix[bound_namespace]
+            self._prefix[namespace] = prefix
+            self._namespace[prefix] = namespace
+        else:
+            namespace = bound_namespace if bound_namespace is not None else namespace
+            prefix = bound_prefix if bound_prefix is not None else prefix
+            self._prefix[namespace] = prefix
+            self._namespace[prefix] = namespace
+
+    def prefix(self, namespace):
+        return self._prefix.get(namespace)
+
+    def namespace(self, prefix: str):
+        return self._namespace.get(prefix)
+
+    def namespaces(self):
+        yield from self._namespace.items()
+
+    def _term_id(self, term) -> int:
+        term_id = self._ids.get(term)
+        if term_id is None:
+            term_id = self._ids[term] = len(self._terms)
+            self._terms.append(term)
+        return term_id
+
+    def _index(self, name: str) -> np.ndarray:
+        if self._pending:
+            added = np.frombuffer(self._pending, dtype=np.int32).reshape(-1, 3).T
+            triples = np.concatenate([self._indexes["spo"], added], axis=1)
+            self._pending = array("i")
+            order = np.lexsort(triples[::-1])
+            triples = triples[:, order]
+            # Sorted, so duplicate triples are next to each other
+            unique = np.ones(triples.shape[1], dtype=bool)
+            unique[1:] = (triples[:, 1:] != triples[:, :-1]).any(axis=0)
+            self._indexes = {"spo": np.ascontiguousarray(triples[:, unique])}
+        index = self._indexes.get(name)
+        if index is None:
+            spo = self._indexes["spo"]
+            index = spo[list(INDEXES[name])]
+            index = self._indexes[name] = np.ascontiguousarray(index[:, np.lexsort(index[::-1])])
+        return index
+
+    def _match(self, subject: int = None, predicate: int = None, obj: int = None) -> np.ndarray:
+        # (3, n) array of the ids of the triples matching the pattern, in subject, predicate, object order
+        pattern = (subject, predicate, obj)
+        bound = [term is not None for term in pattern]
+        if bound[0] and not bound[1] and bound[2]:
+            name = "osp"
+        elif bound[0] or not (bound[1] or bound[2]):
+            name = "spo"
+        elif bound[1]:
+            name = "pos"
+        else:
+            name = "osp"
+        columns = INDEXES[name]
+        index = self._index(name)
+
+        lo, hi = 0, index.shape[1]
+        for row, column in enumerate(columns):
+            if pattern[column] is None:
+                break
+            # A key of the dtype of the index, a Python int would make NumPy convert the whole index first
+            key, values = index.dtype.type(pattern[column]), index[row, lo:hi]
+            lo, hi = lo + np.searchsorted(values, key, "left"), lo + np.searchsorted(values, key, "right")
+        return index[[columns.index(i) for i in range(3)], lo:hi]
@@ -0,0 +1,146 @@
+from rdflib.namespace import RDF, QB, SKOS
+
+
+EMPTY = frozenset()
+
+# Terms in N-Triples form, as the triples are kept by ValidatingCollector
+TYPE = RDF.type.n3()
+OBSERVATION = QB.Observation.n3()
+DATA_SET = QB.dataSet.n3()
+STRUCTURE = QB.structure.n3()
+COMPONENT = QB.component.n3()
+# The constraints assume a normalized cube, where qb:dimension, qb:measure and qb:attribute
+# imply qb:componentProperty
+COMPONENT_PROPERTIES = [QB.componentProperty.n3(), QB.dimension.n3(), QB.measure.n3(), QB.attribute.n3()]
+DIMENSION_PROPERTY = QB.DimensionProperty.n3()
+MEASURE_PROPERTY = QB.MeasureProperty.n3()
+MEASURE_TYPE = QB.measureType.n3()
+CODE_LIST = QB.codeList.n3()
+CONCEPT_SCHEME = SKOS.ConceptScheme.n3()
+CONCEPT = SKOS.Concept.n3()
+IN_SCHEME = SKOS.inScheme.n3()
+
+
+class ValidatingCollector:
+    """Collector checking the structural integrity constraints of the triples passed to `collector`.
+
+    Wraps a `TripleWriter` (or any collector with `add`, `addN` and `add_lines`) and indexes
+    the triples on their way to it, so IC1, IC11, IC14 and IC19 can be checked as soon as
+    the cube is built, without parsing the written file again. The checks follow native_constraints.py,
+    but work on terms in their N-Triples form, so the pre-rendered lines of `add_rows` are indexed
+    without creating any rdflib terms.
+
+    Most violations depend on triples that may still come (a missing value, a code added later), so
+    the checks run in `check` once everything is added. An observation given a second qb:dataSet
+    violates IC1 whatever follows, `add` raises ValueError for it right away.
+    """
+
+    def __init__(self, collector):
+        self.collector = collector
+        self.spo = {}  # predicate -> subject -> objects
+
+    def add(self, triple):
+        self._index(*(term.n3() for term in triple))
+        self.collector.add(triple)
+
+    def addN(self, quads):
+        quads = list(quads)
+        for subject, predicate, obj, _ in quads:
+            self._index(subject.n3(), predicate.n3(), obj.n3())
+        self.collector.addN((subject, predicate, obj, self.collector) for subject, predicate, obj, _ in quads)
+
+    def add_lines(self, lines: str):
+        spo = self.spo
+        for line in lines.splitlines():
+            subject, predicate, rest = line.split(" ", 2)
+            # rest is the object followed by " ."
+            objects = spo.setdefault(predicate, {}).setdefault(subject, set())
+            objects.add(rest[:-2])
+            if predicate == DATA_SET and len(objects) > 1:
+                raise ValueError(f"Data cube violates integrity constraint IC1, {subject} is in several data sets")
+        self.collector.add_lines(lines)
+
+    def report(self) -> dict:
+        """Result of every check, True means the constraint is violated (as with SPARQL ASK)."""
+        return {"IC1": self.ic1(), "IC11": self.ic11(), "IC14": self.ic14(), "IC19": self.ic19()}
+
+    def check(self) -> dict:
+        """Same as `report`, but raises ValueError naming the violated constraints."""
+        report = self.report()
+        violated = [name for name, result in report.items() if result]
+        if violated:
+            raise ValueError(f"Data cube violates integrity constraints {', '.join(violated)}")
+        return report
+
+    def ic1(self) -> bool:
+        """Unique DataSet: every observation has exactly one qb:dataSet."""
+        datasets = self.spo.get(DATA_SET, {})
+        return any(len(datasets.get(obs, EMPTY)) != 1 for obs in self._instances(OBSERVATION))
+
+    def ic11(self) -> bool:
+        """All dimensions required."""
+        dimensions = self._instances(DIMENSION_PROPERTY)
+        return any(
+            not self.spo.get(dim, {}).keys() >= observations
+            for dsd, observations in self._structure_observations()
+            for dim in self._component_properties(dsd) & dimensions
+        )
+
+    def ic14(self) -> bool:
+        """All measures present (cubes without qb:measureType)."""
+        measures = self._instances(MEASURE_PROPERTY)
+        return any(
+            not self.spo.get(measure, {}).keys() >= observations
+            for dsd, observations in self._structure_observations()
+            if MEASURE_TYPE not in self._component_properties(dsd)
+            for measure in self._component_properties(dsd) & measures
+        )
+
+    def ic19(self) -> bool:
+        """Codes from code list (only skos:ConceptScheme code lists)."""
+        concepts = self._instances(CONCEPT)
+        schemes = self._instances(CONCEPT_SCHEME)
+        in_scheme = _invert(self.spo.get(IN_SCHEME, {}))
+        dimensions = self._instances(DIMENSION_PROPERTY)
+        for dsd, observations in self._structure_observations():
+            for dim in self._component_properties(dsd) & dimensions:
+                values = self.spo.get(dim, {})
+                for code_list in self._objects(dim, CODE_LIST) & schemes:
+                    valid = concepts & in_scheme.get(code_list, EMPTY)
+                    if any(not values[obs] <= valid for obs in values.keys() & observations):
+                        return True
+        return False
+
+    def _index(self, subject: str, predicate: str, obj: str):
+        objects = self.spo.setdefault(predicate, {}).setdefault(subject, set())
+        objects.add(obj)
+        if predicate == DATA_SET and len(objects) > 1:
+            raise ValueError(f"Data cube violates integrity constraint IC1, {subject} is in several data sets")
+
+    def _objects(self, subject: str, predicate: str):
+        return self.spo.get(predicate, {}).get(subject, EMPTY)
+
+    def _instances(self, cls: str) -> set:
+        return {subject for subject, types in self.spo.get(TYPE, {}).items() if cls in types}
+
+    def _component_properties(self, dsd: str) -> set:
+        return {
+            prop
+            for component in self._objects(dsd, COMPONENT)
+            for predicate in COMPONENT_PROPERTIES
+            for prop in self._objects(component, predicate)
+        }
+
+    def _structure_observations(self):
+        """(DSD, observations of a data set with that structure) pairs."""
+        for dataset, observations in _invert(self.spo.get(DATA_SET, {})).items():
+            for dsd in self._objects(dataset, STRUCTURE):
+                yield dsd, observations
+
+
+def _invert(subject_objects: dict) -> dict:
+    result = {}
+    for subject, objects in subject_objects.items():
+        for obj in objects:
+            result.setdefault(obj, set()).add(subject)
+    return result
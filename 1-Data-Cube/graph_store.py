@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+import argparse
+import hashlib
+import os
+import sqlite3
+from functools import lru_cache
+
+from rdflib import Graph
+from rdflib.store import Store, VALID_STORE
+from rdflib.util import from_n3
+
+from csv_cache import file_sha256
+from rdf_output import open_input, parse_file
+
+
+CACHE_DIR = os.environ.get("NDBI046_CACHE_DIR", ".cache")
+
+SCHEMA = """
+CREATE TABLE terms (id INTEGER PRIMARY KEY, n3 TEXT NOT NULL UNIQUE);
+CREATE TABLE triples (s INTEGER NOT NULL, p INTEGER NOT NULL, o INTEGER NOT NULL, PRIMARY KEY (s, p, o)) WITHOUT ROWID;
+CREATE INDEX triples_pos ON triples (p, o, s);
+CREATE INDEX triples_osp ON triples (o, s, p);
+CREATE TABLE namespaces (prefix TEXT PRIMARY KEY, uri TEXT NOT NULL);
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+SELECT_TRIPLES = "SELECT ts.n3, tp.n3, tobj.n3 FROM triples t " \
+                 "JOIN terms ts ON ts.id = t.s JOIN terms tp ON tp.id = t.p JOIN terms tobj ON tobj.id = t.o"
+
+# Terms kept in memory while loading, the cache is dropped once it grows past this size
+TERM_CACHE_SIZE = 1 << 18
+
+
+@lru_cache(maxsize=1 << 16)
+def _decode(n3: str):
+    return from_n3(n3)
+
+
+class SQLiteStore(Store):
+    """rdflib Store keeping the triples of a single graph in an SQLite database.
+
+    Terms are dictionary-encoded (table `terms`, by their N-Triples form) and the triples are stored
+    as id triples, indexed as SPO (the primary key), POS and OSP, so every triple pattern is an index
+    range scan. Only a bounded number of decoded terms is kept in memory.
+
+    The database is opened lazily in every process, so a graph over this store can be shared with
+    forked worker processes.
+    """
+
+    context_aware = False
+    formula_aware = False
+    transaction_aware = True
+    graph_aware = False
+
+    def __init__(self, configuration: str = None, identifier=None):
+        self._path = None
+        self._connection = None
+        self._pid = None
+        self._read_only = False
+        self._ids = {}
+        super().__init__(configuration, identifier)
+
+    def open(self, configuration: str, create: bool = False):
+        """Open the database at `configuration`; `create` replaces it with an empty one."""
+        self._path = configuration
+        self._read_only = not create
+        if create:
+            if os.path.exists(configuration):
+                os.remove(configuration)
+            self.connection.executescript(SCHEMA)
+        elif not os.path.exists(configuration):
+            raise ValueError(f"Graph store {configuration} does not exist")
+        return VALID_STORE
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None or self._pid != os.getpid():
+            if self._read_only:
+                self._connection = sqlite3.connect(f"file:{self._path}?mode=ro", uri=True)
+            else:
+                self._connection = sqlite3.connect(self._path)
+                # The database is written to a temporary file and renamed when complete (see load_graph)
+                self._connection.execute("PRAGMA journal_mode = OFF")
+                self._connection.execute("PRAGMA synchronous = OFF")
+            self._pid = os.getpid()
+        return self._connection
+
+    def close(self, commit_pending_transaction: bool = False):
+        if self._connection is not None and self._pid == os.getpid():
+            if commit_pending_transaction:
+                self._connection.commit()
+            self._connection.close()
+        self._connection = None
+
+    def commit(self):
+        self.connection.commit()
+
+    def rollback(self):
+        self.connection.rollback()
+
+    def add(self, triple, context, quoted: bool = False):
+        Store.add(self, triple, context, quoted)
+        self.connection.execute("INSERT OR IGNORE INTO triples VALUES (?, ?, ?)", [self._term_id(term) for term in triple])
+
+    def addN(self, quads):
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO triples VALUES (?, ?, ?)",
+            ([self._term_id(s), self._term_id(p), self._term_id(o)] for s, p, o, _ in quads),
+        )
+
+    def remove(self, triple_pattern, context=None):
+        for triple, _ in list(self.triples(triple_pattern)):
+            Store.remove(self, triple, context)
+            self.connection.execute(
+                "DELETE FROM triples WHERE s = ? AND p = ? AND o = ?", [self._lookup(term) for term in triple]
+            )
+
+    def triples(self, triple_pattern, context=None):
+        conditions = []
+        params = []
+        for column, term in zip("spo", triple_pattern):
+            if term is not None:
+                term_id = self._lookup(term)
+                if term_id is None:
+                    return
+                conditions.append(f"t.{column} = ?")
+                params.append(term_id)
+        query = SELECT_TRIPLES + (" WHERE " + " AND ".join(conditions) if conditions else "")
+        for s, p, o in self.connection.execute(query, params):
+            yield (_decode(s), _decode(p), _decode(o)), iter(())
+
+    def __len__(self, context=None) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM triples").fetchone()[0]
+
+    def contexts(self, triple=None):
+        return iter(())
+
+    def bind(self, prefix: str, namespace, override: bool = True):
+        # Opened stores are read-only, rdflib binding its default prefixes must not write to them
+        if self._read_only:
+            return
+        if override or self.namespace(prefix) is None:
+            self.connection.execute("INSERT OR REPLACE INTO namespaces VALUES (?, ?)", (prefix, str(namespace)))
+
+    def prefix(self, namespace):
+        row = self.connection.execute("SELECT prefix FROM namespaces WHERE uri = ?", (str(namespace),)).fetchone()
+        return row[0] if row else None
+
+    def namespace(self, prefix: str):
+        row = self.connection.execute("SELECT uri FROM namespaces WHERE prefix = ?", (prefix,)).fetchone()
+        return from_n3(f"<{row[0]}>") if row else None
+
+    def namespaces(self):
+        for prefix, uri in self.connection.execute("SELECT prefix, uri FROM namespaces").fetchall():
+            yield prefix, from_n3(f"<{uri}>")
+
+    def get_meta(self, key: str):
+        row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        self.connection.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+
+    def _term_id(self, term) -> int:
+        n3 = term.n3()
+        term_id = self._ids.get(n3)
+        if term_id is None:
+            if len(self._ids) >= TERM_CACHE_SIZE:
+                self._ids.clear()
+            connection = self.connection
+            connection.execute("INSERT OR IGNORE INTO terms (n3) VALUES (?)", (n3,))
+            term_id = self._ids[n3] = connection.execute("SELECT id FROM terms WHERE n3 = ?", (n3,)).fetchone()[0]
+        return term_id
+
+    def _lookup(self, term):
+        row = self.connection.execute("SELECT id FROM terms WHERE n3 = ?", (term.n3(),)).fetchone()
+        return row[0] if row else None
+
+
+def default_store_path(rdf_file_source: str, cache_dir: str = None) -> str:
+    """Store path of an RDF file in `cache_dir` (defaults to $NDBI046_CACHE_DIR or ".cache")."""
+    name = os.path.splitext(os.path.basename(rdf_file_source))[0]
+    key = hashlib.sha256(os.path.abspath(rdf_file_source).encode()).hexdigest()[:16]
+    return os.path.join(cache_dir or CACHE_DIR, f"{name}-{key}.sqlite")
+
+
+def load_graph(rdf_file_source: str, store_path: str = None, rdf_format: str = None) -> Graph:
+    """Open the persistent store of an RDF file, parsing the file into it only when needed.
+
+    The store remembers the sha256 of the file it was loaded from, so it is reused as long as the file
+    is unchanged and the file is parsed again only after it changes. The store is written to a temporary
+    file first and renamed when complete, an interrupted load never leaves a partial store behind.
+
+    Args:
+        rdf_file_source (str): Path to the RDF file, compressed files (.gz, .zst) are decompressed on the fly.
+        store_path (str, optional): Path to the SQLite database. Defaults to `default_store_path`.
+        rdf_format (str, optional): Format of the RDF file, guessed from its extension (without the compression
+            extension) by default.
+
+    Returns:
+        Graph: Read-only graph over the store.
+    """
+    store_path = store_path or default_store_path(rdf_file_source)
+    source_hash = file_sha256(rdf_file_source)
+
+    if os.path.exists(store_path):
+        graph = Graph(SQLiteStore())
+        graph.open(store_path)
+        if graph.store.get_meta("source_sha256") == source_hash:
+            return graph
+        graph.close()
+
+    os.makedirs(os.path.dirname(store_path) or ".", exist_ok=True)
+    temp_path = f"{store_path}.{os.getpid()}.tmp"
+    graph = Graph(SQLiteStore())
+    graph.open(temp_path, create=True)
+    try:
+        if rdf_format is None:
+            parse_file(graph, rdf_file_source)
+        else:
+            with open_input(rdf_file_source) as stream:
+                graph.parse(stream, format=rdf_format)
+        graph.store.set_meta("source", os.path.abspath(rdf_file_source))
+        graph.store.set_meta("source_sha256", source_hash)
+        graph.close(commit_pending_transaction=True)
+    except BaseException:
+        graph.close()
+        os.remove(temp_path)
+        raise
+    os.replace(temp_path, store_path)
+
+    graph = Graph(SQLiteStore())
+    graph.open(store_path)
+    return graph
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Loads an RDF file into a persistent SQLite graph store and queries it.")
+    parser.add_argument("file", help="RDF file, parsed into the store only if it changed since the last run")
+    parser.add_argument("query", nargs="?", help="SPARQL query (or a path to a file with one) evaluated over the store")
+    parser.add_argument("--store", help="path to the store (defaults to a file in $NDBI046_CACHE_DIR or .cache/)")
+    args = parser.parse_args()
+
+    graph = load_graph(args.file, args.store)
+    if args.query is None:
+        print(f"{args.file}: {len(graph)} triples in {args.store or default_store_path(args.file)}")
+        return
+
+    query = args.query
+    if os.path.exists(query):
+        with open(query, encoding="utf-8") as f:
+            query = f.read()
+    result = graph.query(query)
+    if result.type == "ASK":
+        print(result.askAnswer)
+    elif result.type == "SELECT":
+        for row in result:
+            print("\t".join(term.n3() if term is not None else "" for term in row))
+    else:
+        print(result.serialize(format="turtle").decode())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,23 @@
 #!/usr/bin/env python3
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
 from rdflib import Graph
 
+from binary_cube import FORMAT as BINARY_FORMAT, open_graph as open_binary_cube
+from graph_store import load_graph
+from rdf_output import parse_file
+from sharded_output import MANIFEST, manifest_files
+from native_constraints import (
+    CONSTRAINTS as NATIVE_CONSTRAINTS, StoreIndex, TripleIndex, duplicate_observations, incomplete_measure_points,
+)
+
 
 IC1 = """
 ASK {
@@ -148,6 +165,7 @@ ASK {
     # Must be the same as the measureType
     FILTER (?omeasure != ?measure)
 }"""
+# Modified to repeat the count in HAVING, rdflib does not resolve the ?count alias there and the query never fires
 IC17 = """
 ASK {
   {
@@ -179,7 +197,7 @@ ASK {
           }
           
       } GROUP BY ?obs1 ?numMeasures
-        HAVING (?count != ?numMeasures)
+        HAVING (COUNT(?obs2) != ?numMeasures)
   }
 }"""
 IC18 = """
@@ -222,21 +240,198 @@ ASK {
 CONSTRAINTS = [IC1, IC2, IC3, IC4, IC5, IC6, IC7, IC8, IC9, IC10, IC11, IC12, IC13, IC14, IC15, IC16, IC17, IC18, IC19, IC20, IC21]
 
 
-def validate_dataset(rdf_file_source: str):
-    g = Graph()
-    g.parse(rdf_file_source)
-    print("Validating " + rdf_file_source)
-    for i in range(len(CONSTRAINTS)):
-        try:
-            for row in g.query(CONSTRAINTS[i]):
-                print(f"IC{i + 1}: {row}")
-        except Exception as ex:
-            print(f"IC{i + 1}: {str(ex)}")
+ENGINES = ["native", "sparql", "compare"]
+
+# Parsed data cube of the file being validated, inherited by the forked constraint workers
+_graph = None
+_index = None
+
+
+def validate_dataset(rdf_file_source: str, engine: str = "native", jobs: int = None, fail_fast: bool = False,
+                     store: bool = False, schema: str = None) -> dict:
+    """Evaluate IC1 to IC21 on a data cube file.
+
+    The file is parsed (and indexed) once, the constraints are then evaluated concurrently by `jobs`
+    worker processes forked from the parsed graph. Without fork support (or with `jobs` set to 1)
+    they are evaluated one after another.
+
+    Args:
+        rdf_file_source (str): Path to the data cube file, binary cubes (.ndbc, binary_cube.py) are memory-mapped.
+        engine (str, optional): "native" evaluates the constraints over a triple index (native_constraints.py),
+            "sparql" runs the SPARQL queries above, "compare" runs both and reports where they disagree.
+            Defaults to "native".
+        jobs (int, optional): Number of worker processes. Defaults to the number of CPUs.
+        fail_fast (bool, optional): Stop at the first violated constraint, the remaining ones are left out
+            of the summary. Defaults to False.
+        store (bool, optional): Query the persistent SQLite store of the file (graph_store.py) instead of
+            parsing it into memory, the file is parsed into the store only if it changed. The native engine
+            looks the triples up through the indexes of the store (`StoreIndex`), as it does for binary
+            cubes. Defaults to False.
+        schema (str, optional): Schema file of a sharded cube (sharded_output.py), validated together
+            with the shard `rdf_file_source`. Defaults to None.
+
+    Returns:
+        dict: Summary with the file, parse time, result and wall time of every evaluated constraint
+            and "valid", which is False if any constraint is violated (or the engines disagree).
+    """
+    global _graph, _index
+    start = time.perf_counter()
+    if schema is not None:
+        _graph = Graph()
+        for path in (schema, rdf_file_source):
+            if path.endswith("." + BINARY_FORMAT):
+                _graph += open_binary_cube(path)
+            else:
+                parse_file(_graph, path)
+    elif rdf_file_source.endswith("." + BINARY_FORMAT):
+        _graph = open_binary_cube(rdf_file_source)
+    elif store:
+        _graph = load_graph(rdf_file_source)
+    else:
+        _graph = parse_file(Graph(), rdf_file_source)
+    if engine == "sparql":
+        _index = None
+    elif schema is None and (store or rdf_file_source.endswith("." + BINARY_FORMAT)):
+        _index = StoreIndex(_graph)
+    else:
+        _index = TripleIndex(_graph)
+    summary = {"file": rdf_file_source, "schema": schema, "engine": engine, "parse_seconds": time.perf_counter() - start}
+
+    results = {}
+    if jobs == 1 or "fork" not in multiprocessing.get_all_start_methods():
+        for i in range(len(CONSTRAINTS)):
+            results[i] = evaluate_constraint(i, engine)
+            if fail_fast and not results[i]["valid"]:
+                break
+    else:
+        # Leaving the pool terminates its workers, so with `fail_fast` the constraints still running are stopped
+        with multiprocessing.get_context("fork").Pool(jobs) as pool:
+            evaluate = partial(evaluate_indexed_constraint, engine=engine)
+            for i, result in pool.imap_unordered(evaluate, range(len(CONSTRAINTS))):
+                results[i] = result
+                if fail_fast and not result["valid"]:
+                    break
+
+    summary["constraints"] = [results[i] for i in sorted(results)]
+    summary["valid"] = all(result["valid"] for result in summary["constraints"])
+    summary["seconds"] = time.perf_counter() - start
+    return summary
+
+
+def validate_source(source: tuple, **kwargs) -> dict:
+    """`validate_dataset` of a (file, schema) pair."""
+    rdf_file_source, schema = source
+    return validate_dataset(rdf_file_source, schema=schema, **kwargs)
+
+
+def evaluate_indexed_constraint(i: int, engine: str) -> tuple:
+    return i, evaluate_constraint(i, engine)
+
+
+def split_jobs(jobs: int, files: int) -> tuple:
+    """Split `jobs` worker processes into (files validated at once, constraint workers of each file)."""
+    file_jobs = max(1, min(files, jobs))
+    return file_jobs, max(1, jobs // file_jobs)
+
+
+def evaluate_constraint(i: int, engine: str) -> dict:
+    start = time.perf_counter()
+    result = {"name": f"IC{i + 1}"}
+    if engine == "sparql":
+        result["result"] = run_sparql_constraint(_graph, i)
+        result["valid"] = result["result"] is False
+    else:
+        result["result"] = NATIVE_CONSTRAINTS[i](_index)
+        result["valid"] = not result["result"]
+        if engine == "compare":
+            result["sparql"] = run_sparql_constraint(_graph, i)
+            result["valid"] = result["result"] == result["sparql"]
+        elif result["result"] and i == 11:
+            result["observations"] = [[str(obs) for obs in group] for group in duplicate_observations(_index)]
+        elif result["result"] and i == 16:
+            result["observations"] = [
+                {"observations": [str(obs) for obs in group], "measures": found, "expected": expected}
+                for group, found, expected in incomplete_measure_points(_index)
+            ]
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def run_sparql_constraint(g: Graph, i: int):
+    try:
+        return g.query(CONSTRAINTS[i]).askAnswer
+    except Exception as ex:
+        return str(ex)
+
+
+def run_sparql(g: Graph) -> list:
+    return [run_sparql_constraint(g, i) for i in range(len(CONSTRAINTS))]
+
+
+def run_native(index: TripleIndex) -> list:
+    return [constraint(index) for constraint in NATIVE_CONSTRAINTS]
+
+
+def print_summary(summary: dict):
+    print(f"Validating {summary['file']} (parsed in {summary['parse_seconds']:.2f}s)")
+    for result in summary["constraints"]:
+        if summary["engine"] == "compare":
+            if not result["valid"]:
+                print(f"{result['name']}: native {result['result']} != sparql {result['sparql']}")
+            continue
+        print(f"{result['name']}: {result['result']} ({result['seconds']:.3f}s)")
+        for group in result.get("observations", []):
+            print(f"    {group}")
+    if summary["engine"] == "compare":
+        print(f"{sum(not result['valid'] for result in summary['constraints'])} mismatches")
 
 
 def main():
-    validate_dataset("care-providers.ttl")
-    validate_dataset("population-2021.ttl")
+    parser = argparse.ArgumentParser(description="Validates Data Cubes using the integrity constraints IC1 to IC21.")
+    parser.add_argument("files", nargs="*", default=["care-providers.ttl", "population-2021.ttl"],
+                        help="data cube files or manifests of sharded cubes, validated in parallel "
+                             "(defaults to care-providers.ttl and population-2021.ttl)")
+    parser.add_argument("--engine", choices=ENGINES, default="native",
+                        help="evaluate the constraints over a triple index (native), with the SPARQL queries (sparql) "
+                             "or with both, reporting differences (compare)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="number of worker processes, shared by the files validated at once (defaults to the number of CPUs)")
+    parser.add_argument("--fail-fast", action="store_true", help="stop validating a file at its first violated constraint")
+    parser.add_argument("--store", action="store_true",
+                        help="keep the parsed files in persistent SQLite stores (in $NDBI046_CACHE_DIR or .cache/), "
+                             "so they are parsed again only after they change")
+    parser.add_argument("--json", metavar="PATH", help="write a JSON summary to PATH ('-' for standard output)")
+    args = parser.parse_args()
+
+    # Shards of a sharded cube are validated one by one, each together with the schema file
+    sources = []
+    for file in args.files:
+        if os.path.basename(file) == MANIFEST:
+            sources += [(shard, schema) for schema, shard in manifest_files(file)]
+        else:
+            sources.append((file, None))
+
+    # The files validated at once share the worker processes
+    file_jobs, jobs = split_jobs(args.jobs or os.cpu_count(), len(sources))
+    validate = partial(validate_source, engine=args.engine, jobs=jobs, fail_fast=args.fail_fast, store=args.store)
+    if file_jobs == 1:
+        summaries = [validate(source) for source in sources]
+    else:
+        with ProcessPoolExecutor(file_jobs) as executor:
+            summaries = list(executor.map(validate, sources))
+
+    report = {"files": summaries, "valid": all(summary["valid"] for summary in summaries)}
+    if args.json == "-":
+        json.dump(report, sys.stdout, indent=2)
+    else:
+        for summary in summaries:
+            print_summary(summary)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+
+    if not report["valid"]:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
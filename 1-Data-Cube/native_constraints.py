@@ -0,0 +1,404 @@
+from decimal import Decimal
+
+from rdflib import Literal
+from rdflib.namespace import RDF, RDFS, QB, SKOS, XSD
+
+
+EMPTY = frozenset()
+
+TRUE = Literal("true", datatype=XSD.boolean)
+FALSE = Literal("false", datatype=XSD.boolean)
+
+
+class TripleIndex:
+    """Per-predicate subject -> objects and object -> subjects index of a graph.
+
+    Built with a single pass over the triples, after which every triple pattern with a bound
+    predicate is a dictionary lookup.
+    """
+
+    def __init__(self, triples):
+        self.spo = {}  # predicate -> subject -> objects
+        self.pos = {}  # predicate -> object -> subjects
+        for s, p, o in triples:
+            self.spo.setdefault(p, {}).setdefault(s, set()).add(o)
+            self.pos.setdefault(p, {}).setdefault(o, set()).add(s)
+        self._components = {}
+
+    def objects(self, subject, predicate):
+        return self.spo.get(predicate, {}).get(subject, EMPTY)
+
+    def subjects(self, predicate, obj):
+        return self.pos.get(predicate, {}).get(obj, EMPTY)
+
+    def subject_objects(self, predicate):
+        return self.spo.get(predicate, {}).items()
+
+    def has(self, subject, predicate) -> bool:
+        return subject in self.spo.get(predicate, {})
+
+    def instances(self, cls):
+        return self.subjects(RDF.type, cls)
+
+    def is_a(self, node, cls) -> bool:
+        return node in self.instances(cls)
+
+    def component_properties(self, dsd) -> set:
+        """`dsd qb:component/qb:componentProperty ?property`, computed once per structure."""
+        if dsd not in self._components:
+            self._components[dsd] = {
+                prop
+                for component in self.objects(dsd, QB.component)
+                for prop in self.objects(component, QB.componentProperty)
+            }
+        return self._components[dsd]
+
+    def typed_components(self, dsd, cls) -> list:
+        return [prop for prop in self.component_properties(dsd) if self.is_a(prop, cls)]
+
+    def subjects_with(self, predicate):
+        """Set-like view of all subjects having `predicate`."""
+        return self.spo.get(predicate, {}).keys()
+
+    def values(self, predicate, subjects):
+        """Objects of `predicate` for each of `subjects` having it."""
+        objects = self.spo.get(predicate, {})
+        return (objects[subject] for subject in objects.keys() & subjects)
+
+    def subject_values(self, predicate) -> dict:
+        """Subject -> objects of `predicate`."""
+        return self.spo.get(predicate, {})
+
+    def datasets(self):
+        """(data set, observations) pairs, the observations being all subjects linked by `qb:dataSet`.
+
+        The observation constraints are checked per data set, so the structure of a data set
+        is looked up once and compared with all its observations using set operations.
+        """
+        return self.pos.get(QB.dataSet, {}).items()
+
+
+class StoreIndex(TripleIndex):
+    """`TripleIndex` answering every lookup with a triple pattern on the store of a graph.
+
+    Nothing is read up front: persistent and memory-mapped stores (graph_store.py, binary_cube.py)
+    answer the bound patterns from their own indexes, so only the predicates a constraint needs
+    are read, e.g. the subjects of a measure property for IC14.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        self._components = {}
+        self._subject_values = {}
+        self._datasets = None
+
+    def objects(self, subject, predicate):
+        return set(self.graph.objects(subject, predicate))
+
+    def subjects(self, predicate, obj):
+        return set(self.graph.subjects(predicate, obj))
+
+    def subject_objects(self, predicate):
+        return self.subject_values(predicate).items()
+
+    def has(self, subject, predicate) -> bool:
+        return next(self.graph.objects(subject, predicate), None) is not None
+
+    def is_a(self, node, cls) -> bool:
+        return (node, RDF.type, cls) in self.graph
+
+    def subjects_with(self, predicate):
+        return self.subject_values(predicate).keys()
+
+    def subject_values(self, predicate) -> dict:
+        # Observation properties are read by several constraints, each predicate is read once
+        if predicate not in self._subject_values:
+            objects = {}
+            for s, o in self.graph.subject_objects(predicate):
+                objects.setdefault(s, set()).add(o)
+            self._subject_values[predicate] = objects
+        return self._subject_values[predicate]
+
+    def values(self, predicate, subjects):
+        objects = self.subject_values(predicate)
+        return (objects[subject] for subject in objects.keys() & subjects)
+
+    def datasets(self):
+        if self._datasets is None:
+            self._datasets = {}
+            for obs, dataset in self.graph.subject_objects(QB.dataSet):
+                self._datasets.setdefault(dataset, set()).add(obs)
+        return self._datasets.items()
+
+
+def ic1(index: TripleIndex) -> bool:
+    """Unique DataSet: every observation has exactly one qb:dataSet."""
+    return any(len(index.objects(obs, QB.dataSet)) != 1 for obs in index.instances(QB.Observation))
+
+
+def ic2(index: TripleIndex) -> bool:
+    """Unique DSD: every qb:DataSet has exactly one qb:structure."""
+    return any(len(index.objects(dataset, QB.structure)) != 1 for dataset in index.instances(QB.DataSet))
+
+
+def ic3(index: TripleIndex) -> bool:
+    """DSD includes measure (via `qb:component [qb:measure [a qb:MeasureProperty]]`)."""
+    return any(
+        not any(
+            index.is_a(measure, QB.MeasureProperty)
+            for component in index.objects(dsd, QB.component)
+            for measure in index.objects(component, QB.measure)
+        )
+        for dsd in index.instances(QB.DataStructureDefinition)
+    )
+
+
+def ic4(index: TripleIndex) -> bool:
+    """Dimensions have range."""
+    return any(not index.has(dim, RDFS.range) for dim in index.instances(QB.DimensionProperty))
+
+
+def ic5(index: TripleIndex) -> bool:
+    """Concept dimensions have code lists."""
+    return any(
+        not index.has(dim, QB.codeList)
+        for dim in index.instances(QB.DimensionProperty)
+        if SKOS.Concept in index.objects(dim, RDFS.range)
+    )
+
+
+def ic6(index: TripleIndex) -> bool:
+    """Only attributes may be optional."""
+    return any(
+        not index.is_a(prop, QB.AttributeProperty)
+        for _, components in index.subject_objects(QB.component)
+        for component in components
+        if FALSE in index.objects(component, QB.componentRequired)
+        for prop in index.objects(component, QB.componentProperty)
+    )
+
+
+def ic7(index: TripleIndex) -> bool:
+    """Slice keys must be declared."""
+    return any(
+        slice_key not in index.objects(dsd, QB.sliceKey)
+        for slice_key in index.instances(QB.SliceKey)
+        for dsd in index.instances(QB.DataStructureDefinition)
+    )
+
+
+def ic8(index: TripleIndex) -> bool:
+    """Slice keys consistent with DSD."""
+    return any(
+        prop not in index.component_properties(dsd)
+        for slice_key in index.instances(QB.SliceKey)
+        for prop in index.objects(slice_key, QB.componentProperty)
+        for dsd in index.subjects(QB.sliceKey, slice_key)
+    )
+
+
+def ic9(index: TripleIndex) -> bool:
+    """Unique slice structure."""
+    return any(len(index.objects(slice_, QB.sliceStructure)) != 1 for slice_ in index.instances(QB.Slice))
+
+
+def ic10(index: TripleIndex) -> bool:
+    """Slice dimensions complete."""
+    return any(
+        not index.has(slice_, dim)
+        for slice_, keys in index.subject_objects(QB.sliceStructure)
+        for key in keys
+        for dim in index.objects(key, QB.componentProperty)
+    )
+
+
+def ic11(index: TripleIndex) -> bool:
+    """All dimensions required."""
+    return any(
+        not index.subjects_with(dim) >= observations
+        for dataset, observations in index.datasets()
+        for dsd in index.objects(dataset, QB.structure)
+        for dim in index.typed_components(dsd, QB.DimensionProperty)
+    )
+
+
+def ic12(index: TripleIndex) -> bool:
+    """No duplicate observations: no two observations of a data set share all dimension values."""
+    return bool(duplicate_observations(index))
+
+
+def duplicate_observations(index: TripleIndex) -> list:
+    """Groups of observations of the same data set with equal values of all dimensions (IC12).
+
+    Every observation is hashed by the tuple of its values of the dimensions in the structure
+    of its data set, observations with the same tuple are duplicates. Unlike the pairwise
+    SPARQL query this is linear in the number of observations.
+
+    Returns:
+        list: Sorted lists of duplicate observations.
+    """
+    groups = []
+    for dataset, observations in index.datasets():
+        dims = sorted({
+            dim
+            for dsd in index.objects(dataset, QB.structure)
+            for dim in index.typed_components(dsd, QB.DimensionProperty)
+        })
+        for key, group in observation_points(index, observations, dims).items():
+            # observations without any dimension value are not compared by the query
+            if len(group) > 1 and any(value is not None for value in key):
+                groups.append(sorted(group))
+    return groups
+
+
+def observation_points(index: TripleIndex, observations, dims: list) -> dict:
+    """Group observations by their values of `dims`.
+
+    The key has one value per dimension, None if the observation has none. Literals are keyed
+    by their value, so they are equal when SPARQL `=` says so (e.g. "1"^^xsd:integer and "01"^^xsd:integer).
+    Observations with several values of a dimension are left out, the pairwise query never finds
+    them equal to another observation.
+
+    Returns:
+        dict: Key tuple -> observations.
+    """
+    values = [index.subject_values(dim) for dim in dims]
+    points = {}
+    for obs in observations:
+        key = []
+        for objects in values:
+            terms = objects.get(obs, EMPTY)
+            if len(terms) > 1:
+                break
+            key.append(_value_key(next(iter(terms))) if terms else None)
+        else:
+            points.setdefault(tuple(key), []).append(obs)
+    return points
+
+
+def _value_key(term):
+    if isinstance(term, Literal) and term.value is not None:
+        value = term.value
+        numeric = isinstance(value, (int, float, Decimal)) and not isinstance(value, bool)
+        return "numeric" if numeric else type(value).__name__, value, term.language
+    return term
+
+
+def ic13(index: TripleIndex) -> bool:
+    """Required attributes."""
+    return any(
+        not index.subjects_with(attr) >= observations
+        for dataset, observations in index.datasets()
+        for dsd in index.objects(dataset, QB.structure)
+        for component in index.objects(dsd, QB.component)
+        if TRUE in index.objects(component, QB.componentRequired)
+        for attr in index.objects(component, QB.componentProperty)
+    )
+
+
+def ic14(index: TripleIndex) -> bool:
+    """All measures present (cubes without qb:measureType)."""
+    return any(
+        not index.subjects_with(measure) >= observations
+        for dataset, observations in index.datasets()
+        for dsd in index.objects(dataset, QB.structure)
+        if QB.measureType not in index.component_properties(dsd)
+        for measure in index.typed_components(dsd, QB.MeasureProperty)
+    )
+
+
+def ic15(index: TripleIndex) -> bool:
+    """Measure dimension consistent (cubes with qb:measureType)."""
+    return any(
+        not index.has(obs, measure)
+        for dataset, observations in index.datasets()
+        if any(QB.measureType in index.component_properties(dsd) for dsd in index.objects(dataset, QB.structure))
+        for obs in index.subjects_with(QB.measureType) & observations
+        for measure in index.objects(obs, QB.measureType)
+    )
+
+
+def ic16(index: TripleIndex) -> bool:
+    """Single measure on measure dimension observation."""
+    return any(
+        measure != omeasure
+        for dataset, observations in index.datasets()
+        for dsd in index.objects(dataset, QB.structure)
+        if QB.measureType in index.component_properties(dsd)
+        for omeasure in index.typed_components(dsd, QB.MeasureProperty)
+        for obs in index.subjects_with(omeasure) & observations
+        for measure in index.objects(obs, QB.measureType)
+    )
+
+
+def ic17(index: TripleIndex) -> bool:
+    """All measures present in measures dimension cube."""
+    return bool(incomplete_measure_points(index))
+
+
+def incomplete_measure_points(index: TripleIndex) -> list:
+    """Points of a measure dimension cube without exactly one observation per measure (IC17).
+
+    Observations with a `qb:measureType` are hashed by their values of all other dimensions,
+    the measure types found for each tuple are then compared with the number of measures of the DSD.
+
+    Returns:
+        list: (sorted observations, number of measure types found, number of measures) tuples.
+    """
+    points = []
+    for dataset, observations in index.datasets():
+        for dsd in index.objects(dataset, QB.structure):
+            num_measures = len(index.typed_components(dsd, QB.MeasureProperty))
+            if not num_measures:
+                continue
+            dims = sorted(dim for dim in index.typed_components(dsd, QB.DimensionProperty) if dim != QB.measureType)
+            measured = index.subjects_with(QB.measureType) & observations
+            for group in observation_points(index, measured, dims).values():
+                found = sum(len(index.objects(obs, QB.measureType)) for obs in group)
+                if any(len(index.objects(obs, QB.measureType)) * found != num_measures for obs in group):
+                    points.append((sorted(group), found, num_measures))
+    return points
+
+
+def ic18(index: TripleIndex) -> bool:
+    """Consistent data set links."""
+    return any(
+        dataset not in index.objects(obs, QB.dataSet)
+        for dataset, slices in index.subject_objects(QB.slice)
+        for slice_ in slices
+        for obs in index.objects(slice_, QB.observation)
+    )
+
+
+def ic19(index: TripleIndex) -> bool:
+    """Codes from code list (only skos:ConceptScheme code lists)."""
+    concepts = index.instances(SKOS.Concept)
+    return any(
+        not values <= valid
+        for dataset, observations in index.datasets()
+        for dsd in index.objects(dataset, QB.structure)
+        for dim in index.typed_components(dsd, QB.DimensionProperty)
+        for code_list in index.objects(dim, QB.codeList)
+        if index.is_a(code_list, SKOS.ConceptScheme)
+        for valid in [concepts & index.subjects(SKOS.inScheme, code_list)]
+        for values in index.values(dim, observations)
+    )
+
+
+def ic20(index: TripleIndex) -> bool:
+    """Codes from hierarchy, as written in integrity-constraints.py (values must be hierarchy roots)."""
+    return any(
+        not values <= index.objects(code_list, QB.hierarchyRoot)
+        for dataset, observations in index.datasets()
+        for dsd in index.objects(dataset, QB.structure)
+        for dim in index.typed_components(dsd, QB.DimensionProperty)
+        for code_list in index.objects(dim, QB.codeList)
+        if index.is_a(code_list, QB.HierarchicalCodeList)
+        for values in index.values(dim, observations)
+    )
+
+
+# IC21 has the same query as IC20 in integrity-constraints.py
+ic21 = ic20
+
+CONSTRAINTS = [ic1, ic2, ic3, ic4, ic5, ic6, ic7, ic8, ic9, ic10, ic11, ic12, ic13, ic14, ic15, ic16, ic17, ic18, ic19, ic20, ic21]
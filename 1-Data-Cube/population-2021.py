@@ -1,10 +1,27 @@
 #!/usr/bin/env python3
+import argparse
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import partial
 import pandas as pd
 import numpy as np
 
 from rdflib import Graph, BNode, Literal, Namespace 
 from rdflib.namespace import RDF, QB, XSD, SKOS, DCTERMS, OWL
+from batch_triples import TERMS, Iri, Lit, add_rows
+from triple_writer import TripleWriter
+from binary_cube import FORMAT as BINARY_FORMAT, BinaryCubeWriter
+from columnar_store import ColumnarStore
+from rdf_output import COMPRESSIONS, FORMATS, compression_of, open_output, output_name, write_graph, writer_format
+from schema_cache import add_cached_schema
+from cube_validation import ValidatingCollector
+from sharded_output import write_shards
 from pandas.errors import SettingWithCopyWarning
+from region_lookup import build_region_lookup, resolve_regions
+from csv_loader import read_csv_filtered
+from csv_cache import CARE_PROVIDERS_CATEGORICAL, cached_frame, read_csv_cached
 import warnings
 warnings.simplefilter(action='ignore', category=FutureWarning)
 warnings.simplefilter(action='ignore', category=SettingWithCopyWarning)
@@ -18,49 +35,120 @@ RDFS = Namespace("http://www.w3.org/2000/01/rdf-schema#")
 SDMX_CONCEPT = Namespace("http://purl.org/linked-data/sdmx/2009/concept#")
 SDMX_MEASURE = Namespace("http://purl.org/linked-data/sdmx/2009/measure#")
 SDMX_CODE = Namespace("http://purl.org/linked-data/sdmx/2009/code#")
+SDMX_DIMENSION = Namespace("http://purl.org/linked-data/sdmx/2009/dimension#")
+
+PREFIXES = {
+    "ns": NS, "nsr": NSR, "rdfs": RDFS, "qb": QB, "skos": SKOS, "dcterms": DCTERMS,
+    "sdmx-concept": SDMX_CONCEPT, "sdmx-measure": SDMX_MEASURE, "sdmx-code": SDMX_CODE, "sdmx-dimension": SDMX_DIMENSION,
+}
+
+
+POPULATION_COLUMNS = ["hodnota", "vuk", "rok", "vuzemi_cis", "vuzemi_kod", "vuzemi_txt"]
+POPULATION_DTYPES = {"vuk": str, "rok": "int64", "vuzemi_cis": "int64", "vuzemi_kod": "int64", "vuzemi_txt": str}
+# Columns of the dimensions, the observations can be sharded by either of them
+SHARD_COLUMNS = ["kraj_kod", "okres_lau"]
+
+# Indicator ("vuk" code) -> its measure property, indicators without a name here are measured by NS[code]
+MEASURES = {"DEM0004": NS.meanPopulation}
+
+# Files and region lookup of the running `load_yearly_data` call, inherited by the forked worker processes
+_yearly = None
 
 
 def load_csv_file_as_object(file_path: str):
-    result = pd.read_csv(file_path, low_memory=False)
-    result = result.loc[result["vuk"] == "DEM0004"] # mean population data only
-    return result
+    # mean population data of counties only, filtered while reading
+    filters = {"vuk": "DEM0004", "vuzemi_cis": 101}
+    return cached_frame(
+        file_path,
+        lambda path: read_csv_filtered(path, filters, usecols=POPULATION_COLUMNS, dtype=POPULATION_DTYPES),
+        params={"filters": filters, "usecols": POPULATION_COLUMNS, "dtype": POPULATION_DTYPES},
+    )
 
 
-def set_region_per_county(data: pd.DataFrame):
+def set_region_per_county(data: pd.DataFrame, lookup: pd.DataFrame = None):
     result = data.loc[data.vuzemi_cis == 101]
-    
-    care_providers_df = pd.read_csv("./care-providers/narodni-registr-poskytovatelu-zdravotnich-sluzeb.csv", 
-                                    usecols=["Kraj", "KrajCode", "OkresCode"])
-    care_providers_df = care_providers_df.drop_duplicates("OkresCode").dropna(subset="OkresCode")
+    if lookup is None:
+        lookup = load_region_lookup()
+    return resolve_regions(result, lookup)
 
-    county_mapping_df = pd.read_csv("./population-2021/číselník-okresů-vazba-101-nadřízený.csv", usecols=["CHODNOTA1", "CHODNOTA2"])
 
-    result["okres_lau"] = result["vuzemi_kod"].apply(
-        lambda x: county_mapping_df.loc[county_mapping_df["CHODNOTA2"] == x]["CHODNOTA1"].values[0]
-    )
-    result["kraj_kod"] = result["okres_lau"].apply(
-        lambda x: care_providers_df.loc[care_providers_df["OkresCode"] == x]["KrajCode"].values[0]
-    )
-    result["kraj_txt"] = result["okres_lau"].apply(
-        lambda x: care_providers_df.loc[care_providers_df["OkresCode"] == x]["Kraj"].values[0]
-    )
-    
-    return result
+def load_region_lookup() -> pd.DataFrame:
+    care_providers_df = read_csv_cached("./care-providers/narodni-registr-poskytovatelu-zdravotnich-sluzeb.csv",
+                                        categorical=CARE_PROVIDERS_CATEGORICAL, low_memory=False)
 
+    county_mapping_df = read_csv_cached("./population-2021/číselník-okresů-vazba-101-nadřízený.csv", usecols=["CHODNOTA1", "CHODNOTA2"])
 
-def as_data_cube(data):
-    result = Graph(bind_namespaces="rdflib")
-    
-    create_concept_schemes(result)
-    create_resource_classes(result)
-    create_resources(result, data)
-    dimensions = create_dimensions(result)
-    measures = create_measure(result)
-    structure = create_structure(result, dimensions, measures)
-    dataset = create_dataset(result, structure)
-    create_observations(result, dataset, data)
+    return build_region_lookup(county_mapping_df, care_providers_df)
+
+
+def as_data_cube(data, store="default", build=None):
+    result = Graph(store, bind_namespaces="rdflib")
+    (build or build_data_cube)(result, data)
     return result
-    
+
+
+def write_data_cube(data, destination: str, format: str = "ttl", validate: bool = False, build=None):
+    """Stream the data cube straight to a file without building an in-memory graph.
+
+    Args:
+        data (pd.DataFrame): Source data.
+        destination (str): Path to the output file.
+        format (str, optional): One of `rdf_output.FORMATS` or "ndbc" (binary_cube.py). Defaults to "ttl".
+            Text output is compressed when `destination` ends with ".gz" (gzip) or ".zst" (zstd).
+        validate (bool, optional): Check the integrity constraints of `ValidatingCollector.report` once
+            the cube is written. The cube is written to "<destination>.part" and only renamed to
+            `destination` when all of them hold, otherwise ValueError is raised. Defaults to False.
+        build (function, optional): Adds the cube of `data` to a collector, e.g. `build_yearly_data_cube`.
+            Defaults to `build_data_cube`.
+
+    Returns:
+        dict: Result of every check when validating, None otherwise.
+    """
+    build = build or build_data_cube
+    if not validate:
+        with open_collector(destination, format) as writer:
+            build(writer, data)
+        return None
+
+    part = destination + ".part"
+    try:
+        with open_collector(part, format, compression_of(destination)) as writer:
+            validator = ValidatingCollector(writer)
+            build(validator, data)
+            report = validator.check()
+    except BaseException:
+        os.remove(part)
+        raise
+    os.replace(part, destination)
+    return report
+
+
+@contextmanager
+def open_collector(destination: str, format: str, compression: str = None):
+    """Writer of `format` (see `write_data_cube`) writing to `destination`."""
+    if format == BINARY_FORMAT:
+        with BinaryCubeWriter(destination) as writer:
+            yield writer
+    else:
+        with open_output(destination, compression) as stream:
+            with TripleWriter(stream, writer_format(format), PREFIXES) as writer:
+                yield writer
+
+
+def build_data_cube(collector, data):
+    dataset = add_cached_schema(collector, create_schema)
+    create_resources(collector, data)
+    create_observations(collector, dataset, data)
+
+
+def create_schema(collector):
+    create_concept_schemes(collector)
+    create_resource_classes(collector)
+    dimensions = create_dimensions(collector)
+    measures = create_measure(collector)
+    structure = create_structure(collector, dimensions, measures)
+    return create_dataset(collector, structure)
+
 
 def create_concept_schemes(collector: Graph):
     county = NSR.county
@@ -101,26 +189,26 @@ def create_resource_classes(collector: Graph):
 
 
 def create_resources(collector: Graph, data: pd.DataFrame):
-    for _, c in data.iterrows():
-        county = NSR[f"county/{c['okres_lau']}"]
-        collector.add((county, RDF.type, SKOS.Concept))
-        collector.add((county, RDF.type, SDMX_CODE.Area))
-        collector.add((county, RDF.type, NSR.County))
-        collector.add((county, RDFS.label, Literal(c["vuzemi_txt"], lang="cs")))
-        collector.add((county, SKOS.prefLabel, Literal(c["vuzemi_txt"], lang="cs")))
-        collector.add((county, SKOS.inScheme, NSR.county))
-        collector.add((county, SKOS.inScheme, SDMX_CODE.area))
+    add_rows(collector, data, Iri(NSR, "county/{okres_lau}"), [
+        (RDF.type, SKOS.Concept),
+        (RDF.type, SDMX_CODE.Area),
+        (RDF.type, NSR.County),
+        (RDFS.label, Lit("vuzemi_txt", lang="cs")),
+        (SKOS.prefLabel, Lit("vuzemi_txt", lang="cs")),
+        (SKOS.inScheme, NSR.county),
+        (SKOS.inScheme, SDMX_CODE.area),
+    ])
     
     regions = data.drop_duplicates("kraj_kod")
-    for _, r in regions.iterrows():
-        region = NSR[f"region/{r['kraj_kod']}"]
-        collector.add((region, RDF.type, SKOS.Concept))
-        collector.add((region, RDF.type, SDMX_CODE.Area))
-        collector.add((region, RDF.type, NSR.Region))
-        collector.add((region, RDFS.label, Literal(r["kraj_txt"], lang="cs")))
-        collector.add((region, SKOS.prefLabel, Literal(r["kraj_txt"], lang="cs")))
-        collector.add((region, SKOS.inScheme, NSR.region))
-        collector.add((region, SKOS.inScheme, SDMX_CODE.area))
+    add_rows(collector, regions, Iri(NSR, "region/{kraj_kod}"), [
+        (RDF.type, SKOS.Concept),
+        (RDF.type, SDMX_CODE.Area),
+        (RDF.type, NSR.Region),
+        (RDFS.label, Lit("kraj_txt", lang="cs")),
+        (SKOS.prefLabel, Lit("kraj_txt", lang="cs")),
+        (SKOS.inScheme, NSR.region),
+        (SKOS.inScheme, SDMX_CODE.area),
+    ])
 
 
 def create_dimensions(collector: Graph):
@@ -159,8 +247,7 @@ def create_measure(collector: Graph):
     return [mean_population]
 
 
-def create_structure(collector: Graph, dimensions, measures):
-    structure = NS.structure
+def create_structure(collector: Graph, dimensions, measures, structure=NS.structure):
     collector.add( ( structure, RDF.type, QB.DataStructureDefinition ) )
 
     for dimension in dimensions:
@@ -193,26 +280,341 @@ def create_dataset(collector: Graph, structure):
 
 
 def create_observations(collector: Graph, dataset, data: pd.DataFrame):
-    mean_population_data = data.reset_index()
-    for index, row in mean_population_data.iterrows():
-        resource = NSR["observation-" + str(index).zfill(2)]
-        create_observation(collector, dataset, resource, row)
+    add_observations(collector, dataset, number_observations(data))
+
+
+def number_observations(data: pd.DataFrame) -> pd.DataFrame:
+    return data.assign(ObservationId=np.arange(len(data)))
+
+
+def add_observations(collector: Graph, dataset, observations: pd.DataFrame):
+    add_rows(collector, observations, Iri(NSR, "observation-{ObservationId:02d}"), [
+        (RDF.type, QB.Observation),
+        (QB.dataSet, dataset),
+        (NS.county, Iri(NSR, "county/{okres_lau}")),
+        (NS.region, Iri(NSR, "region/{kraj_kod}")),
+        (NS.meanPopulation, Lit("hodnota", datatype=XSD.integer)),
+    ])
+
+
+def write_sharded_data_cube(data, directory: str, dimension: str = "kraj_kod", format: str = "ttl", compression: str = None,
+                            jobs: int = None, only=None) -> dict:
+    """Write the data cube as a schema file and one file of observations per value of `dimension`.
+
+    See `sharded_output.write_shards`. The schema file holds the DSD, the data set and all counties
+    and regions, so every shard together with it is a valid data cube.
+
+    Args:
+        data (pd.DataFrame): Source data.
+        directory (str): Output directory.
+        dimension (str, optional): One of `SHARD_COLUMNS`. Defaults to "kraj_kod".
+        format (str, optional): See `write_data_cube`. Defaults to "ttl".
+        compression (str, optional): "gzip" or "zstd". Defaults to None.
+        jobs (int, optional): Number of worker processes. Defaults to the number of CPUs.
+        only (iterable, optional): Codes whose shards are rewritten. Defaults to rewriting all shards.
+
+    Returns:
+        dict: The manifest.
+    """
+    if dimension not in SHARD_COLUMNS:
+        raise ValueError(f"Cannot shard by '{dimension}', expected one of {SHARD_COLUMNS}")
+    dataset = None
+
+    def write_schema(path):
+        nonlocal dataset
+        with open_collector(path, format, compression) as writer:
+            dataset = add_cached_schema(writer, create_schema)
+            create_resources(writer, data)
+        return writer.count
+
+    def write_shard(path, shard):
+        with open_collector(path, format, compression) as writer:
+            add_observations(writer, dataset, shard)
+        return writer.count
+
+    extension = "." + BINARY_FORMAT if format == BINARY_FORMAT else output_name("", format, compression)
+    return write_shards(directory, extension, write_schema, write_shard, number_observations(data), dimension, jobs, only,
+                        ["okres_lau"])
+
+
+def load_yearly_data(file_paths, jobs: int = None) -> pd.DataFrame:
+    """Load several yearly ČSÚ population files and resolve their counties and regions, one worker process per file.
+
+    The county and region lookup is built once, before the workers are forked, so the codelists are
+    read once for all years instead of once per file.
+
+    Args:
+        file_paths (list): Paths to the yearly .csv files, e.g. "130141-22data2021.csv".
+        jobs (int, optional): Number of worker processes. Defaults to the number of CPUs.
+
+    Raises:
+        ValueError: If there are no files or a year is in more than one of them.
+
+    Returns:
+        pd.DataFrame: Rows of all files ordered by year ("rok"), numbered within every year ("ObservationId").
+    """
+    file_paths = list(file_paths)
+    if not file_paths:
+        raise ValueError("No population files given")
+
+    global _yearly
+    _yearly = (file_paths, load_region_lookup())
+    try:
+        if jobs == 1 or len(file_paths) == 1 or "fork" not in multiprocessing.get_all_start_methods():
+            frames = [_load_year(i) for i in range(len(file_paths))]
+        else:
+            workers = min(jobs or os.cpu_count(), len(file_paths))
+            with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("fork")) as executor:
+                frames = list(executor.map(_load_year, range(len(file_paths))))
+    finally:
+        _yearly = None
+
+    files_by_year = {}
+    for path, frame in zip(file_paths, frames):
+        for year in frame["rok"].unique().tolist():
+            if year in files_by_year:
+                raise ValueError(f"Year {year} is in both {files_by_year[year]} and {path}")
+            files_by_year[year] = path
+
+    data = pd.concat(frames, ignore_index=True).sort_values("rok", kind="stable", ignore_index=True)
+    return data.assign(ObservationId=data.groupby("rok").cumcount())
+
+
+def _load_year(i: int) -> pd.DataFrame:
+    file_paths, lookup = _yearly
+    return set_region_per_county(load_csv_file_as_object(file_paths[i]), lookup)
+
+
+def build_yearly_data_cube(collector, data):
+    """Add a cube of the mean population of all years in `data` (see `load_yearly_data`) to `collector`."""
+    dataset = add_cached_schema(collector, create_yearly_schema)
+    # Latest names of the counties, the data is ordered by year
+    create_resources(collector, data.drop_duplicates("okres_lau", keep="last"))
+    add_yearly_observations(collector, dataset, data)
+
+
+def create_yearly_schema(collector):
+    create_concept_schemes(collector)
+    create_resource_classes(collector)
+    dimensions = create_dimensions(collector) + create_time_dimension(collector)
+    measures = create_measure(collector)
+    structure = create_structure(collector, dimensions, measures, NS.yearlyStructure)
+    return create_yearly_dataset(collector, structure)
+
+
+def create_time_dimension(collector: Graph):
+    ref_period = SDMX_DIMENSION.refPeriod
+    collector.add((ref_period, RDF.type, RDFS.Property))
+    collector.add((ref_period, RDF.type, QB.DimensionProperty))
+    collector.add((ref_period, RDFS.label, Literal("Referenční období", lang="cs")))
+    collector.add((ref_period, RDFS.label, Literal("Reference period", lang="en")))
+    collector.add((ref_period, RDFS.range, XSD.gYear))
+    collector.add((ref_period, QB.concept, SDMX_CONCEPT.refPeriod))
+
+    return [ref_period]
+
+
+def create_yearly_dataset(collector: Graph, structure):
+    dataset = NSR.MeanPopulation
+    collector.add((dataset, RDF.type, QB.DataSet))
+    collector.add((dataset, RDFS.label, Literal("Střední stav obyvatel v Okresech", lang="cs")))
+    collector.add((dataset, RDFS.label, Literal("Mean Population per County", lang="en")))
+    collector.add((dataset, DCTERMS.title, Literal("Střední stav obyvatel v Okresech", lang="cs")))
+    collector.add((dataset, DCTERMS.title, Literal("Mean Population per County", lang="en")))
+    collector.add((dataset, DCTERMS.publisher, Literal("https://github.com/corovcam", datatype=XSD.anyURI)))
+    collector.add((dataset, DCTERMS.license, Literal("https://github.com/corovcam/NDBI046/blob/main/LICENSE", datatype=XSD.anyURI)))
+    collector.add((dataset, QB.structure, structure))
+
+    return dataset
+
+
+def add_yearly_observations(collector: Graph, dataset, observations: pd.DataFrame):
+    add_rows(collector, observations, Iri(NSR, "observation-{rok}-{ObservationId:02d}"), [
+        (RDF.type, QB.Observation),
+        (QB.dataSet, dataset),
+        (SDMX_DIMENSION.refPeriod, Lit("rok", datatype=XSD.gYear)),
+        (NS.county, Iri(NSR, "county/{okres_lau}")),
+        (NS.region, Iri(NSR, "region/{kraj_kod}")),
+        (NS.meanPopulation, Lit("hodnota", datatype=XSD.integer)),
+    ])
+
+
+def load_indicators(file_path: str, indicators) -> tuple:
+    """Load several indicators of every county in a single scan of a ČSÚ population file.
+
+    The rows of all `indicators` are filtered while the file is read (through the Arrow cache), pivoted
+    to one row per county with one column per indicator, and joined with the counties and regions once.
+
+    Args:
+        file_path (str): Path to the .csv file.
+        indicators (list): "vuk" codes of the indicators, e.g. ["DEM0004", ...].
+
+    Raises:
+        ValueError: If an indicator is not in the file or a county has no value of some indicator.
+
+    Returns:
+        tuple: The pivoted DataFrame (indicator values in columns named by their codes) and a dict
+            of indicator code -> its name in the file ("vuk_text").
+    """
+    indicators = list(dict.fromkeys(indicators))
+    if not indicators:
+        raise ValueError("No indicators given")
+    filters = {"vuk": sorted(indicators), "vuzemi_cis": 101}
+    columns = POPULATION_COLUMNS + ["vuk_text"]
+    dtypes = {**POPULATION_DTYPES, "vuk_text": str}
+    data = cached_frame(
+        file_path,
+        lambda path: read_csv_filtered(path, filters, usecols=columns, dtype=dtypes),
+        params={"filters": filters, "usecols": columns, "dtype": dtypes},
+    )
+
+    missing = sorted(set(indicators) - set(data["vuk"]))
+    if missing:
+        raise ValueError(f"Indicators {missing} are not in {file_path}")
+    values = data.pivot(index="vuzemi_kod", columns="vuk", values="hodnota")[indicators]
+    incomplete = values.index[values.isna().any(axis=1)].tolist()
+    if incomplete:
+        raise ValueError(f"Counties {incomplete} do not have a value of every indicator in {indicators}")
+
+    counties = data.drop_duplicates("vuzemi_kod")[["vuzemi_cis", "vuzemi_kod", "vuzemi_txt"]]
+    result = set_region_per_county(counties.join(values, on="vuzemi_kod"))
+    names = data.drop_duplicates("vuk").set_index("vuk")["vuk_text"]
+    return result.reset_index(drop=True), {code: names[code] for code in indicators}
+
+
+def build_indicator_data_cube(collector, data, indicators: dict):
+    """Add a cube with one measure per indicator (see `load_indicators`) to `collector`.
+
+    The schema depends on the indicators, so it is built every time instead of being cached.
+    """
+    dataset = create_indicator_schema(collector, data, indicators)
+    create_resources(collector, data)
+    add_rows(collector, number_observations(data), Iri(NSR, "indicators/observation-{ObservationId:02d}"), [
+        (RDF.type, QB.Observation),
+        (QB.dataSet, dataset),
+        (NS.county, Iri(NSR, "county/{okres_lau}")),
+        (NS.region, Iri(NSR, "region/{kraj_kod}")),
+        *[(measure_of(code), Lit(code, datatype=_indicator_datatype(data[code]))) for code in indicators],
+    ])
+
+
+def create_indicator_schema(collector, data: pd.DataFrame, indicators: dict):
+    create_concept_schemes(collector)
+    create_resource_classes(collector)
+    dimensions = create_dimensions(collector)
+    measures = []
+    for code, name in indicators.items():
+        if code == "DEM0004":
+            # Same measure as the mean population cube
+            measures += create_measure(collector)
+            continue
+        measure = measure_of(code)
+        collector.add((measure, RDF.type, RDFS.Property))
+        collector.add((measure, RDF.type, QB.MeasureProperty))
+        collector.add((measure, RDFS.label, Literal(name, lang="cs")))
+        collector.add((measure, SKOS.notation, Literal(code)))
+        collector.add((measure, RDFS.subPropertyOf, SDMX_MEASURE.obsValue))
+        collector.add((measure, RDFS.range, _indicator_datatype(data[code])))
+        measures.append(measure)
+    structure = create_structure(collector, dimensions, measures, NS.indicatorStructure)
+
+    dataset = NSR.PopulationIndicators2021
+    collector.add((dataset, RDF.type, QB.DataSet))
+    collector.add((dataset, RDFS.label, Literal("Demografické ukazatele v Okresech 2021", lang="cs")))
+    collector.add((dataset, RDFS.label, Literal("Demographic Indicators per County 2021", lang="en")))
+    collector.add((dataset, DCTERMS.title, Literal("Demografické ukazatele v Okresech 2021", lang="cs")))
+    collector.add((dataset, DCTERMS.title, Literal("Demographic Indicators per County 2021", lang="en")))
+    collector.add((dataset, DCTERMS.publisher, Literal("https://github.com/corovcam", datatype=XSD.anyURI)))
+    collector.add((dataset, DCTERMS.license, Literal("https://github.com/corovcam/NDBI046/blob/main/LICENSE", datatype=XSD.anyURI)))
+    collector.add((dataset, QB.structure, structure))
+
+    return dataset
+
+
+def measure_of(indicator: str):
+    return MEASURES.get(indicator, NS[indicator])
 
 
-def create_observation(collector: Graph, dataset, resource, data):
-    collector.add((resource, RDF.type, QB.Observation))
-    collector.add((resource, QB.dataSet, dataset))
-    collector.add((resource, NS.county, NSR[f"county/{data['okres_lau']}"]))
-    collector.add((resource, NS.region, NSR[f"region/{data['kraj_kod']}"]))
-    collector.add((resource, NS.meanPopulation, Literal(data["hodnota"], datatype=XSD.integer)))
+def _indicator_datatype(values: pd.Series):
+    return XSD.integer if pd.api.types.is_integer_dtype(values) else XSD.decimal
 
 
 def main():
-    file_path = "./population-2021/130141-22data2021.csv"
-    data = load_csv_file_as_object(file_path)
-    data = set_region_per_county(data)
-    data_cube = as_data_cube(data)
-    data_cube.serialize(format="ttl", destination="population-2021.ttl")
+    parser = argparse.ArgumentParser(description="Generates the Population 2021 RDF Data Cube.")
+    parser.add_argument("--stream", action="store_true",
+                        help="write triples straight to the output file instead of building an in-memory graph "
+                             "(ttl is then written as N-Triples-style Turtle, one triple per line under the prefixes)")
+    parser.add_argument("--validate", action="store_true",
+                        help="check integrity constraints IC1, IC11, IC14 and IC19 while writing the triples "
+                             "(implies --stream), the output file is only written when they hold")
+    parser.add_argument("--format", choices=[*FORMATS, BINARY_FORMAT], default="ttl",
+                        help="output format, N-Triples (nt) and N-Quads (nq) are written line by line in a single pass, "
+                             "ndbc is the binary dictionary-encoded format of binary_cube.py (implies --stream)")
+    parser.add_argument("--compress", choices=COMPRESSIONS, help="compress the output file on the fly")
+    parser.add_argument("--shard-by", choices=SHARD_COLUMNS, metavar="COLUMN",
+                        help=f"write the observations to one file per value of COLUMN (one of {', '.join(SHARD_COLUMNS)}) "
+                             "in population-2021-shards/, next to a schema file and a manifest")
+    parser.add_argument("--refresh", action="append", metavar="CODE",
+                        help="with --shard-by, rewrite only the shard of CODE (may be repeated)")
+    parser.add_argument("--years", nargs="+", metavar="FILE",
+                        help="build a single cube of the yearly ČSÚ files FILE... with a sdmx-dimension:refPeriod dimension "
+                             "(population-yearly.ttl), every file is loaded in its own worker process")
+    parser.add_argument("--indicators", nargs="+", metavar="CODE",
+                        help="build a single cube with one measure per indicator CODE... (\"vuk\" codes, e.g. DEM0004) "
+                             "from one scan of the 2021 file (population-2021-indicators.ttl)")
+    parser.add_argument("--graph-store", choices=["memory", "columnar"], default="memory",
+                        help="store of the in-memory graph, columnar keeps the triples as NumPy arrays of term ids "
+                             "(columnar_store.py) and needs a fraction of the memory of rdflib's default store")
+    parser.add_argument("--term-stats", action="store_true",
+                        help="print how many of the terms created for the rows were served from the interning cache "
+                             "(in-memory graph only, the other modes write the rows without creating terms)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="number of worker processes writing shards or loading the --years files "
+                             "(defaults to the number of CPUs)")
+    args = parser.parse_args()
+    if args.format == BINARY_FORMAT and args.compress:
+        parser.error(f"the {BINARY_FORMAT} format is memory-mapped, it cannot be compressed")
+    if (args.years or args.indicators) and args.shard_by:
+        parser.error("--years and --indicators cannot be combined with --shard-by")
+    if args.years and args.indicators:
+        parser.error("--years cannot be combined with --indicators")
+    if args.validate and args.shard_by:
+        parser.error("--validate cannot be combined with --shard-by, check the written shards with integrity-constraints.py instead")
+    if args.term_stats and (args.stream or args.validate or args.format == BINARY_FORMAT or args.shard_by):
+        parser.error("--term-stats needs the in-memory graph, it cannot be combined with --stream, --validate, "
+                     f"--format {BINARY_FORMAT} or --shard-by, which write the rows without creating terms")
+
+    stem = "population-yearly" if args.years else "population-2021-indicators" if args.indicators else "population-2021"
+    if args.format == BINARY_FORMAT:
+        destination = f"{stem}.{BINARY_FORMAT}"
+    else:
+        destination = output_name(stem, args.format, args.compress)
+    if args.years:
+        data = load_yearly_data(args.years, args.jobs)
+        build = build_yearly_data_cube
+    elif args.indicators:
+        data, indicators = load_indicators("./population-2021/130141-22data2021.csv", args.indicators)
+        build = partial(build_indicator_data_cube, indicators=indicators)
+    else:
+        data = load_csv_file_as_object("./population-2021/130141-22data2021.csv")
+        data = set_region_per_county(data)
+        build = build_data_cube
+    if args.shard_by:
+        manifest = write_sharded_data_cube(data, "population-2021-shards", args.shard_by, args.format, args.compress,
+                                           args.jobs, args.refresh)
+        print(f"{len(args.refresh or manifest['shards'])} shards written to population-2021-shards/")
+    elif args.validate:
+        report = write_data_cube(data, destination, args.format, validate=True, build=build)
+        for name, result in report.items():
+            print(f"{name}: {result}")
+    elif args.stream or args.format == BINARY_FORMAT:
+        write_data_cube(data, destination, args.format, build=build)
+    else:
+        data_cube = as_data_cube(data, ColumnarStore() if args.graph_store == "columnar" else "default", build)
+        write_graph(data_cube, destination, args.format)
+        if args.term_stats:
+            stats = TERMS.stats()
+            print(f"{stats['hits']} of {stats['hits'] + stats['misses']} terms interned ({stats['hit_rate']:.1%}), {stats['terms']} distinct")
 
 
 if __name__ == "__main__":
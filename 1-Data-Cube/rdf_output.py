@@ -0,0 +1,124 @@
+import gzip
+import io
+
+try:
+    import zstandard
+except ImportError:  # zstd compression is optional
+    zstandard = None
+
+
+# Output format -> (rdflib serializer, file extension)
+FORMATS = {
+    "ttl": ("turtle", ".ttl"),
+    "trig": ("trig", ".trig"),
+    "nt": ("nt", ".nt"),
+    "nq": ("nquads", ".nq"),
+}
+
+# Compression -> file extension
+COMPRESSIONS = {
+    "gzip": ".gz",
+    "zstd": ".zst",
+}
+
+
+def output_name(stem: str, format: str = "ttl", compression: str = None) -> str:
+    """File name for `stem` written as `format`, e.g. "care-providers.nt.gz"."""
+    if format not in FORMATS:
+        raise ValueError(f"Unsupported format '{format}', expected one of {list(FORMATS)}")
+    if compression is not None and compression not in COMPRESSIONS:
+        raise ValueError(f"Unsupported compression '{compression}', expected one of {list(COMPRESSIONS)}")
+    return stem + FORMATS[format][1] + (COMPRESSIONS[compression] if compression else "")
+
+
+def compression_of(path: str):
+    """Compression implied by the extension of `path`, None for plain files."""
+    for compression, extension in COMPRESSIONS.items():
+        if path.endswith(extension):
+            return compression
+    return None
+
+
+def open_output(path: str, compression: str = None, binary: bool = False):
+    """Open `path` for writing, compressing everything written on the fly.
+
+    Args:
+        path (str): Path to the output file.
+        compression (str, optional): "gzip" or "zstd". Defaults to the compression implied by the extension of `path`.
+        binary (bool, optional): Return a binary stream instead of a UTF-8 text stream. Defaults to False.
+
+    Returns:
+        Writable stream, closed together with the file.
+    """
+    compression = compression or compression_of(path)
+    if compression == "gzip":
+        # Level 6 is the default of the gzip tool, the highest levels are several times slower for a few percent
+        stream = gzip.open(path, "wb", compresslevel=6)
+    elif compression == "zstd":
+        if zstandard is None:
+            raise ValueError("zstd compression requires the zstandard package")
+        stream = zstandard.ZstdCompressor().stream_writer(open(path, "wb"), closefd=True)
+    elif compression is None:
+        stream = open(path, "wb")
+    else:
+        raise ValueError(f"Unsupported compression '{compression}', expected one of {list(COMPRESSIONS)}")
+    return stream if binary else io.TextIOWrapper(stream, encoding="utf-8")
+
+
+def open_input(path: str):
+    """Open `path` for reading as a binary stream, decompressing it when its extension says so."""
+    compression = compression_of(path)
+    if compression == "gzip":
+        return gzip.open(path, "rb")
+    if compression == "zstd":
+        if zstandard is None:
+            raise ValueError("zstd compression requires the zstandard package")
+        return zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+    return open(path, "rb")
+
+
+def parse_file(graph, path: str):
+    """Parse the (possibly compressed) RDF file at `path` into `graph`, the format is guessed from the extension.
+
+    N-Quads are parsed as N-Triples into graphs without named graphs, the way `write_graph` writes them.
+    """
+    name = path.removesuffix(COMPRESSIONS.get(compression_of(path), ""))
+    format = next((serializer for serializer, extension in FORMATS.values() if name.endswith(extension)), None)
+    if format is None and compression_of(path) is None:
+        return graph.parse(path)
+    if format == "nquads" and not graph.context_aware:
+        format = "nt"
+    with open_input(path) as stream:
+        graph.parse(stream, format=format)
+    return graph
+
+
+def writer_format(format: str) -> str:
+    """Format of a `TripleWriter` producing `format`.
+
+    A Turtle document is a valid TriG document and N-Triples lines are valid N-Quads (in the default graph),
+    so the streaming writers cover all output formats with their two formats.
+    """
+    return {"ttl": "ttl", "trig": "ttl", "nt": "nt", "nq": "nt"}[format]
+
+
+def write_graph(graph, destination: str, format: str = "ttl", compression: str = None):
+    """Serialize `graph` to `destination`.
+
+    N-Triples and N-Quads are written line by line in a single pass over the graph, Turtle and TriG
+    group (and sort) the triples by subject first. N-Quads of a graph without named graphs are
+    the same lines as N-Triples.
+
+    Args:
+        graph (Graph): Graph to serialize.
+        destination (str): Path to the output file.
+        format (str, optional): One of `FORMATS`. Defaults to "ttl".
+        compression (str, optional): "gzip" or "zstd". Defaults to the compression implied by the extension of `destination`.
+    """
+    if format not in FORMATS:
+        raise ValueError(f"Unsupported format '{format}', expected one of {list(FORMATS)}")
+    serializer = FORMATS[format][0]
+    if serializer == "nquads" and not graph.context_aware:
+        serializer = "nt"
+    with open_output(destination, compression, binary=True) as stream:
+        graph.serialize(stream, format=serializer, encoding="utf-8")
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from csv_cache import file_sha256
+
+
+MANIFEST = "manifest.json"
+
+# Writers of the shards of the running `write_shards` call, inherited by the forked worker processes
+_tasks = []
+
+
+def write_shards(directory: str, extension: str, write_schema, write_shard, observations: pd.DataFrame,
+                 dimension: str, jobs: int = None, only=None, key: list = None) -> dict:
+    """Write a data cube as a schema file and one file of observations per value of `dimension`.
+
+    The schema file holds everything but the observations (the DSD, the data set and the code lists),
+    each shard holds the observations with one value of `dimension`. The schema is written first, by the
+    calling process, the shards are then written concurrently by `jobs` worker processes forked from it
+    (one after another where fork is not available). Both are listed in "manifest.json" in `directory`.
+
+    Args:
+        directory (str): Output directory, created if needed.
+        extension (str): File extension of the schema and the shards, e.g. ".ttl" or ".nt.gz".
+        write_schema (function): Writes the schema to the given path and returns the number of triples.
+        write_shard (function): Writes the observations of a DataFrame to the given path and returns the number of triples.
+        observations (pd.DataFrame): Observations, numbered before sharding so their IRIs do not depend on the shards.
+        dimension (str): Column of `observations` to shard by.
+        jobs (int, optional): Number of worker processes. Defaults to the number of CPUs.
+        only (iterable, optional): Values of `dimension` whose shards are rewritten, the other shards
+            of the existing manifest are kept. Defaults to rewriting all shards.
+        key (list, optional): Columns identifying an observation. With `key`, the "ObservationId" of every key
+            is kept in the manifest: observations of the previous manifest keep their number and new ones are
+            numbered after all numbers ever used, so a refreshed shard never reuses the IRI of an observation
+            in a shard that is not rewritten. Defaults to the numbers given in `observations`.
+
+    Returns:
+        dict: The manifest.
+    """
+    os.makedirs(directory, exist_ok=True)
+    manifest_path = os.path.join(directory, MANIFEST)
+    previous = load_manifest(manifest_path) if only is not None else None
+    if only is not None and (previous is None or previous["dimension"] != dimension or previous["extension"] != extension):
+        raise ValueError(f"Cannot refresh single shards without a manifest of shards by {dimension} ({extension}) in {directory}")
+    if key is not None:
+        last = previous or load_manifest(manifest_path)
+        observations, observation_ids = keep_observation_ids(observations, key, last and last.get("observation_ids"))
+
+    groups = {str(key): group for key, group in observations.groupby(dimension, sort=True, observed=True)}
+    keys = sorted(groups) if only is None else sorted(set(map(str, only)) & set(groups))
+    schema = "schema" + extension
+
+    schema_triples = write_schema(os.path.join(directory, schema))
+
+    global _tasks
+    _tasks = [(os.path.join(directory, shard_name(key, extension)), write_shard, groups[key]) for key in keys]
+    if jobs == 1 or "fork" not in multiprocessing.get_all_start_methods():
+        counts = [_write(i) for i in range(len(_tasks))]
+    else:
+        with ProcessPoolExecutor(jobs, mp_context=multiprocessing.get_context("fork")) as executor:
+            counts = list(executor.map(_write, range(len(_tasks))))
+    _tasks = []
+
+    shards = {shard["key"]: shard for shard in previous["shards"]} if previous else {}
+    for key in set(map(str, only or [])) - set(groups):
+        # Refreshed values without any observations left
+        if key in shards:
+            os.remove(os.path.join(directory, shards.pop(key)["file"]))
+    for key, count in zip(keys, counts):
+        shards[key] = {
+            "key": key,
+            "file": shard_name(key, extension),
+            "observations": len(groups[key]),
+            "triples": count,
+            "sha256": file_sha256(os.path.join(directory, shard_name(key, extension))),
+        }
+    if only is None and os.path.exists(manifest_path):
+        # Files of the previous run that are not rewritten: shards of values that disappeared from the data,
+        # or everything written with another extension
+        old = load_manifest(manifest_path)
+        written = {schema} | {shard["file"] for shard in shards.values()}
+        for file in [old["schema"]["file"]] + [shard["file"] for shard in old["shards"]]:
+            if file not in written and os.path.exists(os.path.join(directory, file)):
+                os.remove(os.path.join(directory, file))
+
+    manifest = {
+        "dimension": dimension,
+        "extension": extension,
+        "schema": {"file": schema, "triples": schema_triples, "sha256": file_sha256(os.path.join(directory, schema))},
+        "shards": [shards[key] for key in sorted(shards)],
+    }
+    if key is not None:
+        manifest["observation_ids"] = json.loads(observation_ids.to_json(orient="split", index=False))
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    return manifest
+
+
+def keep_observation_ids(observations: pd.DataFrame, key: list, previous: dict = None):
+    """Number `observations` by the "ObservationId" of their `key` in `previous` (see `write_shards`).
+
+    Returns:
+        tuple: `observations` with the kept numbers and the numbers of all keys, previous and new.
+    """
+    # Keys are compared as strings, the way they come back from the manifest
+    keys = pd.MultiIndex.from_frame(observations[key].astype(str))
+    if previous:
+        known = pd.DataFrame(previous["data"], columns=previous["columns"])
+        known = known.astype({column: str for column in key}).astype({"ObservationId": "int64"})
+    else:
+        known = pd.DataFrame({**{column: pd.Series(dtype=str) for column in key}, "ObservationId": pd.Series(dtype="int64")})
+    ids = pd.Series(known["ObservationId"].to_numpy(), index=pd.MultiIndex.from_frame(known[key])).reindex(keys)
+
+    new = ids.isna().to_numpy()
+    start = int(known["ObservationId"].max()) + 1 if len(known) else 0
+    ids[new] = np.arange(start, start + new.sum())
+    ids = ids.to_numpy().astype("int64")
+    added = pd.DataFrame(keys[new].tolist(), columns=key).assign(ObservationId=ids[new])
+    return observations.assign(ObservationId=ids), pd.concat([known, added], ignore_index=True)
+
+
+def shard_name(key: str, extension: str) -> str:
+    # Keys are dimension values, anything but a safe file name character is replaced
+    safe = re.sub(r"[^\w.-]", "_", key)
+    if safe != key:
+        safe += "-" + hashlib.sha256(key.encode()).hexdigest()[:8]
+    return f"shard-{safe}{extension}"
+
+
+def load_manifest(path: str):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def manifest_files(path: str) -> list:
+    """(schema file, shard file) pairs of a manifest, each pair is a self-contained part of the cube."""
+    manifest = load_manifest(path)
+    if manifest is None:
+        raise ValueError(f"Manifest {path} does not exist")
+    directory = os.path.dirname(path)
+    schema = os.path.join(directory, manifest["schema"]["file"])
+    return [(schema, os.path.join(directory, shard["file"])) for shard in manifest["shards"]]
+
+
+def _write(i: int) -> int:
+    path, write, observations = _tasks[i]
+    return write(path, observations)
@@ -0,0 +1,58 @@
+import pytest
+from rdflib import Namespace
+from rdflib.namespace import QB, RDF, SKOS
+
+from cube_validation import ValidatingCollector
+
+EX = Namespace("http://example.org/")
+
+
+class ListCollector:
+    def __init__(self):
+        self.triples = []
+
+    def add(self, triple):
+        self.triples.append(triple)
+
+    def add_lines(self, lines: str):
+        self.triples.extend(lines.splitlines())
+
+
+def cube(validator):
+    validator.add((EX.dataset, QB.structure, EX.dsd))
+    validator.add((EX.dsd, QB.component, EX.component))
+    validator.add((EX.component, QB.dimension, EX.area))
+    validator.add((EX.area, RDF.type, QB.DimensionProperty))
+    validator.add((EX.area, QB.codeList, EX.areas))
+    validator.add((EX.areas, RDF.type, SKOS.ConceptScheme))
+    validator.add((EX.a1, RDF.type, SKOS.Concept))
+    validator.add((EX.a1, SKOS.inScheme, EX.areas))
+    validator.add((EX.o1, RDF.type, QB.Observation))
+    validator.add_lines(f"<{EX.o1}> <{QB.dataSet}> <{EX.dataset}> .\n<{EX.o1}> <{EX.area}> <{EX.a1}> .\n")
+
+
+def test_valid_cube():
+    validator = ValidatingCollector(ListCollector())
+    cube(validator)
+    assert validator.check() == {"IC1": False, "IC11": False, "IC14": False, "IC19": False}
+    assert len(validator.collector.triples) == 11
+
+
+def test_code_not_in_code_list():
+    validator = ValidatingCollector(ListCollector())
+    cube(validator)
+    validator.add((EX.o1, EX.area, EX.a2))
+    with pytest.raises(ValueError, match="IC19"):
+        validator.check()
+
+
+@pytest.mark.parametrize("lines", [False, True])
+def test_second_data_set_raises_when_added(lines):
+    validator = ValidatingCollector(ListCollector())
+    cube(validator)
+    with pytest.raises(ValueError, match="IC1"):
+        if lines:
+            validator.add_lines(f"<{EX.o1}> <{QB.dataSet}> <{EX.other}> .\n")
+        else:
+            validator.add((EX.o1, QB.dataSet, EX.other))
+
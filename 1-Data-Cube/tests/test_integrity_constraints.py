@@ -0,0 +1,112 @@
+import gzip
+import importlib
+import json
+
+import pytest
+from rdflib import Graph
+
+import graph_store
+
+integrity_constraints = importlib.import_module("integrity-constraints")
+
+SCHEMA = """
+@prefix ex: <http://example.org/> .
+@prefix qb: <http://purl.org/linked-data/cube#> .
+@prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .
+@prefix xsd: <http://www.w3.org/2001/XMLSchema#> .
+
+ex:dataset a qb:DataSet ; qb:structure ex:dsd .
+ex:dsd a qb:DataStructureDefinition ;
+    qb:component [ qb:dimension ex:area ; qb:componentProperty ex:area ] ,
+                 [ qb:measure ex:count ; qb:componentProperty ex:count ] .
+ex:area a qb:DimensionProperty ; rdfs:range xsd:string .
+ex:count a qb:MeasureProperty ; rdfs:range xsd:integer .
+"""
+
+SHARD = """
+<http://example.org/o{i}> <http://www.w3.org/1999/02/22-rdf-syntax-ns#type> <http://purl.org/linked-data/cube#Observation> .
+<http://example.org/o{i}> <http://purl.org/linked-data/cube#dataSet> <http://example.org/dataset> .
+<http://example.org/o{i}> <http://example.org/area> "{i}" .
+<http://example.org/o{i}> <http://example.org/count> "{i}"^^<http://www.w3.org/2001/XMLSchema#integer> .
+"""
+
+
+class InlineExecutor:
+    """ProcessPoolExecutor stand-in recording its number of workers and running the tasks in-process."""
+
+    workers = []
+
+    def __init__(self, max_workers=None, **kwargs):
+        self.workers.append(max_workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def map(self, fn, *iterables):
+        return map(fn, *iterables)
+
+
+@pytest.fixture
+def sharded_cube(tmp_path):
+    (tmp_path / "schema.ttl").write_text(SCHEMA, encoding="utf-8")
+    shards = []
+    for i in range(3):
+        (tmp_path / f"shard-{i}.nt").write_text(SHARD.format(i=i), encoding="utf-8")
+        shards.append({"key": str(i), "file": f"shard-{i}.nt"})
+    manifest = {"dimension": "area", "extension": ".nt", "schema": {"file": "schema.ttl"}, "shards": shards}
+    (tmp_path / "manifest.json").write_text(json.dumps(manifest), encoding="utf-8")
+    return tmp_path / "manifest.json"
+
+
+@pytest.mark.parametrize("jobs, file_jobs, constraint_jobs", [(1, 1, 1), (2, 2, 1), (4, 3, 1), (8, 3, 2), (64, 3, 21)])
+def test_split_jobs(jobs, file_jobs, constraint_jobs):
+    assert integrity_constraints.split_jobs(jobs, 3) == (file_jobs, constraint_jobs)
+
+
+def test_shards_share_the_workers(sharded_cube, tmp_path, monkeypatch):
+    jobs = []
+    validate_dataset = integrity_constraints.validate_dataset
+
+    def recording_validate_dataset(rdf_file_source, **kwargs):
+        jobs.append(kwargs["jobs"])
+        return validate_dataset(rdf_file_source, **{**kwargs, "jobs": 1})
+
+    InlineExecutor.workers = []
+    monkeypatch.setattr(integrity_constraints, "ProcessPoolExecutor", InlineExecutor)
+    monkeypatch.setattr(integrity_constraints, "validate_dataset", recording_validate_dataset)
+    monkeypatch.setattr("sys.argv", ["integrity-constraints.py", str(sharded_cube), "-j", "8",
+                                     "--json", str(tmp_path / "summary.json")])
+    integrity_constraints.main()
+
+    report = json.loads((tmp_path / "summary.json").read_text(encoding="utf-8"))
+    assert report["valid"] and len(report["files"]) == 3
+    assert InlineExecutor.workers == [3]
+    assert jobs == [2, 2, 2]
+
+
+def test_violation_exits_non_zero(sharded_cube, tmp_path, monkeypatch):
+    # o1 without its measure value violates IC14
+    shard = SHARD.format(i=1).replace("<http://example.org/count>", "<http://example.org/other>")
+    (tmp_path / "shard-1.nt").write_text(shard, encoding="utf-8")
+    monkeypatch.setattr("sys.argv", ["integrity-constraints.py", str(sharded_cube), "-j", "1"])
+    with pytest.raises(SystemExit) as exit_info:
+        integrity_constraints.main()
+    assert exit_info.value.code == 1
+
+
+@pytest.mark.parametrize("name", ["cube.nt.gz", "cube.ttl.gz"])
+def test_store_of_compressed_file(name, tmp_path, monkeypatch):
+    graph = Graph().parse(data=SCHEMA + SHARD.format(i=0), format="turtle")
+    with gzip.open(tmp_path / name, "wb") as f:
+        graph.serialize(f, format="nt" if ".nt" in name else "turtle", encoding="utf-8")
+    monkeypatch.setattr(graph_store, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr("sys.argv", ["integrity-constraints.py", str(tmp_path / name), "--store", "-j", "1",
+                                     "--json", str(tmp_path / "summary.json")])
+    integrity_constraints.main()
+
+    report = json.loads((tmp_path / "summary.json").read_text(encoding="utf-8"))
+    assert report["valid"]
+    assert len(graph_store.load_graph(str(tmp_path / name))) == len(graph)
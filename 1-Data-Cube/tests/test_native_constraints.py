@@ -0,0 +1,150 @@
+import importlib
+
+import pytest
+from rdflib import BNode, Graph, Literal, Namespace
+from rdflib.namespace import QB, RDF, XSD
+
+from binary_cube import open_graph as open_binary_cube, write_binary_cube
+from graph_store import load_graph
+from native_constraints import StoreIndex, TripleIndex
+
+integrity_constraints = importlib.import_module("integrity-constraints")
+
+EX = Namespace("http://example.org/")
+
+PREFIXES = """
+@prefix ex: <http://example.org/> .
+@prefix qb: <http://purl.org/linked-data/cube#> .
+@prefix rdfs: <http://www.w3.org/2000/01/rdf-schema#> .
+@prefix skos: <http://www.w3.org/2004/02/skos/core#> .
+@prefix xsd: <http://www.w3.org/2001/XMLSchema#> .
+"""
+
+# Valid cube with a coded dimension, a measure and a slice
+CUBE = PREFIXES + """
+ex:dataset a qb:DataSet ; qb:structure ex:dsd ; qb:slice ex:slice1 .
+ex:dsd a qb:DataStructureDefinition ;
+    qb:component [ qb:dimension ex:area ; qb:componentProperty ex:area ] ,
+                 [ qb:measure ex:count ; qb:componentProperty ex:count ] ;
+    qb:sliceKey ex:byArea .
+ex:area a qb:DimensionProperty , qb:CodedProperty ; rdfs:range skos:Concept ; qb:codeList ex:areas .
+ex:count a qb:MeasureProperty ; rdfs:range xsd:integer .
+ex:areas a skos:ConceptScheme .
+ex:a1 a skos:Concept ; skos:inScheme ex:areas .
+ex:a2 a skos:Concept ; skos:inScheme ex:areas .
+ex:byArea a qb:SliceKey ; qb:componentProperty ex:area .
+ex:slice1 a qb:Slice ; qb:sliceStructure ex:byArea ; ex:area ex:a1 ; qb:observation ex:o1 .
+ex:o1 a qb:Observation ; qb:dataSet ex:dataset ; ex:area ex:a1 ; ex:count 1 .
+ex:o2 a qb:Observation ; qb:dataSet ex:dataset ; ex:area ex:a2 ; ex:count 2 .
+"""
+
+# Valid measure dimension cube, every area has one observation per measure
+MEASURE_CUBE = PREFIXES + """
+ex:dataset a qb:DataSet ; qb:structure ex:dsd .
+ex:dsd a qb:DataStructureDefinition ;
+    qb:component [ qb:dimension ex:area ; qb:componentProperty ex:area ] ,
+                 [ qb:dimension qb:measureType ; qb:componentProperty qb:measureType ] ,
+                 [ qb:measure ex:count ; qb:componentProperty ex:count ] ,
+                 [ qb:measure ex:share ; qb:componentProperty ex:share ] .
+ex:area a qb:DimensionProperty , qb:CodedProperty ; rdfs:range skos:Concept ; qb:codeList ex:areas .
+qb:measureType a qb:DimensionProperty ; rdfs:range qb:MeasureProperty .
+ex:count a qb:MeasureProperty ; rdfs:range xsd:integer .
+ex:share a qb:MeasureProperty ; rdfs:range xsd:decimal .
+ex:areas a skos:ConceptScheme .
+ex:a1 a skos:Concept ; skos:inScheme ex:areas .
+ex:a2 a skos:Concept ; skos:inScheme ex:areas .
+ex:o1 a qb:Observation ; qb:dataSet ex:dataset ; ex:area ex:a1 ; qb:measureType ex:count ; ex:count 1 .
+ex:o1s a qb:Observation ; qb:dataSet ex:dataset ; ex:area ex:a1 ; qb:measureType ex:share ; ex:share 0.5 .
+ex:o2 a qb:Observation ; qb:dataSet ex:dataset ; ex:area ex:a2 ; qb:measureType ex:count ; ex:count 2 .
+ex:o2s a qb:Observation ; qb:dataSet ex:dataset ; ex:area ex:a2 ; qb:measureType ex:share ; ex:share 0.25 .
+"""
+
+
+def add_component(g: Graph, prop, required=None):
+    component = BNode()
+    g.add((EX.dsd, QB.component, component))
+    g.add((component, QB.componentProperty, prop))
+    if required is not None:
+        g.add((component, QB.componentRequired, Literal(required)))
+
+
+# IC number -> (valid cube, edit breaking that constraint)
+BROKEN = {
+    1: (CUBE, lambda g: g.remove((EX.o1, QB.dataSet, None))),
+    2: (CUBE, lambda g: g.add((EX.dataset, QB.structure, EX.dsd2))),
+    3: (CUBE, lambda g: g.add((EX.dsd2, RDF.type, QB.DataStructureDefinition))),
+    4: (CUBE, lambda g: g.add((EX.other, RDF.type, QB.DimensionProperty))),
+    5: (CUBE, lambda g: g.remove((EX.area, QB.codeList, None))),
+    6: (CUBE, lambda g: add_component(g, EX.area, required=False)),
+    7: (CUBE, lambda g: g.add((EX.byOther, RDF.type, QB.SliceKey))),
+    8: (CUBE, lambda g: g.add((EX.byArea, QB.componentProperty, EX.other))),
+    9: (CUBE, lambda g: g.add((EX.slice1, QB.sliceStructure, EX.byOther))),
+    10: (CUBE, lambda g: g.remove((EX.slice1, EX.area, None))),
+    11: (CUBE, lambda g: g.remove((EX.o2, EX.area, None))),
+    12: (CUBE, lambda g: g.set((EX.o2, EX.area, EX.a1))),
+    13: (CUBE, lambda g: (g.add((EX.note, RDF.type, QB.AttributeProperty)), add_component(g, EX.note, required=True))),
+    14: (CUBE, lambda g: g.remove((EX.o1, EX["count"], None))),
+    15: (MEASURE_CUBE, lambda g: g.remove((EX.o1, EX["count"], None))),
+    16: (MEASURE_CUBE, lambda g: g.add((EX.o1, EX.share, Literal(0.5)))),
+    17: (MEASURE_CUBE, lambda g: g.remove((EX.o1s, None, None))),
+    18: (CUBE, lambda g: g.add((EX.slice1, QB.observation, EX.o3))),
+    19: (CUBE, lambda g: g.set((EX.o2, EX.area, EX.a3))),
+    20: (CUBE, lambda g: g.add((EX.areas, RDF.type, QB.HierarchicalCodeList))),
+    21: (CUBE, lambda g: g.add((EX.areas, RDF.type, QB.HierarchicalCodeList))),
+}
+
+
+def evaluate(g: Graph):
+    return integrity_constraints.run_native(TripleIndex(g)), integrity_constraints.run_sparql(g)
+
+
+@pytest.mark.parametrize("cube", [CUBE, MEASURE_CUBE], ids=["cube", "measure-cube"])
+def test_valid_cube(cube):
+    native, sparql = evaluate(Graph().parse(data=cube, format="turtle"))
+    assert sparql == [False] * len(integrity_constraints.CONSTRAINTS)
+    assert native == sparql
+
+
+@pytest.mark.parametrize("number", sorted(BROKEN))
+def test_broken_cube(number):
+    cube, edit = BROKEN[number]
+    g = Graph().parse(data=cube, format="turtle")
+    edit(g)
+    native, sparql = evaluate(g)
+    assert sparql[number - 1] is True
+    assert native == sparql
+
+
+def test_literal_values_compared_by_value():
+    # "1"^^xsd:integer and "01"^^xsd:integer are equal dimension values for the IC12 query
+    g = Graph().parse(data=CUBE, format="turtle")
+    g.add((EX.year, RDF.type, QB.DimensionProperty))
+    add_component(g, EX.year)
+    g.add((EX.o1, EX.year, Literal("1", datatype=XSD.integer)))
+    g.add((EX.o2, EX.year, Literal("01", datatype=XSD.integer)))
+    g.set((EX.o2, EX.area, EX.a1))
+    native, sparql = evaluate(g)
+    assert sparql[11] is True
+    assert native == sparql
+
+
+def store_graph(g: Graph, tmp_path) -> Graph:
+    g.serialize(tmp_path / "cube.nt", format="nt", encoding="utf-8")
+    return load_graph(str(tmp_path / "cube.nt"), str(tmp_path / "cube.sqlite"))
+
+
+def binary_cube_graph(g: Graph, tmp_path) -> Graph:
+    write_binary_cube(g, str(tmp_path / "cube.ndbc"))
+    return open_binary_cube(str(tmp_path / "cube.ndbc"))
+
+
+@pytest.mark.parametrize("open_store", [store_graph, binary_cube_graph], ids=["sqlite", "ndbc"])
+@pytest.mark.parametrize("number", [None] + sorted(BROKEN))
+def test_store_index(number, open_store, tmp_path):
+    cube, edit = BROKEN[number] if number else (CUBE, None)
+    g = Graph().parse(data=cube, format="turtle")
+    if edit:
+        edit(g)
+    stored = open_store(g, tmp_path)
+    assert integrity_constraints.run_native(StoreIndex(stored)) == integrity_constraints.run_native(TripleIndex(g))
+    stored.close()
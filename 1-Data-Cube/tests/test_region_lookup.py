@@ -0,0 +1,39 @@
+import pandas as pd
+import pytest
+
+from region_lookup import build_region_lookup, find_unmatched_codes, resolve_regions
+
+COUNTY_MAPPING = pd.DataFrame({"CHODNOTA1": ["CZ0100", "CZ0201"], "CHODNOTA2": [40924, 40011]})
+CARE_PROVIDERS = pd.DataFrame({
+    "OkresCode": ["CZ0100", "CZ0201", "CZ0201", None],
+    "KrajCode": ["CZ010", "CZ020", "CZ020", "CZ020"],
+    "Kraj": ["Hlavní město Praha", "Středočeský kraj", "Středočeský kraj", "Středočeský kraj"],
+})
+# Municipality 529303 (Benešov) -> ORP 2101 (Benešov) -> county 40011
+MUNICIPALITY_ORP = pd.DataFrame({"CHODNOTA1": [529303, 599999], "CHODNOTA2": [2101, 9999]})
+ORP_COUNTY = pd.DataFrame({"CHODNOTA1": [2101], "CHODNOTA2": [40011]})
+
+
+def test_county_codes():
+    lookup = build_region_lookup(COUNTY_MAPPING, CARE_PROVIDERS)
+    data = pd.DataFrame({"vuzemi_kod": [40011, 40924]})
+    resolved = resolve_regions(data, lookup)
+    assert resolved["okres_lau"].tolist() == ["CZ0201", "CZ0100"]
+    assert resolved["kraj_kod"].tolist() == ["CZ020", "CZ010"]
+
+
+def test_lower_levels_resolved_through_links():
+    lookup = build_region_lookup(COUNTY_MAPPING, CARE_PROVIDERS, [MUNICIPALITY_ORP, ORP_COUNTY])
+    data = pd.DataFrame({"vuzemi_kod": [529303, 2101, 40924]})
+    resolved = resolve_regions(data, lookup)
+    assert resolved["okres_lau"].tolist() == ["CZ0201", "CZ0201", "CZ0100"]
+    assert resolved["kraj_txt"].tolist() == ["Středočeský kraj", "Středočeský kraj", "Hlavní město Praha"]
+
+
+def test_unmatched_codes_reported_at_once():
+    lookup = build_region_lookup(COUNTY_MAPPING, CARE_PROVIDERS, [MUNICIPALITY_ORP, ORP_COUNTY])
+    data = pd.DataFrame({"vuzemi_kod": [599999, 40924, 12345]})
+    assert find_unmatched_codes(data, lookup) == [12345, 599999]
+    with pytest.raises(ValueError, match="2 codes"):
+        resolve_regions(data, lookup)
+    assert resolve_regions(data, lookup, errors="ignore")["okres_lau"].isna().tolist() == [True, False, True]
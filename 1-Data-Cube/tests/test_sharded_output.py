@@ -0,0 +1,63 @@
+import importlib
+import json
+
+import pandas as pd
+import pytest
+from rdflib import Graph, Namespace
+
+import schema_cache
+from sharded_output import MANIFEST, keep_observation_ids, manifest_files
+
+care_providers = importlib.import_module("care-providers")
+
+NS = Namespace("https://ndbi046-martincorovcak.com/ontology#")
+
+
+def register(rows: list) -> pd.DataFrame:
+    regions = {"CZ0100": ("Praha", "CZ010", "Hlavní město Praha"), "CZ0201": ("Benešov", "CZ020", "Středočeský kraj")}
+    return pd.DataFrame([(county, *regions[county], field) for county, field in rows],
+                        columns=["OkresCode", "Okres", "KrajCode", "Kraj", "OborPece"])
+
+
+def load_shards(directory) -> Graph:
+    graph = Graph()
+    for schema, shard in manifest_files(str(directory / MANIFEST)):
+        graph.parse(shard, format="nt")
+    return graph
+
+
+def test_keep_observation_ids():
+    observations = pd.DataFrame({"code": ["b", "a"], "ObservationId": [0, 1]})
+    numbered, ids = keep_observation_ids(observations, ["code"], None)
+    assert numbered["ObservationId"].tolist() == [0, 1]
+
+    previous = json.loads(ids.to_json(orient="split", index=False))
+    observations = pd.DataFrame({"code": ["c", "a"], "ObservationId": [0, 1]})
+    numbered, ids = keep_observation_ids(observations, ["code"], previous)
+    # "a" keeps its number, "c" is numbered after all numbers used so far, "b" stays reserved
+    assert numbered["ObservationId"].tolist() == [2, 1]
+    assert sorted(map(tuple, ids.values.tolist())) == [("a", 1), ("b", 0), ("c", 2)]
+
+
+@pytest.mark.parametrize("refresh", [["CZ010"], None])
+def test_refresh_keeps_observation_iris(refresh, tmp_path, monkeypatch):
+    monkeypatch.setattr(schema_cache, "CACHE_DIR", str(tmp_path / "cache"))
+    directory = tmp_path / "shards"
+    data = register([("CZ0100", "chirurgie"), ("CZ0201", "chirurgie"), ("CZ0201", "pediatrie")])
+    fields_of_care = ["chirurgie", "pediatrie"]
+    care_providers.write_sharded_data_cube(data, str(directory), "KrajCode", "nt", jobs=1, fields_of_care=fields_of_care)
+    before = load_shards(directory)
+
+    # A new cell in Praha sorts before the cells of Benešov, positional numbers would shift them
+    data = register([("CZ0100", "chirurgie"), ("CZ0100", "pediatrie"), ("CZ0201", "chirurgie"), ("CZ0201", "pediatrie")])
+    care_providers.write_sharded_data_cube(data, str(directory), "KrajCode", "nt", jobs=1, only=refresh,
+                                           fields_of_care=fields_of_care)
+    after = load_shards(directory)
+
+    counties = {}
+    for obs, county in after.subject_objects(NS.county):
+        counties.setdefault(obs, set()).add(county)
+    assert len(counties) == 4
+    assert all(len(values) == 1 for values in counties.values())
+    # Observations of the cells that did not change keep their IRIs
+    assert set(before.subject_objects(NS.county)) <= set(after.subject_objects(NS.county))
@@ -1,26 +1,43 @@
-import requests
+import os
 from datetime import datetime, timedelta
 
 from airflow import DAG
+from airflow.exceptions import AirflowSkipException
 from airflow.operators.python import PythonOperator
 
 from operators.care_providers import process_care_providers
 from operators.population_2021 import process_population
+from operators.downloads import download
+from operators.fingerprints import clear_fingerprint, is_unchanged, record_fingerprint, task_fingerprint
 
-def consumer_operator(consumer, **kwargs):
-    output_path = kwargs['dag_run'].conf.get("output_path", None)
-    if output_path:
+# default output_path of the consumers
+OUTPUT_PATH = "/opt/airflow/dags/"
+
+CARE_PROVIDERS_FILE = "narodni-registr-poskytovatelu-zdravotnich-sluzeb.csv"
+POPULATION_FILE = "130141-22data2021.csv"
+COUNTY_CODELIST_FILE = "číselník-okresů-vazba-101-nadřízený.csv"
+
+def consumer_operator(consumer, inputs=(), output=None, **kwargs):
+    output_path = kwargs['dag_run'].conf.get("output_path", None) or OUTPUT_PATH
+    if output is None:
         consumer(output_path)
-    else:
-        consumer()
+        return
+
+    # skip the run (and the tasks after it) when neither the inputs nor the code changed since the last success,
+    # the previous output is kept
+    output = os.path.join(output_path, output)
+    fingerprint = task_fingerprint(inputs)
+    if is_unchanged(output, fingerprint):
+        raise AirflowSkipException(f"{output} is up to date with its inputs and code")
+    clear_fingerprint(output)
+    consumer(output_path)
+    record_fingerprint(output, fingerprint)
 
 def get_dataset(url, verify_ssl = True):
     local_filename = url.split('/')[-1]
-    with requests.get(url, stream=True, verify=verify_ssl) as stream:
-        stream.raise_for_status()
-        with open(local_filename, 'wb') as f:
-            for chunk in stream.iter_content(chunk_size=8192): 
-                f.write(chunk)
+    # conditional and resumable, see operators.downloads
+    meta = download(url, local_filename, verify_ssl)
+    print(f"{local_filename}: {'downloaded' if meta['changed'] else 'not modified'}, sha256 {meta['sha256']}")
     return local_filename
 
 dag_args = {
@@ -54,10 +71,12 @@ with DAG(
     t2 = PythonOperator(
         task_id="care-providers-etl",
         python_callable=consumer_operator,
-        op_args=[process_care_providers]
+        op_args=[process_care_providers],
+        op_kwargs={"inputs": [CARE_PROVIDERS_FILE], "output": "health_care.ttl"}
     )
     t2.doc_md = """\
     Runs the Extract-Transform-Load process on **Care Providers** dataset and generates RDF Turtle file in a location specified with `output_path` DAG Run parameter.
+    Skipped when neither the dataset nor the ETL code changed since the last successful run, the previous file is kept.
     """
     
     # Population 2021
@@ -86,10 +105,12 @@ with DAG(
     t5 = PythonOperator(
         task_id="population-2021-etl",
         python_callable=consumer_operator,
-        op_args=[process_population]
+        op_args=[process_population],
+        op_kwargs={"inputs": [POPULATION_FILE, CARE_PROVIDERS_FILE, COUNTY_CODELIST_FILE], "output": "population.ttl"}
     )
     t5.doc_md = """\
      Runs the Extract-Transform-Load process on **Population 2021** dataset and generates RDF Turtle file in a location specified with `output_path` DAG Run parameter.
+     Skipped when neither the datasets nor the ETL code changed since the last successful run, the previous file is kept.
      """
 
     t1 >> t2
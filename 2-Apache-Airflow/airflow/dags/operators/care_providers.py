@@ -4,6 +4,10 @@ import numpy as np
 
 from rdflib import Graph, BNode, Literal, Namespace 
 from rdflib.namespace import RDF, QB, XSD, SKOS, DCTERMS, OWL
+from operators.batch_triples import Iri, Lit, add_rows
+from operators.schema_cache import add_cached_schema
+from operators.triple_writer import TripleWriter
+from operators.csv_cache import CARE_PROVIDERS_CATEGORICAL, read_csv_cached
 
 NS = Namespace("https://ndbi046-martincorovcak.com/ontology#")
 NSR = Namespace("https://ndbi046-martincorovcak.com/resources/")
@@ -14,27 +18,52 @@ SDMX_CONCEPT = Namespace("http://purl.org/linked-data/sdmx/2009/concept#")
 SDMX_MEASURE = Namespace("http://purl.org/linked-data/sdmx/2009/measure#")
 SDMX_CODE = Namespace("http://purl.org/linked-data/sdmx/2009/code#")
 
+PREFIXES = {
+    "ns": NS, "nsr": NSR, "rdfs": RDFS, "qb": QB, "skos": SKOS, "dcterms": DCTERMS,
+    "sdmx-concept": SDMX_CONCEPT, "sdmx-measure": SDMX_MEASURE, "sdmx-code": SDMX_CODE,
+}
+
 
 def load_csv_file_as_object(file_path: str):
-    result = pd.read_csv(file_path, low_memory=False)
+    result = read_csv_cached(file_path, categorical=CARE_PROVIDERS_CATEGORICAL, low_memory=False)
     print(result.head(5))
     return result
 
 
 def as_data_cube(data):
     result = Graph(bind_namespaces="rdflib")
-    
-    create_concept_schemes(result)
-    create_resource_classes(result)
-    create_resources(result, data)
-    dimensions = create_dimensions(result)
-    measures = create_measure(result)
-    structure = create_structure(result, dimensions, measures)
-    dataset = create_dataset(result, structure)
-    create_observations(result, dataset, data)
+    build_data_cube(result, data)
     return result
 
 
+def write_data_cube(data, destination: str, format: str = "ttl"):
+    """Stream the data cube straight to a file without building an in-memory graph.
+
+    Args:
+        data (pd.DataFrame): Source data.
+        destination (str): Path to the output file.
+        format (str, optional): "ttl" or "nt". Defaults to "ttl".
+    """
+    with open(destination, "w", encoding="utf-8") as stream:
+        with TripleWriter(stream, format, PREFIXES) as writer:
+            build_data_cube(writer, data)
+
+
+def build_data_cube(collector, data):
+    dataset = add_cached_schema(collector, create_schema)
+    create_resources(collector, data)
+    create_observations(collector, dataset, data)
+
+
+def create_schema(collector):
+    create_concept_schemes(collector)
+    create_resource_classes(collector)
+    dimensions = create_dimensions(collector)
+    measures = create_measure(collector)
+    structure = create_structure(collector, dimensions, measures)
+    return create_dataset(collector, structure)
+
+
 def create_concept_schemes(collector: Graph):
     county = NSR.county
     collector.add((county, RDF.type, SKOS.ConceptScheme))
@@ -92,37 +121,38 @@ def create_resource_classes(collector: Graph):
 
 def create_resources(collector: Graph, data: pd.DataFrame):
     counties = data.drop_duplicates(["OkresCode"])[["OkresCode", "Okres"]].dropna(subset=["OkresCode"])
-    for _, c in counties.iterrows():
-        county = NSR[f"county/{c['OkresCode']}"]
-        collector.add((county, RDF.type, SKOS.Concept))
-        collector.add((county, RDF.type, SDMX_CODE.Area))
-        collector.add((county, RDF.type, NSR.County))
-        collector.add((county, RDFS.label, Literal(c["Okres"], lang="cs")))
-        collector.add((county, SKOS.prefLabel, Literal(c["Okres"], lang="cs")))
-        collector.add((county, SKOS.inScheme, NSR.county))
-        collector.add((county, SKOS.inScheme, SDMX_CODE.area))
+    add_rows(collector, counties, Iri(NSR, "county/{OkresCode}"), [
+        (RDF.type, SKOS.Concept),
+        (RDF.type, SDMX_CODE.Area),
+        (RDF.type, NSR.County),
+        (RDFS.label, Lit("Okres", lang="cs")),
+        (SKOS.prefLabel, Lit("Okres", lang="cs")),
+        (SKOS.inScheme, NSR.county),
+        (SKOS.inScheme, SDMX_CODE.area),
+    ])
     
     regions = data.drop_duplicates(["KrajCode"])[["KrajCode", "Kraj"]].dropna(subset=["KrajCode"])
-    for _, r in regions.iterrows():
-        region = NSR[f"region/{r['KrajCode']}"]
-        collector.add((region, RDF.type, SKOS.Concept))
-        collector.add((region, RDF.type, SDMX_CODE.Area))
-        collector.add((region, RDF.type, NSR.Region))
-        collector.add((region, RDFS.label, Literal(r["Kraj"], lang="cs")))
-        collector.add((region, SKOS.prefLabel, Literal(r["Kraj"], lang="cs")))
-        collector.add((region, SKOS.inScheme, NSR.region))
-        collector.add((region, SKOS.inScheme, SDMX_CODE.area))
+    add_rows(collector, regions, Iri(NSR, "region/{KrajCode}"), [
+        (RDF.type, SKOS.Concept),
+        (RDF.type, SDMX_CODE.Area),
+        (RDF.type, NSR.Region),
+        (RDFS.label, Lit("Kraj", lang="cs")),
+        (SKOS.prefLabel, Lit("Kraj", lang="cs")),
+        (SKOS.inScheme, NSR.region),
+        (SKOS.inScheme, SDMX_CODE.area),
+    ])
     
     fields_of_care = data["OborPece"].unique()
     foc_index = pd.Index(fields_of_care)
-    data["OborPeceCode"] = data["OborPece"].apply(lambda x: foc_index.get_loc(x))
-    for index in range(len(fields_of_care)):
-        field_of_care = NSR[f"fieldOfCare/{index}"]
-        collector.add((field_of_care, RDF.type, SKOS.Concept))
-        collector.add((field_of_care, RDF.type, NSR.FieldOfCare))
-        collector.add((field_of_care, RDFS.label, Literal(fields_of_care[index], lang="cs")))
-        collector.add((field_of_care, SKOS.prefLabel, Literal(fields_of_care[index], lang="cs")))
-        collector.add((field_of_care, SKOS.inScheme, NSR.fieldOfCare))
+    # OborPece is categorical when loaded from the cache, get_indexer keeps the codes plain integers
+    data["OborPeceCode"] = foc_index.get_indexer(data["OborPece"])
+    add_rows(collector, pd.DataFrame({"OborPece": fields_of_care}), Iri(NSR, "fieldOfCare/{i}"), [
+        (RDF.type, SKOS.Concept),
+        (RDF.type, NSR.FieldOfCare),
+        (RDFS.label, Lit("OborPece", lang="cs")),
+        (SKOS.prefLabel, Lit("OborPece", lang="cs")),
+        (SKOS.inScheme, NSR.fieldOfCare),
+    ])
 
 
 def create_dimensions(collector: Graph):
@@ -205,25 +235,21 @@ def create_dataset(collector: Graph, structure):
 
 def create_observations(collector: Graph, dataset, data: pd.DataFrame):
     grouped = data.groupby(["OkresCode", "KrajCode", "OborPeceCode"]).size().reset_index(name="PocetPoskytovaluPece")
-    for index, row in grouped.iterrows():
-        resource = NSR["observation-" + str(index).zfill(4)]
-        create_observation(collector, dataset, resource, row)
-
-
-def create_observation(collector: Graph, dataset, resource, data):
-    collector.add((resource, RDF.type, QB.Observation))
-    collector.add((resource, QB.dataSet, dataset))
-    collector.add((resource, NS.county, NSR[f"county/{data['OkresCode']}"]))
-    collector.add((resource, NS.region, NSR[f"region/{data['KrajCode']}"]))
-    collector.add((resource, NS.fieldOfCare, NSR[f"fieldOfCare/{data['OborPeceCode']}"]))
-    collector.add((resource, NS.numberOfCareProviders, Literal(data["PocetPoskytovaluPece"], datatype=XSD.integer)))
+    add_rows(collector, grouped, Iri(NSR, "observation-{i:04d}"), [
+        (RDF.type, QB.Observation),
+        (QB.dataSet, dataset),
+        (NS.county, Iri(NSR, "county/{OkresCode}")),
+        (NS.region, Iri(NSR, "region/{KrajCode}")),
+        (NS.fieldOfCare, Iri(NSR, "fieldOfCare/{OborPeceCode}")),
+        (NS.numberOfCareProviders, Lit("PocetPoskytovaluPece", datatype=XSD.integer)),
+    ])
 
 
 def process_care_providers(output_path = "/opt/airflow/dags/"):
     file_path = "./narodni-registr-poskytovatelu-zdravotnich-sluzeb.csv"
     data = load_csv_file_as_object(file_path)
-    data_cube = as_data_cube(data)
-    data_cube.serialize(format="ttl", destination = output_path.rstrip("/") + "/health_care.ttl")
+    # the Turtle file is streamed, static schema triples come from the schema cache
+    write_data_cube(data, output_path.rstrip("/") + "/health_care.ttl")
 
 
 if __name__ == "__main__":
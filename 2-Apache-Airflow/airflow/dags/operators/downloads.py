@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+
+import requests
+
+
+# Sidecar files next to the downloaded file: validators of the complete file and of an interrupted transfer
+META_SUFFIX = ".meta.json"
+PART_SUFFIX = ".part"
+
+CHUNK_SIZE = 1 << 20
+
+
+def download(url: str, destination: str, verify_ssl: bool = True, chunk_size: int = CHUNK_SIZE, attempts: int = 3,
+             sha256: str = None, session: requests.Session = None, timeout: float = 60) -> dict:
+    """Download `url` to `destination`, only transferring what is not there yet.
+
+    The validators of the last download (ETag, Last-Modified) are kept in `destination` + ".meta.json" with the
+    size and sha256 of the file. When they are known, the request is conditional, an unchanged source costs
+    a single 304 round-trip. The file is streamed to `destination` + ".part" in `chunk_size` chunks and hashed
+    on the fly; a transfer interrupted by a connection error is resumed with a Range request (guarded by
+    If-Range, so a source changed in the meantime is downloaded again from the start), both within this call
+    (up to `attempts` times) and by a later call, e.g. the retry of the task. `destination` is only replaced
+    once the whole file is there.
+
+    Args:
+        url (str): URL of the file.
+        destination (str): Path to the downloaded file.
+        verify_ssl (bool, optional): Verify the certificate of the server. Defaults to True.
+        chunk_size (int, optional): Size of the read and write buffer. Defaults to 1 MiB.
+        attempts (int, optional): Number of requests made before a connection error is raised. Defaults to 3.
+        sha256 (str, optional): Expected sha256 of the file.
+        session (requests.Session, optional): Session to make the requests with.
+        timeout (float, optional): Connect and read timeout in seconds. Defaults to 60.
+
+    Raises:
+        ValueError: If the file is shorter than announced, its sha256 is not `sha256` or the server answers
+            an unconditional request with 304.
+
+    Returns:
+        dict: Metadata of the file ("url", "etag", "last_modified", "size", "sha256") and "changed",
+            False when the file was not modified since the last download.
+    """
+    session = session or requests.Session()
+    for attempt in range(1, attempts + 1):
+        try:
+            meta = _download(session, url, destination, verify_ssl, chunk_size, timeout)
+            break
+        except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError, requests.Timeout):
+            if attempt == attempts:
+                raise
+
+    if sha256 is not None and meta["sha256"] != sha256:
+        os.remove(destination)
+        os.remove(destination + META_SUFFIX)
+        raise ValueError(f"sha256 of {url} is {meta['sha256']}, expected {sha256}")
+    return meta
+
+
+def _download(session: requests.Session, url: str, destination: str, verify_ssl: bool, chunk_size: int,
+              timeout: float) -> dict:
+    part = destination + PART_SUFFIX
+    # Ranges are only meaningful over the bytes of the file itself
+    headers = {"Accept-Encoding": "identity"}
+    offset = os.path.getsize(part) if os.path.exists(part) else 0
+    part_meta = _read_meta(part + META_SUFFIX) if offset else None
+    if part_meta and part_meta["url"] == url and (part_meta["etag"] or part_meta["last_modified"]):
+        headers["Range"] = f"bytes={offset}-"
+        headers["If-Range"] = part_meta["etag"] or part_meta["last_modified"]
+    else:
+        meta = _read_meta(destination + META_SUFFIX) if os.path.exists(destination) else None
+        # A file changed since the last download (e.g. by hand) is downloaded again
+        if meta and meta["url"] == url and meta["size"] == os.path.getsize(destination):
+            if meta["etag"]:
+                headers["If-None-Match"] = meta["etag"]
+            if meta["last_modified"]:
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+    with session.get(url, headers=headers, stream=True, verify=verify_ssl, timeout=timeout) as response:
+        if response.status_code == 304 and ("If-None-Match" in headers or "If-Modified-Since" in headers):
+            return {**meta, "changed": False}
+        if response.status_code in (304, 416) and "Range" in headers:
+            # The part is no longer a prefix of the file (or the server does not resume it), start over
+            os.remove(part)
+            return _download(session, url, destination, verify_ssl, chunk_size, timeout)
+        if response.status_code == 304:
+            raise ValueError(f"Unexpected 304 Not Modified for an unconditional request of {url}")
+        response.raise_for_status()
+
+        digest = hashlib.sha256()
+        if response.status_code == 206 and response.headers.get("Content-Range", "").startswith(f"bytes {offset}-"):
+            with open(part, "rb") as f:
+                for chunk in iter(lambda: f.read(chunk_size), b""):
+                    digest.update(chunk)
+            mode = "ab"
+        else:
+            offset = 0
+            part_meta = {
+                "url": url,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+            }
+            _write_meta(part + META_SUFFIX, part_meta)
+            mode = "wb"
+
+        size = offset
+        with open(part, mode, buffering=chunk_size) as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                f.write(chunk)
+                digest.update(chunk)
+                size += len(chunk)
+
+        expected = response.headers.get("Content-Length")
+        if expected is not None and size != offset + int(expected):
+            raise ValueError(f"Incomplete download of {url}: {size} of {offset + int(expected)} bytes")
+
+    meta = {**part_meta, "size": size, "sha256": digest.hexdigest()}
+    os.replace(part, destination)
+    _write_meta(destination + META_SUFFIX, meta)
+    os.remove(part + META_SUFFIX)
+    return {**meta, "changed": True}
+
+
+def _read_meta(path: str) -> dict:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_meta(path: str, meta: dict):
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=1)
+    os.replace(path + ".tmp", path)
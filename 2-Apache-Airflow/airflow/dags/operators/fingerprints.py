@@ -0,0 +1,52 @@
+import hashlib
+import json
+import os
+
+from operators.csv_cache import file_sha256
+
+
+# Next to the output file, fingerprint of the inputs of the run that produced it
+FINGERPRINT_SUFFIX = ".fingerprint.json"
+
+# The ETL code of every task, a change to any module invalidates all fingerprints
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def code_version(code_dir: str = CODE_DIR) -> str:
+    """sha256 of the sources of the modules in `code_dir`."""
+    digest = hashlib.sha256()
+    for name in sorted(os.listdir(code_dir)):
+        if name.endswith(".py"):
+            digest.update(f"{name}:{file_sha256(os.path.join(code_dir, name))}\n".encode())
+    return digest.hexdigest()
+
+
+def task_fingerprint(inputs, code_dir: str = CODE_DIR) -> dict:
+    """Content hashes of the `inputs` files and of the code in `code_dir`."""
+    return {
+        "code": code_version(code_dir),
+        "inputs": {os.path.basename(path): file_sha256(path) for path in inputs},
+    }
+
+
+def is_unchanged(output: str, fingerprint: dict) -> bool:
+    """Whether `output` exists and was produced by a successful run with the same `fingerprint`."""
+    state = output + FINGERPRINT_SUFFIX
+    if not (os.path.exists(output) and os.path.exists(state)):
+        return False
+    with open(state, encoding="utf-8") as f:
+        return json.load(f) == fingerprint
+
+
+def clear_fingerprint(output: str):
+    """Forget the fingerprint of `output`, before it is rewritten (a failed run may leave it half-written)."""
+    if os.path.exists(output + FINGERPRINT_SUFFIX):
+        os.remove(output + FINGERPRINT_SUFFIX)
+
+
+def record_fingerprint(output: str, fingerprint: dict):
+    """Record `fingerprint` as the one of the run that has just produced `output`."""
+    state = output + FINGERPRINT_SUFFIX
+    with open(state + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(fingerprint, f, indent=1)
+    os.replace(state + ".tmp", state)
@@ -4,6 +4,12 @@ import numpy as np
 
 from rdflib import Graph, BNode, Literal, Namespace 
 from rdflib.namespace import RDF, QB, XSD, SKOS, DCTERMS, OWL
+from operators.batch_triples import Iri, Lit, add_rows
+from operators.schema_cache import add_cached_schema
+from operators.triple_writer import TripleWriter
+from operators.region_lookup import build_region_lookup, resolve_regions
+from operators.csv_loader import read_csv_filtered
+from operators.csv_cache import CARE_PROVIDERS_CATEGORICAL, cached_frame, read_csv_cached
 import warnings
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
@@ -17,48 +23,71 @@ SDMX_CONCEPT = Namespace("http://purl.org/linked-data/sdmx/2009/concept#")
 SDMX_MEASURE = Namespace("http://purl.org/linked-data/sdmx/2009/measure#")
 SDMX_CODE = Namespace("http://purl.org/linked-data/sdmx/2009/code#")
 
+PREFIXES = {
+    "ns": NS, "nsr": NSR, "rdfs": RDFS, "qb": QB, "skos": SKOS, "dcterms": DCTERMS,
+    "sdmx-concept": SDMX_CONCEPT, "sdmx-measure": SDMX_MEASURE, "sdmx-code": SDMX_CODE,
+}
+
+
+POPULATION_COLUMNS = ["hodnota", "vuk", "vuzemi_cis", "vuzemi_kod", "vuzemi_txt"]
+POPULATION_DTYPES = {"vuk": str, "vuzemi_cis": "int64", "vuzemi_kod": "int64", "vuzemi_txt": str}
+
 
 def load_csv_file_as_object(file_path: str):
-    result = pd.read_csv(file_path, low_memory=False)
-    result = result.loc[result["vuk"] == "DEM0004"] # mean population data only
-    return result
+    # mean population data of counties only, filtered while reading
+    filters = {"vuk": "DEM0004", "vuzemi_cis": 101}
+    return cached_frame(
+        file_path,
+        lambda path: read_csv_filtered(path, filters, usecols=POPULATION_COLUMNS, dtype=POPULATION_DTYPES),
+        params={"filters": filters, "usecols": POPULATION_COLUMNS, "dtype": POPULATION_DTYPES},
+    )
 
 
 def set_region_per_county(data: pd.DataFrame):
     result = data.loc[data.vuzemi_cis == 101]
     
-    care_providers_df = pd.read_csv("./narodni-registr-poskytovatelu-zdravotnich-sluzeb.csv", 
-                                    usecols=["Kraj", "KrajCode", "OkresCode"])
-    care_providers_df = care_providers_df.drop_duplicates(["OkresCode"]).dropna(subset=["OkresCode"])
+    care_providers_df = read_csv_cached("./narodni-registr-poskytovatelu-zdravotnich-sluzeb.csv",
+                                        categorical=CARE_PROVIDERS_CATEGORICAL, low_memory=False)
 
-    county_mapping_df = pd.read_csv("./číselník-okresů-vazba-101-nadřízený.csv", usecols=["CHODNOTA1", "CHODNOTA2"])
+    county_mapping_df = read_csv_cached("./číselník-okresů-vazba-101-nadřízený.csv", usecols=["CHODNOTA1", "CHODNOTA2"])
 
-    result["okres_lau"] = result["vuzemi_kod"].apply(
-        lambda x: county_mapping_df.loc[county_mapping_df["CHODNOTA2"] == x]["CHODNOTA1"].values[0]
-    )
-    result["kraj_kod"] = result["okres_lau"].apply(
-        lambda x: care_providers_df.loc[care_providers_df["OkresCode"] == x]["KrajCode"].values[0]
-    )
-    result["kraj_txt"] = result["okres_lau"].apply(
-        lambda x: care_providers_df.loc[care_providers_df["OkresCode"] == x]["Kraj"].values[0]
-    )
-    
-    return result
+    lookup = build_region_lookup(county_mapping_df, care_providers_df)
+    return resolve_regions(result, lookup)
 
 
 def as_data_cube(data):
     result = Graph(bind_namespaces="rdflib")
-    
-    create_concept_schemes(result)
-    create_resource_classes(result)
-    create_resources(result, data)
-    dimensions = create_dimensions(result)
-    measures = create_measure(result)
-    structure = create_structure(result, dimensions, measures)
-    dataset = create_dataset(result, structure)
-    create_observations(result, dataset, data)
+    build_data_cube(result, data)
     return result
-    
+
+
+def write_data_cube(data, destination: str, format: str = "ttl"):
+    """Stream the data cube straight to a file without building an in-memory graph.
+
+    Args:
+        data (pd.DataFrame): Source data.
+        destination (str): Path to the output file.
+        format (str, optional): "ttl" or "nt". Defaults to "ttl".
+    """
+    with open(destination, "w", encoding="utf-8") as stream:
+        with TripleWriter(stream, format, PREFIXES) as writer:
+            build_data_cube(writer, data)
+
+
+def build_data_cube(collector, data):
+    dataset = add_cached_schema(collector, create_schema)
+    create_resources(collector, data)
+    create_observations(collector, dataset, data)
+
+
+def create_schema(collector):
+    create_concept_schemes(collector)
+    create_resource_classes(collector)
+    dimensions = create_dimensions(collector)
+    measures = create_measure(collector)
+    structure = create_structure(collector, dimensions, measures)
+    return create_dataset(collector, structure)
+
 
 def create_concept_schemes(collector: Graph):
     county = NSR.county
@@ -99,26 +128,26 @@ def create_resource_classes(collector: Graph):
 
 
 def create_resources(collector: Graph, data: pd.DataFrame):
-    for _, c in data.iterrows():
-        county = NSR[f"county/{c['okres_lau']}"]
-        collector.add((county, RDF.type, SKOS.Concept))
-        collector.add((county, RDF.type, SDMX_CODE.Area))
-        collector.add((county, RDF.type, NSR.County))
-        collector.add((county, RDFS.label, Literal(c["vuzemi_txt"], lang="cs")))
-        collector.add((county, SKOS.prefLabel, Literal(c["vuzemi_txt"], lang="cs")))
-        collector.add((county, SKOS.inScheme, NSR.county))
-        collector.add((county, SKOS.inScheme, SDMX_CODE.area))
+    add_rows(collector, data, Iri(NSR, "county/{okres_lau}"), [
+        (RDF.type, SKOS.Concept),
+        (RDF.type, SDMX_CODE.Area),
+        (RDF.type, NSR.County),
+        (RDFS.label, Lit("vuzemi_txt", lang="cs")),
+        (SKOS.prefLabel, Lit("vuzemi_txt", lang="cs")),
+        (SKOS.inScheme, NSR.county),
+        (SKOS.inScheme, SDMX_CODE.area),
+    ])
     
     regions = data.drop_duplicates("kraj_kod")
-    for _, r in regions.iterrows():
-        region = NSR[f"region/{r['kraj_kod']}"]
-        collector.add((region, RDF.type, SKOS.Concept))
-        collector.add((region, RDF.type, SDMX_CODE.Area))
-        collector.add((region, RDF.type, NSR.Region))
-        collector.add((region, RDFS.label, Literal(r["kraj_txt"], lang="cs")))
-        collector.add((region, SKOS.prefLabel, Literal(r["kraj_txt"], lang="cs")))
-        collector.add((region, SKOS.inScheme, NSR.region))
-        collector.add((region, SKOS.inScheme, SDMX_CODE.area))
+    add_rows(collector, regions, Iri(NSR, "region/{kraj_kod}"), [
+        (RDF.type, SKOS.Concept),
+        (RDF.type, SDMX_CODE.Area),
+        (RDF.type, NSR.Region),
+        (RDFS.label, Lit("kraj_txt", lang="cs")),
+        (SKOS.prefLabel, Lit("kraj_txt", lang="cs")),
+        (SKOS.inScheme, NSR.region),
+        (SKOS.inScheme, SDMX_CODE.area),
+    ])
 
 
 def create_dimensions(collector: Graph):
@@ -191,26 +220,21 @@ def create_dataset(collector: Graph, structure):
 
 
 def create_observations(collector: Graph, dataset, data: pd.DataFrame):
-    mean_population_data = data.reset_index()
-    for index, row in mean_population_data.iterrows():
-        resource = NSR["observation-" + str(index).zfill(2)]
-        create_observation(collector, dataset, resource, row)
+    add_rows(collector, data, Iri(NSR, "observation-{i:02d}"), [
+        (RDF.type, QB.Observation),
+        (QB.dataSet, dataset),
+        (NS.county, Iri(NSR, "county/{okres_lau}")),
+        (NS.region, Iri(NSR, "region/{kraj_kod}")),
+        (NS.meanPopulation, Lit("hodnota", datatype=XSD.integer)),
+    ])
 
 
-def create_observation(collector: Graph, dataset, resource, data):
-    collector.add((resource, RDF.type, QB.Observation))
-    collector.add((resource, QB.dataSet, dataset))
-    collector.add((resource, NS.county, NSR[f"county/{data['okres_lau']}"]))
-    collector.add((resource, NS.region, NSR[f"region/{data['kraj_kod']}"]))
-    collector.add((resource, NS.meanPopulation, Literal(data["hodnota"], datatype=XSD.integer)))
-
-    
 def process_population(output_path = "/opt/airflow/dags/"):
     file_path = "./130141-22data2021.csv"
     data = load_csv_file_as_object(file_path)
     data = set_region_per_county(data)
-    data_cube = as_data_cube(data)
-    data_cube.serialize(format="ttl", destination = output_path.rstrip("/") + "/population.ttl")
+    # the Turtle file is streamed, static schema triples come from the schema cache
+    write_data_cube(data, output_path.rstrip("/") + "/population.ttl")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,85 @@
+import pandas as pd
+
+
+REGION_COLUMNS = ["okres_lau", "kraj_kod", "kraj_txt"]
+
+
+def build_region_lookup(county_mapping_df: pd.DataFrame, care_providers_df: pd.DataFrame, links=()) -> pd.DataFrame:
+    """Build a lookup table from ČSÚ territory codes to county LAU codes and their regions.
+
+    Only county codes (codelist 101) are known from `county_mapping_df`. Rows of other levels, e.g. ORP
+    (65) or municipalities (43), are resolved through `links`, ČSÚ link codelists ("vazba") from the codes
+    of a level to the codes of the level above it. Links are followed level by level with one join each,
+    so a municipality linked to its ORP and the ORP to its county resolves in two joins. Codes without
+    a link to a county are left out of the lookup and reported by `find_unmatched_codes`.
+
+    Args:
+        county_mapping_df (pd.DataFrame): County codelist mapping with "CHODNOTA1" (LAU code)
+            and "CHODNOTA2" (ČSÚ territory code) columns.
+        care_providers_df (pd.DataFrame): Care providers register with "OkresCode", "KrajCode"
+            and "Kraj" columns.
+        links (list, optional): Link codelists with "CHODNOTA1" (code of the lower level) and "CHODNOTA2"
+            (code of the upper level) columns. Territory codes must be unique across all levels.
+
+    Returns:
+        pd.DataFrame: Lookup indexed by ČSÚ territory code with "okres_lau", "kraj_kod"
+            and "kraj_txt" columns.
+    """
+    regions = care_providers_df[["OkresCode", "KrajCode", "Kraj"]] \
+        .dropna(subset=["OkresCode"]) \
+        .drop_duplicates(["OkresCode"]) \
+        .set_index("OkresCode")
+
+    lookup = county_mapping_df[["CHODNOTA2", "CHODNOTA1"]] \
+        .drop_duplicates(["CHODNOTA2"]) \
+        .rename(columns={"CHODNOTA1": "okres_lau"}) \
+        .join(regions, on="okres_lau") \
+        .rename(columns={"KrajCode": "kraj_kod", "Kraj": "kraj_txt"}) \
+        .set_index("CHODNOTA2")[REGION_COLUMNS]
+
+    if len(links):
+        parents = pd.concat([link[["CHODNOTA1", "CHODNOTA2"]] for link in links]) \
+            .drop_duplicates(["CHODNOTA1"]) \
+            .set_index("CHODNOTA1")["CHODNOTA2"]
+        while True:
+            # Codes whose parent has been resolved in the previous round
+            children = parents[parents.isin(lookup.index) & ~parents.index.isin(lookup.index)]
+            if children.empty:
+                break
+            resolved = lookup.loc[children.to_numpy()]
+            resolved.index = children.index.rename(lookup.index.name)
+            lookup = pd.concat([lookup, resolved])
+
+    return lookup
+
+
+def find_unmatched_codes(data: pd.DataFrame, lookup: pd.DataFrame, on: str = "vuzemi_kod") -> list:
+    """Return all codes in `data[on]` that can not be resolved to a county and a region."""
+    codes = pd.Series(data[on].unique())
+    resolved = lookup.dropna(subset=REGION_COLUMNS).index
+    return sorted(codes[~codes.isin(resolved)].tolist())
+
+
+def resolve_regions(data: pd.DataFrame, lookup: pd.DataFrame, on: str = "vuzemi_kod", errors: str = "raise") -> pd.DataFrame:
+    """Resolve "okres_lau", "kraj_kod" and "kraj_txt" for every row in a single hash join.
+
+    Args:
+        data (pd.DataFrame): Data with ČSÚ territory codes.
+        lookup (pd.DataFrame): Lookup created by `build_region_lookup`.
+        on (str, optional): Column with ČSÚ territory codes. Defaults to "vuzemi_kod".
+        errors (str, optional): "raise" to fail on unmatched codes, "ignore" to leave them empty.
+            Defaults to "raise".
+
+    Raises:
+        ValueError: If some codes can not be resolved and `errors` is "raise".
+            All unmatched codes are reported at once.
+
+    Returns:
+        pd.DataFrame: Copy of `data` with the resolved columns appended.
+    """
+    if errors == "raise":
+        unmatched = find_unmatched_codes(data, lookup, on)
+        if unmatched:
+            raise ValueError(f"Unable to resolve county and region for {len(unmatched)} codes in '{on}': {unmatched}")
+
+    return data.join(lookup, on=on)
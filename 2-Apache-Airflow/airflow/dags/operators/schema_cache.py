@@ -0,0 +1,72 @@
+import hashlib
+import inspect
+import io
+import json
+import os
+
+import rdflib
+from rdflib.util import from_n3
+
+from operators.triple_writer import TripleWriter
+
+
+CACHE_DIR = os.environ.get("NDBI046_CACHE_DIR", ".cache")
+
+
+def add_cached_schema(collector, build, cache_dir: str = None):
+    """Add the static schema triples created by `build(collector)` to `collector`.
+
+    Writers (collectors with an `add_lines` method) get the pre-rendered N-Triples fragment,
+    which is rendered only once per schema definition and stored in `cache_dir`.
+    The cache key is a hash of the source code of `build`, the functions it calls and the
+    namespaces they use, so any change to the schema definition renders a new fragment.
+    Graphs get the triples from `build` directly.
+
+    Args:
+        collector: Graph or writer the triples are added to.
+        build (function): Adds the schema triples to a collector and returns a single term (e.g. the dataset).
+        cache_dir (str, optional): Directory with cached fragments.
+            Defaults to $NDBI046_CACHE_DIR or ".cache".
+
+    Returns:
+        The term returned by `build`.
+    """
+    if not hasattr(collector, "add_lines"):
+        return build(collector)
+
+    path = os.path.join(cache_dir or CACHE_DIR, f"schema-{build.__name__}-{schema_key(build)}.json")
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            fragment = json.load(f)
+    else:
+        stream = io.StringIO()
+        with TripleWriter(stream, "nt") as writer:
+            result = build(writer)
+        fragment = {"result": result.n3(), "triples": stream.getvalue()}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(fragment, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
+
+    collector.add_lines(fragment["triples"])
+    return from_n3(fragment["result"])
+
+
+def schema_key(build) -> str:
+    """Content hash of `build`, all functions it (transitively) calls and the constants they use."""
+    digest = hashlib.sha256(rdflib.__version__.encode())
+    functions = [build]
+    seen = set()
+    while functions:
+        function = functions.pop()
+        if function in seen:
+            continue
+        seen.add(function)
+        digest.update(inspect.getsource(function).encode())
+        for name in function.__code__.co_names:
+            value = function.__globals__.get(name)
+            if inspect.isfunction(value) and value.__module__ == function.__module__:
+                functions.append(value)
+            elif isinstance(value, str):
+                digest.update(f"{name}={value}".encode())
+    return digest.hexdigest()[:16]
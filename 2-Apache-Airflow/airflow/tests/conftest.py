@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The DAG files import the operators the way Airflow does, from the dags folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "dags"))
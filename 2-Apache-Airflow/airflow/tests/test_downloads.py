@@ -0,0 +1,139 @@
+import hashlib
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from operators.downloads import META_SUFFIX, PART_SUFFIX, download
+
+
+class FileHandler(BaseHTTPRequestHandler):
+    """Serves `server.data` with an ETag, answering If-None-Match, Range and If-Range like a static file server."""
+
+    def do_GET(self):
+        server = self.server
+        data = server.data
+        etag = '"%s"' % hashlib.sha256(data).hexdigest()[:16]
+        server.requests.append(dict(self.headers))
+        if self.headers.get("If-None-Match") == etag or (self.headers.get("Range") and server.not_modified_range):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        start = 0
+        if self.headers.get("Range") and self.headers.get("If-Range") == etag:
+            start = int(self.headers["Range"].removeprefix("bytes=").removesuffix("-"))
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+        else:
+            self.send_response(200)
+        body = data[start:]
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if server.drop_after is not None:
+            # Announce the whole body but close the connection after a part of it
+            body, server.drop_after = body[:server.drop_after], None
+            self.wfile.write(body)
+            self.wfile.flush()
+            self.close_connection = True
+            self.connection.shutdown(2)
+            return
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FileHandler)
+    server.data = os.urandom(200_000)
+    server.requests = []
+    server.drop_after = None
+    server.not_modified_range = False
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_port}/register.csv"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def test_unchanged_file_is_not_downloaded_again(server, tmp_path):
+    destination = str(tmp_path / "register.csv")
+    assert download(server.url, destination, chunk_size=4096)["changed"]
+
+    meta = download(server.url, destination, chunk_size=4096)
+    assert not meta["changed"]
+    assert meta["sha256"] == sha256(server.data)
+    assert server.requests[-1]["If-None-Match"] == meta["etag"]
+    assert sorted(os.listdir(tmp_path)) == ["register.csv", "register.csv" + META_SUFFIX]
+
+
+def test_dropped_connection_is_resumed(server, tmp_path):
+    destination = str(tmp_path / "register.csv")
+    server.drop_after = 12 * 4096
+
+    meta = download(server.url, destination, chunk_size=4096, attempts=2)
+    assert meta["changed"]
+    assert meta["sha256"] == sha256(server.data)
+    with open(destination, "rb") as f:
+        assert f.read() == server.data
+    # The second request only asks for the rest of the file
+    assert server.requests[1]["Range"] == f"bytes={12 * 4096}-"
+    assert server.requests[1]["If-Range"] == meta["etag"]
+
+
+def test_interrupted_download_is_resumed_by_a_later_call(server, tmp_path):
+    destination = str(tmp_path / "register.csv")
+    server.drop_after = 12 * 4096
+    with pytest.raises((requests.ConnectionError, requests.exceptions.ChunkedEncodingError)):
+        download(server.url, destination, chunk_size=4096, attempts=1)
+    assert os.path.getsize(destination + PART_SUFFIX) == 12 * 4096
+
+    meta = download(server.url, destination, chunk_size=4096)
+    assert meta["sha256"] == sha256(server.data)
+    assert server.requests[-1]["Range"] == f"bytes={12 * 4096}-"
+
+
+def test_file_changed_since_interruption_is_downloaded_again(server, tmp_path):
+    destination = str(tmp_path / "register.csv")
+    server.drop_after = 12 * 4096
+    with pytest.raises((requests.ConnectionError, requests.exceptions.ChunkedEncodingError)):
+        download(server.url, destination, chunk_size=4096, attempts=1)
+    server.data = os.urandom(120_000)
+
+    meta = download(server.url, destination, chunk_size=4096)
+    # If-Range does not match the new ETag, the server sends the whole new file
+    assert "Range" in server.requests[-1]
+    assert meta["size"] == 120_000
+    assert meta["sha256"] == sha256(server.data)
+    assert not os.path.exists(destination + PART_SUFFIX)
+
+
+def test_not_modified_answer_to_a_resumed_request(server, tmp_path):
+    destination = str(tmp_path / "register.csv")
+    server.drop_after = 12 * 4096
+    with pytest.raises((requests.ConnectionError, requests.exceptions.ChunkedEncodingError)):
+        download(server.url, destination, chunk_size=4096, attempts=1)
+    server.not_modified_range = True
+
+    meta = download(server.url, destination, chunk_size=4096)
+    # The part is dropped and the file downloaded from the start
+    assert "Range" not in server.requests[-1]
+    assert meta["sha256"] == sha256(server.data)
+
+
+def test_sha256_mismatch(server, tmp_path):
+    destination = str(tmp_path / "register.csv")
+    with pytest.raises(ValueError, match="sha256"):
+        download(server.url, destination, sha256="0" * 64)
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,108 @@
+import importlib
+from types import SimpleNamespace
+
+import pytest
+
+from operators.fingerprints import clear_fingerprint, is_unchanged, record_fingerprint, task_fingerprint
+
+
+@pytest.fixture
+def run(tmp_path):
+    """Input, code directory and output of a task which has run once."""
+    source = tmp_path / "input.csv"
+    source.write_text("a,b\n1,2\n", encoding="utf-8")
+    code_dir = tmp_path / "code"
+    code_dir.mkdir()
+    (code_dir / "task.py").write_text("print('cube')\n", encoding="utf-8")
+    output = tmp_path / "cube.ttl"
+    output.write_text("<s> <p> <o> .\n", encoding="utf-8")
+    record_fingerprint(str(output), task_fingerprint([str(source)], str(code_dir)))
+    return SimpleNamespace(source=source, code_dir=code_dir, output=output)
+
+
+def fingerprint(run) -> dict:
+    return task_fingerprint([str(run.source)], str(run.code_dir))
+
+
+def test_unchanged_input_skips(run):
+    assert is_unchanged(str(run.output), fingerprint(run))
+
+
+def test_changed_input_reruns(run):
+    run.source.write_text("a,b\n1,3\n", encoding="utf-8")
+    assert not is_unchanged(str(run.output), fingerprint(run))
+
+
+def test_changed_code_reruns(run):
+    (run.code_dir / "task.py").write_text("print('another cube')\n", encoding="utf-8")
+    assert not is_unchanged(str(run.output), fingerprint(run))
+
+
+def test_missing_output_reruns(run):
+    run.output.unlink()
+    assert not is_unchanged(str(run.output), fingerprint(run))
+
+
+def test_cleared_fingerprint_reruns(run):
+    clear_fingerprint(str(run.output))
+    assert not is_unchanged(str(run.output), fingerprint(run))
+    # Clearing a missing fingerprint is a no-op
+    clear_fingerprint(str(run.output))
+
+
+@pytest.fixture
+def dag():
+    pytest.importorskip("airflow")
+    return importlib.import_module("data_cubes_dag")
+
+
+def test_consumer_operator(dag, tmp_path):
+    from airflow.exceptions import AirflowSkipException
+
+    source = tmp_path / "input.csv"
+    source.write_text("a,b\n1,2\n", encoding="utf-8")
+    output = tmp_path / "cube.ttl"
+    runs = []
+
+    def consumer(output_path):
+        runs.append(output_path)
+        output.write_text(f"<s> <p> {len(runs)} .\n", encoding="utf-8")
+
+    def run_task():
+        dag.consumer_operator(consumer, [str(source)], output.name,
+                              dag_run=SimpleNamespace(conf={"output_path": str(tmp_path)}))
+
+    run_task()
+    assert len(runs) == 1
+    # Unchanged input, the task and the ones after it are skipped
+    with pytest.raises(AirflowSkipException):
+        run_task()
+    assert len(runs) == 1
+
+    source.write_text("a,b\n1,3\n", encoding="utf-8")
+    run_task()
+    assert len(runs) == 2
+
+    output.unlink()
+    run_task()
+    assert len(runs) == 3
+
+    clear_fingerprint(str(output))
+    run_task()
+    assert len(runs) == 4
+    with pytest.raises(AirflowSkipException):
+        run_task()
+
+    # A failed run leaves a half-written output without a fingerprint, so the output is rebuilt even when the
+    # input is back to the one of the last success
+    def failing_consumer(output_path):
+        output.write_text("<s> <p>", encoding="utf-8")
+        raise RuntimeError("failed")
+
+    source.write_text("a,b\n1,4\n", encoding="utf-8")
+    with pytest.raises(RuntimeError):
+        dag.consumer_operator(failing_consumer, [str(source)], output.name,
+                              dag_run=SimpleNamespace(conf={"output_path": str(tmp_path)}))
+    source.write_text("a,b\n1,3\n", encoding="utf-8")
+    run_task()
+    assert len(runs) == 5
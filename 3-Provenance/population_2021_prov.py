@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
+import argparse
 
 from rdflib import Graph, Literal, Namespace, URIRef, BNode
 from rdflib.namespace import RDF, FOAF, XSD, PROV
+from rdf_output import COMPRESSIONS, FORMATS, output_name, write_graph
 
 NSR = Namespace("https://ndbi046-martincorovcak.com/resources/")
 NSP = Namespace("https://ndbi046-martincorovcak.com/provenance#")
@@ -117,17 +119,27 @@ def create_auxiliary_resources(collector: Graph):
     collector.add((NSP.ETLRole, RDF.type, PROV.Role))
 
 
-def create_prov_data(output_path = "."):
+def create_prov_data(output_path = ".", format = "trig", compression = None):
     """Create provenance data for the care providers dataset.
 
     Args:
         output_path (str, optional): Path to the output directory. Defaults to ".".
+        format (str, optional): One of `rdf_output.FORMATS`. Defaults to "trig".
+        compression (str, optional): "gzip" or "zstd". Defaults to None.
     """
     
     prov_data = get_prov_data()
     output_path = output_path.rstrip("/")
-    prov_data.serialize(format="trig", destination = f"{output_path}/population-2021-prov.trig")
+    write_graph(prov_data, output_name(f"{output_path}/population-2021-prov", format, compression), format)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generates the provenance of the data cube.")
+    parser.add_argument("--format", choices=FORMATS, default="trig", help="output format")
+    parser.add_argument("--compress", choices=COMPRESSIONS, help="compress the output file on the fly")
+    args = parser.parse_args()
+    create_prov_data(format=args.format, compression=args.compress)
 
 
 if __name__ == "__main__":
-    create_prov_data()
+    main()
@@ -1,5 +1,8 @@
+import argparse
+
 from population_2021.codelist import create_codelist
 from population_2021.data_cube import process_population
+from population_2021.rdf_output import COMPRESSIONS, FORMATS
 
 from rdflib import Graph, BNode, Literal, Namespace, URIRef
 from rdflib.namespace import RDF, XSD, DCAT, DCTERMS
@@ -63,7 +66,17 @@ def create_dataset_entry():
     g.serialize("population-dataset-entry.ttl", format="turtle")
 
 
-if __name__ == "__main__":
-    create_codelist()
-    process_population()
+def main():
+    parser = argparse.ArgumentParser(description="Generates the Population 2021 Data Cube, its codelist and dataset entry.")
+    parser.add_argument("--format", choices=FORMATS, default="ttl",
+                        help="output format of the data cube and codelist (the dataset entry describes the Turtle distribution)")
+    parser.add_argument("--compress", choices=COMPRESSIONS, help="compress the data cube and codelist on the fly")
+    args = parser.parse_args()
+
+    create_codelist(format=args.format, compression=args.compress)
+    process_population(format=args.format, compression=args.compress)
     create_dataset_entry()
+
+
+if __name__ == "__main__":
+    main()
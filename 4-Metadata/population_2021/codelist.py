@@ -1,10 +1,23 @@
 #!/usr/bin/env python3
+import os
+import sys
+
 import pandas as pd
 import numpy as np
 
 from rdflib import Graph, Literal, Namespace 
 from rdflib.namespace import RDF, SKOS, OWL
+
+if __package__ in (None, ""):
+    # Run as a script (python3 population_2021/codelist.py), the package is imported from the parent directory
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from population_2021.batch_triples import Iri, Lit, add_rows
 from pandas.errors import SettingWithCopyWarning
+from population_2021.region_lookup import build_region_lookup, resolve_regions
+from population_2021.csv_loader import read_csv_filtered
+from population_2021.csv_cache import CARE_PROVIDERS_CATEGORICAL, cached_frame, read_csv_cached
+from population_2021.rdf_output import output_name, write_graph
 import warnings
 warnings.simplefilter(action='ignore', category=FutureWarning)
 warnings.simplefilter(action='ignore', category=SettingWithCopyWarning)
@@ -15,32 +28,30 @@ RDFS = Namespace("http://www.w3.org/2000/01/rdf-schema#")
 SDMX_CODE = Namespace("http://purl.org/linked-data/sdmx/2009/code#")
 
 
+POPULATION_COLUMNS = ["hodnota", "vuk", "vuzemi_cis", "vuzemi_kod", "vuzemi_txt"]
+POPULATION_DTYPES = {"vuk": str, "vuzemi_cis": "int64", "vuzemi_kod": "int64", "vuzemi_txt": str}
+
+
 def load_csv_file_as_object(file_path: str):
-    result = pd.read_csv(file_path, low_memory=False)
-    result = result.loc[result["vuk"] == "DEM0004"] # mean population data only
-    return result
+    # mean population data of counties only, filtered while reading
+    filters = {"vuk": "DEM0004", "vuzemi_cis": 101}
+    return cached_frame(
+        file_path,
+        lambda path: read_csv_filtered(path, filters, usecols=POPULATION_COLUMNS, dtype=POPULATION_DTYPES),
+        params={"filters": filters, "usecols": POPULATION_COLUMNS, "dtype": POPULATION_DTYPES},
+    )
 
 
 def set_region_per_county(data: pd.DataFrame):
     result = data.loc[data.vuzemi_cis == 101]
     
-    care_providers_df = pd.read_csv("data/narodni-registr-poskytovatelu-zdravotnich-sluzeb.csv", 
-                                    usecols=["Kraj", "KrajCode", "OkresCode"])
-    care_providers_df = care_providers_df.drop_duplicates(["OkresCode"]).dropna(subset=["OkresCode"])
+    care_providers_df = read_csv_cached("data/narodni-registr-poskytovatelu-zdravotnich-sluzeb.csv",
+                                        categorical=CARE_PROVIDERS_CATEGORICAL, low_memory=False)
 
-    county_mapping_df = pd.read_csv("data/číselník-okresů-vazba-101-nadřízený.csv", usecols=["CHODNOTA1", "CHODNOTA2"])
+    county_mapping_df = read_csv_cached("data/číselník-okresů-vazba-101-nadřízený.csv", usecols=["CHODNOTA1", "CHODNOTA2"])
 
-    result["okres_lau"] = result["vuzemi_kod"].apply(
-        lambda x: county_mapping_df.loc[county_mapping_df["CHODNOTA2"] == x]["CHODNOTA1"].values[0]
-    )
-    result["kraj_kod"] = result["okres_lau"].apply(
-        lambda x: care_providers_df.loc[care_providers_df["OkresCode"] == x]["KrajCode"].values[0]
-    )
-    result["kraj_txt"] = result["okres_lau"].apply(
-        lambda x: care_providers_df.loc[care_providers_df["OkresCode"] == x]["Kraj"].values[0]
-    )
-    
-    return result
+    lookup = build_region_lookup(county_mapping_df, care_providers_df)
+    return resolve_regions(result, lookup)
 
 
 def process_data(data):
@@ -102,37 +113,44 @@ def create_resource_classes(collector: Graph):
 
 
 def create_resources(collector: Graph, data: pd.DataFrame):
-    for _, c in data.iterrows():
-        county = NSR[f"county/{c['okres_lau']}"]
-        collector.add((county, RDF.type, SKOS.Concept))
-        collector.add((county, RDF.type, SDMX_CODE.Area))
-        collector.add((county, RDF.type, NSR.County))
-        collector.add((county, RDFS.label, Literal(c["vuzemi_txt"], lang="cs")))
-        collector.add((county, SKOS.prefLabel, Literal(c["vuzemi_txt"], lang="cs")))
-        collector.add((county, SKOS.inScheme, NSR.county))
-        collector.add((county, SKOS.inScheme, SDMX_CODE.area))
-        collector.add((county, SKOS.notation, Literal(c["okres_lau"])))
-        collector.add((county, SKOS.narrowMatch, NSR[f"region/{c['kraj_kod']}"]))
+    add_rows(collector, data, Iri(NSR, "county/{okres_lau}"), [
+        (RDF.type, SKOS.Concept),
+        (RDF.type, SDMX_CODE.Area),
+        (RDF.type, NSR.County),
+        (RDFS.label, Lit("vuzemi_txt", lang="cs")),
+        (SKOS.prefLabel, Lit("vuzemi_txt", lang="cs")),
+        (SKOS.inScheme, NSR.county),
+        (SKOS.inScheme, SDMX_CODE.area),
+        (SKOS.notation, Lit("okres_lau")),
+        (SKOS.narrowMatch, Iri(NSR, "region/{kraj_kod}")),
+    ])
     
     regions = data.drop_duplicates("kraj_kod")
-    for _, r in regions.iterrows():
-        region = NSR[f"region/{r['kraj_kod']}"]
-        collector.add((region, RDF.type, SKOS.Concept))
-        collector.add((region, RDF.type, SDMX_CODE.Area))
-        collector.add((region, RDF.type, NSR.Region))
-        collector.add((region, RDFS.label, Literal(r["kraj_txt"], lang="cs")))
-        collector.add((region, SKOS.prefLabel, Literal(r["kraj_txt"], lang="cs")))
-        collector.add((region, SKOS.inScheme, NSR.region))
-        collector.add((region, SKOS.inScheme, SDMX_CODE.area))
-        collector.add((region, SKOS.notation, Literal(r["kraj_kod"])))
-
-    
-def create_codelist(output_path = "."):
+    add_rows(collector, regions, Iri(NSR, "region/{kraj_kod}"), [
+        (RDF.type, SKOS.Concept),
+        (RDF.type, SDMX_CODE.Area),
+        (RDF.type, NSR.Region),
+        (RDFS.label, Lit("kraj_txt", lang="cs")),
+        (SKOS.prefLabel, Lit("kraj_txt", lang="cs")),
+        (SKOS.inScheme, NSR.region),
+        (SKOS.inScheme, SDMX_CODE.area),
+        (SKOS.notation, Lit("kraj_kod")),
+    ])
+
+
+def create_codelist(output_path = ".", format = "ttl", compression = None):
+    """Create the Region/County codelist.
+
+    Args:
+        output_path (str, optional): Path to the output directory. Defaults to ".".
+        format (str, optional): One of `rdf_output.FORMATS`. Defaults to "ttl".
+        compression (str, optional): "gzip" or "zstd". Defaults to None.
+    """
     file_path = "data/130141-22data2021.csv"
     data = load_csv_file_as_object(file_path)
     data = set_region_per_county(data)
     data_cube = process_data(data)
-    data_cube.serialize(format="ttl", destination = output_path.rstrip("/") + "/region-county-codelist.ttl")
+    write_graph(data_cube, output_name(output_path.rstrip("/") + "/region-county-codelist", format, compression), format)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,69 @@
+import hashlib
+import os
+
+import pandas as pd
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # the cache is optional, files are parsed every time without it
+    feather = None
+
+
+CACHE_DIR = os.environ.get("NDBI046_CACHE_DIR", ".cache")
+
+# Shared by every entry point reading the care providers register, so they all hit the same cache entry
+CARE_PROVIDERS_CATEGORICAL = ["Kraj", "Okres", "OborPece"]
+
+
+def file_sha256(file_path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cached_frame(file_path: str, load, params: dict = None, categorical=(), cache_dir: str = None) -> pd.DataFrame:
+    """Load a DataFrame through a content-addressed Arrow cache.
+
+    The first call parses the file with `load(file_path)` and stores the result as an uncompressed
+    Arrow (Feather) file keyed by the sha256 of the source file and `params`. Later calls with the same
+    file content memory-map the Arrow file instead of parsing the source again, no matter where
+    the source file is located. Without pyarrow installed, `load` is called every time.
+
+    Args:
+        file_path (str): Path to the source file.
+        load (function): Parses the source file into a DataFrame.
+        params (dict, optional): Everything that changes the result of `load`, part of the cache key.
+        categorical (iterable, optional): Columns stored as categoricals.
+        cache_dir (str, optional): Cache directory. Defaults to $NDBI046_CACHE_DIR or ".cache".
+
+    Returns:
+        pd.DataFrame: Loaded data.
+    """
+    if feather is None:
+        return _as_categorical(load(file_path), categorical)
+
+    key = hashlib.sha256(f"{file_sha256(file_path)}:{sorted((params or {}).items())}:{sorted(categorical)}".encode())
+    name = os.path.splitext(os.path.basename(file_path))[0]
+    path = os.path.join(cache_dir or CACHE_DIR, f"{name}-{key.hexdigest()[:16]}.arrow")
+    if os.path.exists(path):
+        return feather.read_table(path, memory_map=True).to_pandas()
+
+    result = _as_categorical(load(file_path), categorical).reset_index(drop=True)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    feather.write_feather(result, path + f".{os.getpid()}.tmp", compression="uncompressed")
+    os.replace(path + f".{os.getpid()}.tmp", path)
+    return result
+
+
+def read_csv_cached(file_path: str, categorical=(), cache_dir: str = None, **kwargs) -> pd.DataFrame:
+    """`pd.read_csv` through the Arrow cache, see `cached_frame`."""
+    return cached_frame(file_path, lambda path: pd.read_csv(path, **kwargs), kwargs, categorical, cache_dir)
+
+
+def _as_categorical(data: pd.DataFrame, columns) -> pd.DataFrame:
+    for column in columns:
+        if column in data:
+            data[column] = data[column].astype("category")
+    return data
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+
+def read_csv_filtered(file_path: str, filters: dict, usecols=None, dtype=None, chunksize: int = 100_000, **kwargs) -> pd.DataFrame:
+    """Stream a .csv file in chunks and keep only the rows matching all `filters`.
+
+    Filters are applied to every chunk right after it is parsed, so rows that are thrown away
+    are never held in memory all at once.
+
+    Args:
+        file_path (str): Path to the .csv file.
+        filters (dict): Column name -> required value. A list, tuple or set of values
+            keeps rows matching any of them.
+        usecols (list, optional): Columns to parse. Defaults to all columns.
+        dtype (dict, optional): Column dtypes passed to `pd.read_csv`.
+        chunksize (int, optional): Number of rows parsed at once. Defaults to 100 000.
+
+    Returns:
+        pd.DataFrame: Rows matching all filters, with a fresh index.
+    """
+    chunks = []
+    with pd.read_csv(file_path, usecols=usecols, dtype=dtype, chunksize=chunksize, **kwargs) as reader:
+        for chunk in reader:
+            mask = np.ones(len(chunk), dtype=bool)
+            for column, value in filters.items():
+                if isinstance(value, (list, tuple, set, frozenset)):
+                    mask &= chunk[column].isin(value).to_numpy()
+                else:
+                    mask &= (chunk[column] == value).to_numpy()
+            chunks.append(chunk.loc[mask])
+
+    if not chunks:
+        return pd.read_csv(file_path, usecols=usecols, dtype=dtype, nrows=0, **kwargs)
+    return pd.concat(chunks, ignore_index=True)
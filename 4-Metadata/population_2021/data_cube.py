@@ -1,10 +1,25 @@
 #!/usr/bin/env python3
+import os
+import sys
+
 import pandas as pd
 import numpy as np
 
 from rdflib import Graph, BNode, Literal, Namespace 
 from rdflib.namespace import RDF, QB, XSD, DCTERMS
+
+if __package__ in (None, ""):
+    # Run as a script (python3 population_2021/data_cube.py), the package is imported from the parent directory
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from population_2021.batch_triples import Iri, Lit, add_rows
 from pandas.errors import SettingWithCopyWarning
+from population_2021.region_lookup import build_region_lookup, resolve_regions
+from population_2021.csv_loader import read_csv_filtered
+from population_2021.csv_cache import CARE_PROVIDERS_CATEGORICAL, cached_frame, read_csv_cached
+from population_2021.triple_writer import TripleWriter
+from population_2021.rdf_output import open_output, output_name, write_graph, writer_format
+from population_2021.schema_cache import add_cached_schema
 import warnings
 warnings.simplefilter(action='ignore', category=FutureWarning)
 warnings.simplefilter(action='ignore', category=SettingWithCopyWarning)
@@ -16,46 +31,70 @@ RDFS = Namespace("http://www.w3.org/2000/01/rdf-schema#")
 SDMX_CONCEPT = Namespace("http://purl.org/linked-data/sdmx/2009/concept#")
 SDMX_MEASURE = Namespace("http://purl.org/linked-data/sdmx/2009/measure#")
 
+PREFIXES = {
+    "ns": NS, "nsr": NSR, "rdfs": RDFS, "qb": QB, "dcterms": DCTERMS,
+    "sdmx-concept": SDMX_CONCEPT, "sdmx-measure": SDMX_MEASURE,
+}
+
+
+POPULATION_COLUMNS = ["hodnota", "vuk", "vuzemi_cis", "vuzemi_kod", "vuzemi_txt"]
+POPULATION_DTYPES = {"vuk": str, "vuzemi_cis": "int64", "vuzemi_kod": "int64", "vuzemi_txt": str}
+
 
 def load_csv_file_as_object(file_path: str):
-    result = pd.read_csv(file_path, low_memory=False)
-    result = result.loc[result["vuk"] == "DEM0004"] # mean population data only
-    return result
+    # mean population data of counties only, filtered while reading
+    filters = {"vuk": "DEM0004", "vuzemi_cis": 101}
+    return cached_frame(
+        file_path,
+        lambda path: read_csv_filtered(path, filters, usecols=POPULATION_COLUMNS, dtype=POPULATION_DTYPES),
+        params={"filters": filters, "usecols": POPULATION_COLUMNS, "dtype": POPULATION_DTYPES},
+    )
 
 
 def set_region_per_county(data: pd.DataFrame):
     result = data.loc[data.vuzemi_cis == 101]
     
-    care_providers_df = pd.read_csv("data/narodni-registr-poskytovatelu-zdravotnich-sluzeb.csv", 
-                                    usecols=["Kraj", "KrajCode", "OkresCode"])
-    care_providers_df = care_providers_df.drop_duplicates(["OkresCode"]).dropna(subset=["OkresCode"])
+    care_providers_df = read_csv_cached("data/narodni-registr-poskytovatelu-zdravotnich-sluzeb.csv",
+                                        categorical=CARE_PROVIDERS_CATEGORICAL, low_memory=False)
 
-    county_mapping_df = pd.read_csv("data/číselník-okresů-vazba-101-nadřízený.csv", usecols=["CHODNOTA1", "CHODNOTA2"])
+    county_mapping_df = read_csv_cached("data/číselník-okresů-vazba-101-nadřízený.csv", usecols=["CHODNOTA1", "CHODNOTA2"])
 
-    result["okres_lau"] = result["vuzemi_kod"].apply(
-        lambda x: county_mapping_df.loc[county_mapping_df["CHODNOTA2"] == x]["CHODNOTA1"].values[0]
-    )
-    result["kraj_kod"] = result["okres_lau"].apply(
-        lambda x: care_providers_df.loc[care_providers_df["OkresCode"] == x]["KrajCode"].values[0]
-    )
-    result["kraj_txt"] = result["okres_lau"].apply(
-        lambda x: care_providers_df.loc[care_providers_df["OkresCode"] == x]["Kraj"].values[0]
-    )
-    
-    return result
+    lookup = build_region_lookup(county_mapping_df, care_providers_df)
+    return resolve_regions(result, lookup)
 
 
 def as_data_cube(data):
     result = Graph(bind_namespaces="rdflib")
-    
-    dimensions = create_dimensions(result)
-    measures = create_measure(result)
-    structure = create_structure(result, dimensions, measures)
-    dataset = create_dataset(result, structure)
-    create_observations(result, dataset, data)
+    build_data_cube(result, data)
     return result
 
 
+def write_data_cube(data, destination: str, format: str = "ttl"):
+    """Stream the data cube straight to a file without building an in-memory graph.
+
+    Args:
+        data (pd.DataFrame): Source data.
+        destination (str): Path to the output file.
+        format (str, optional): One of `rdf_output.FORMATS`. Defaults to "ttl".
+            The output is compressed when `destination` ends with ".gz" (gzip) or ".zst" (zstd).
+    """
+    with open_output(destination) as stream:
+        with TripleWriter(stream, writer_format(format), PREFIXES) as writer:
+            build_data_cube(writer, data)
+
+
+def build_data_cube(collector, data):
+    dataset = add_cached_schema(collector, create_schema)
+    create_observations(collector, dataset, data)
+
+
+def create_schema(collector):
+    dimensions = create_dimensions(collector)
+    measures = create_measure(collector)
+    structure = create_structure(collector, dimensions, measures)
+    return create_dataset(collector, structure)
+
+
 def create_dimensions(collector: Graph):
     county = NS.county
     collector.add((county, RDF.type, RDFS.Property))
@@ -126,26 +165,34 @@ def create_dataset(collector: Graph, structure):
 
 
 def create_observations(collector: Graph, dataset, data: pd.DataFrame):
-    mean_population_data = data.reset_index()
-    for index, row in mean_population_data.iterrows():
-        resource = NSR["observation-" + str(index).zfill(2)]
-        create_observation(collector, dataset, resource, row)
-
-
-def create_observation(collector: Graph, dataset, resource, data):
-    collector.add((resource, RDF.type, QB.Observation))
-    collector.add((resource, QB.dataSet, dataset))
-    collector.add((resource, NS.county, NSR[f"county/{data['okres_lau']}"]))
-    collector.add((resource, NS.region, NSR[f"region/{data['kraj_kod']}"]))
-    collector.add((resource, NS.meanPopulation, Literal(data["hodnota"], datatype=XSD.integer)))
-
-    
-def process_population(output_path = "."):
+    add_rows(collector, data, Iri(NSR, "observation-{i:02d}"), [
+        (RDF.type, QB.Observation),
+        (QB.dataSet, dataset),
+        (NS.county, Iri(NSR, "county/{okres_lau}")),
+        (NS.region, Iri(NSR, "region/{kraj_kod}")),
+        (NS.meanPopulation, Lit("hodnota", datatype=XSD.integer)),
+    ])
+
+
+def process_population(output_path = ".", stream = False, format = "ttl", compression = None):
+    """Create the Population 2021 data cube.
+
+    Args:
+        output_path (str, optional): Path to the output directory. Defaults to ".".
+        stream (bool, optional): Write triples straight to the output file instead of
+            building an in-memory graph. Defaults to False.
+        format (str, optional): One of `rdf_output.FORMATS`. Defaults to "ttl".
+        compression (str, optional): "gzip" or "zstd". Defaults to None.
+    """
     file_path = "data/130141-22data2021.csv"
     data = load_csv_file_as_object(file_path)
     data = set_region_per_county(data)
-    data_cube = as_data_cube(data)
-    data_cube.serialize(format="ttl", destination = output_path.rstrip("/") + "/population.ttl")
+    destination = output_name(output_path.rstrip("/") + "/population", format, compression)
+    if stream:
+        write_data_cube(data, destination, format)
+    else:
+        data_cube = as_data_cube(data)
+        write_graph(data_cube, destination, format)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,86 @@
+from rdflib import Graph, Literal, URIRef
+from rdflib.namespace import NamespaceManager
+
+
+FORMATS = ["ttl", "nt"]
+
+
+class TripleWriter:
+    """Collector writing every added triple straight to a text stream.
+
+    Has the same `add` method as `rdflib.Graph`, so it can be passed to the `create_*` functions
+    instead of a graph. Nothing is kept in memory, so the output is written as it is produced.
+    Turtle output groups consecutive triples of the same subject, N-Triples output is one triple per line.
+
+    Turtle output is N-Triples-style Turtle: the `@prefix` header and the triples passed to `add` use prefixed
+    names, but the bulk rows of `add_lines` (`batch_triples.add_rows`, the schema fragments of `schema_cache`)
+    are written as N-Triples lines with full IRIs, one triple per line. That keeps the writer a single pass
+    and the output line-oriented (the incremental mode of care-providers.py patches it line by line), so
+    the file is larger than the one of rdflib's Turtle serializer, while holding the same graph.
+    """
+
+    def __init__(self, stream, format: str = "ttl", namespaces: dict = None):
+        if format not in FORMATS:
+            raise ValueError(f"Unsupported format '{format}', expected one of {FORMATS}")
+
+        self.stream = stream
+        self.format = format
+        self.count = 0
+        self._subject = None
+        self._namespace_manager = None
+
+        if format == "ttl":
+            self._namespace_manager = NamespaceManager(Graph(bind_namespaces="none"), bind_namespaces="core")
+            for prefix, namespace in (namespaces or {}).items():
+                self._namespace_manager.bind(prefix, namespace)
+            for prefix, namespace in self._namespace_manager.namespaces():
+                stream.write(f"@prefix {prefix}: <{namespace}> .\n")
+            stream.write("\n")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def add(self, triple):
+        subject, predicate, obj = triple
+        if self.format == "nt":
+            self.stream.write(f"{self._term(subject)} {self._term(predicate)} {self._term(obj)} .\n")
+        elif subject == self._subject:
+            self.stream.write(f" ;\n    {self._term(predicate)} {self._term(obj)}")
+        else:
+            self._end_subject()
+            self.stream.write(f"{self._term(subject)} {self._term(predicate)} {self._term(obj)}")
+            self._subject = subject
+        self.count += 1
+
+    def addN(self, quads):
+        for subject, predicate, obj, _ in quads:
+            self.add((subject, predicate, obj))
+
+    def add_lines(self, lines: str):
+        """Write pre-rendered N-Triples lines, which are valid Turtle as well."""
+        self._end_subject()
+        self.stream.write(lines)
+        self.count += lines.count("\n")
+
+    def close(self):
+        self._end_subject()
+
+    def _end_subject(self):
+        if self._subject is not None:
+            self.stream.write(" .\n\n")
+            self._subject = None
+
+    def _term(self, term) -> str:
+        if isinstance(term, Literal):
+            lexical = str(term).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n").replace("\r", "\\r")
+            if term.language:
+                return f'"{lexical}"@{term.language}'
+            if term.datatype:
+                return f'"{lexical}"^^{self._term(term.datatype)}'
+            return f'"{lexical}"'
+        if isinstance(term, URIRef) and self._namespace_manager is not None:
+            return self._namespace_manager.normalizeUri(term)
+        return term.n3()
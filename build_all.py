@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""Builds all Data Cubes, the codelist, provenance and the dataset entry in parallel.
+
+Every task runs in its own worker process inside the directory of its script, so the outputs
+are the same as when running the scripts one by one. The source .csv files are parsed only once:
+the warm-up task fills the shared Arrow cache ($NDBI046_CACHE_DIR, see csv_cache.py) and all
+builders then memory-map the parsed frames from it.
+"""
+import argparse
+import importlib
+import multiprocessing
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Must be set before any worker imports csv_cache / schema_cache
+os.environ.setdefault("NDBI046_CACHE_DIR", os.path.join(ROOT, ".cache"))
+
+
+def load_module(directory: str, name: str):
+    """Import module `name` from `directory` and make `directory` the working directory."""
+    path = os.path.join(ROOT, directory)
+    os.chdir(path)
+    sys.path.insert(0, path)
+    return importlib.import_module(name)
+
+
+def warm_up_cache():
+    # population-2021 reads all three source files (population, care providers register, county mapping)
+    population = load_module("1-Data-Cube", "population-2021")
+    data = population.load_csv_file_as_object("./population-2021/130141-22data2021.csv")
+    population.set_region_per_county(data)
+
+
+def build_care_providers():
+    care_providers = load_module("1-Data-Cube", "care-providers")
+    data = care_providers.load_csv_file_as_object("./care-providers/narodni-registr-poskytovatelu-zdravotnich-sluzeb.csv")
+    fields_of_care = care_providers.update_codelist(care_providers.CODES_FILE, "fieldOfCare", data["OborPece"])
+    care_providers.write_data_cube(data, "care-providers.ttl", fields_of_care=fields_of_care)
+
+
+def build_population():
+    population = load_module("1-Data-Cube", "population-2021")
+    data = population.load_csv_file_as_object("./population-2021/130141-22data2021.csv")
+    data = population.set_region_per_county(data)
+    population.write_data_cube(data, "population-2021.ttl")
+
+
+def create_codelist():
+    load_module("4-Metadata", "population_2021.codelist").create_codelist()
+
+
+def process_population():
+    load_module("4-Metadata", "population_2021.data_cube").process_population(stream=True)
+
+
+def create_dataset_entry():
+    load_module("4-Metadata", "dataset_entry").create_dataset_entry()
+
+
+def create_care_providers_prov():
+    load_module("3-Provenance", "care_providers_prov").create_prov_data()
+
+
+def create_population_prov():
+    load_module("3-Provenance", "population_2021_prov").create_prov_data()
+
+
+# Tasks not reading any source file run right away, next to the warm-up
+INDEPENDENT_TASKS = [create_dataset_entry, create_care_providers_prov, create_population_prov]
+CUBE_TASKS = [build_care_providers, build_population, create_codelist, process_population]
+
+
+def run_task(task):
+    start = time.perf_counter()
+    task()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Builds all Data Cubes and their metadata in parallel.")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count(),
+                        help="number of worker processes (defaults to the number of CPUs)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    # A fresh process per task, so modules of different directories never meet in one interpreter
+    with multiprocessing.Pool(args.jobs, maxtasksperchild=1) as pool:
+        pending = [(task, pool.apply_async(run_task, (task,))) for task in [warm_up_cache] + INDEPENDENT_TASKS]
+        pending[0][1].wait()
+        pending += [(task, pool.apply_async(run_task, (task,))) for task in CUBE_TASKS]
+
+        failed = False
+        for task, result in pending:
+            try:
+                elapsed = result.get()
+                print(f"{task.__name__}: {elapsed:.2f}s")
+            except Exception as e:
+                print(f"{task.__name__} FAILED: {e!r}", file=sys.stderr)
+                failed = True
+
+    print(f"Total: {time.perf_counter() - start:.2f}s")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()